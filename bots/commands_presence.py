@@ -8,12 +8,13 @@ from discord.ext import commands
 import json
 import os
 from datetime import datetime
-from services.presence_manager import PresenceManager
+from services.presence_manager import presence_manager
+from services.workflow_jobs import job_registry
 
 class PresenceCommands(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.presence_manager = PresenceManager()
+        self.presence_manager = presence_manager
         self.voice_log_channel = None  # 用于记录语音活动的频道
     
     @commands.command(name='register_riot')
@@ -47,6 +48,9 @@ class PresenceCommands(commands.Cog):
             success = self.presence_manager.register_binding(discord_id, riot_id, "LOL")
             
             if success:
+                # Seed the presence index; later changes arrive as gateway events
+                if self.presence_manager.index.ready:
+                    self.presence_manager.index.refresh(self.bot, discord_id)
                 await ctx.send(f"✅ Successfully registered Riot ID: `{riot_id}`\n"
                               f"🎮 Game: League of Legends\n"
                               f"📅 Registered: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
@@ -202,6 +206,10 @@ class PresenceCommands(commands.Cog):
         自动检测玩家进入/离开语音频道并启动/停止游戏监控
         """
         try:
+            # 离开语音频道时取消该用户进行中的分析（无论是否已注册）
+            if before.channel is not None and after.channel is None:
+                job_registry.cancel_for_requester(member.id, reason="(请求者离开语音频道)")
+            
             # 检查这个用户是否已注册
             discord_id = str(member.id)
             binding = self.presence_manager.get_binding_by_discord(discord_id)
@@ -209,6 +217,8 @@ class PresenceCommands(commands.Cog):
             if not binding:
                 return  # 用户未注册，忽略
             
+            # 更新在线/语音索引
+            self.presence_manager.index.update_member(member)
             riot_id = binding['riot_id']
             
             # 检测进入语音频道
@@ -245,6 +255,8 @@ class PresenceCommands(commands.Cog):
             if not binding:
                 return  # 用户未注册，忽略
             
+            # 更新在线/语音索引
+            self.presence_manager.index.update_member(after)
             riot_id = binding['riot_id']
             
             # 检测从离线变为在线
@@ -509,7 +521,7 @@ class PresenceCommands(commands.Cog):
             )
             
             # 显示数据文件路径
-            data_path = self.presence_manager.data_path
+            data_path = self.presence_manager.db_path
             embed.add_field(
                 name="📄 数据文件路径",
                 value=f"`{data_path}`",
@@ -543,7 +555,7 @@ class PresenceCommands(commands.Cog):
             # 显示数据格式说明
             embed.add_field(
                 name="📋 数据格式",
-                value="```json\n{\n  \"players\": [\n    {\n      \"discord_id\": \"用户Discord ID\",\n      \"riot_id\": \"游戏ID#标签\",\n      \"game\": \"游戏类型\",\n      \"registered_at\": \"注册时间\",\n      \"last_match_id\": \"最后比赛ID\"\n    }\n  ]\n}```",
+                value="```sql\nplayers (\n  discord_id    -- 用户Discord ID（主键）\n  riot_id       -- 游戏ID#标签（唯一索引）\n  game          -- 游戏类型\n  registered_at -- 注册时间\n  last_match_id -- 最后比赛ID\n)```",
                 inline=False
             )
             
@@ -759,8 +771,8 @@ class PresenceCommands(commands.Cog):
             )
             
             embed.add_field(
-                name="⏱️ 检查间隔",
-                value=f"`{status['interval_minutes']} 分钟`",
+                name="⏱️ 过期阈值 / 压缩间隔",
+                value=f"`{status['stale_minutes']} 分钟` / `{status['interval_minutes']} 分钟`",
                 inline=True
             )
             
@@ -770,6 +782,14 @@ class PresenceCommands(commands.Cog):
                 inline=True
             )
             
+            store_stats = self.presence_manager.get_store_stats()
+            embed.add_field(
+                name="💾 状态写入",
+                value=f"状态变化 `{store_stats['transitions']}` 次 / 心跳 `{store_stats['heartbeats']}` 次\n"
+                      f"批量写入 `{store_stats['flushes']}` 次，待写入 `{store_stats['dirty']}` 人",
+                inline=False
+            )
+            
             embed.add_field(
                 name="💡 维护功能",
                 value="• 清理过期状态数据\n• 检测异常状态\n• 数据完整性验证",
@@ -18,11 +18,25 @@ sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'services'))
 
 # 导入服务模块
 from services.riot_checker import main as get_match_data
-from services.match_analyzer import convert_to_chinese_mature_tone, load_json_file
-from services.va_match_analyzer import convert_to_chinese_mature_tone as va_convert_to_chinese_mature_tone, load_json_file as va_load_json_file
+from services.match_analyzer import convert_to_chinese_mature_tone, load_json_file, MODELS as LOL_MODELS
+from services.va_match_analyzer import convert_to_chinese_mature_tone as va_convert_to_chinese_mature_tone, load_json_file as va_load_json_file, MODELS as VA_MODELS
 from services.valorant_checker import get_last_valorant_match
-from services.voicv_tts import generate_tts_audio
-from services.utils import find_latest_json_file, ensure_directory, cleanup_old_files, get_file_count_info
+from services.tts_cache import tts_cache
+from services.voicv_tts import generate_tts_audio, get_cached_tts_audio, get_tts_unavailable_reason
+from services.audio_player import transcode_to_opus, create_audio_source, AudioPipe, create_stream_source
+from services.tracing import tracer
+from services.llm_client import llm_client
+from services.model_router import model_router
+from services.generation_cache import generation_cache, make_generation_key
+from services.batch_generator import generate_styles, generate_style_audio
+from services.template_engine import hedge_with_template, LLM_PATH, TEMPLATE_PATH, FALLBACK_PATH
+from services.deadline import Deadline, DeadlineExceeded
+from services.workflow_jobs import job_registry, make_job_key
+from services.config import Config
+from bots.progress_reporter import create_progress_reporter
+from services.utils import find_latest_json_file, cleanup_old_files, get_file_count_info, save_json_file_async
+from services.artifact_store import artifact_store
+from services.match_archive import match_archive
 
 # 加载环境变量
 load_dotenv()
@@ -78,77 +92,294 @@ async def check_channel_permission(ctx):
         return False
     return True
 
+async def run_audio_steps(workflow, voice_channel_id=None, text_first=None):
+    """
+    步骤3-4: 生成TTS音频并在Discord播放
+    
+    文字优先模式下先发送文字分析，用户只需等待一次LLM调用；
+    VoicV熔断、繁忙或失败时文字分析即为完整结果
+    
+    Args:
+        workflow: LOLWorkflow / VAWorkflow 实例（步骤2已完成）
+        voice_channel_id (int, optional): Discord语音频道ID
+        text_first (bool, optional): 是否文字优先，为None时使用 Config.TEXT_FIRST_REPLY
+    
+    Returns:
+        bool: 是否成功交付结果
+    """
+    if text_first is None:
+        text_first = Config.TEXT_FIRST_REPLY
+    
+    if text_first:
+        await workflow.reporter.post_result(f"📝 {workflow.chinese_analysis}")
+        
+        # TTS缓存命中时无需调用VoicV，熔断或繁忙也不影响
+        reason = get_tts_unavailable_reason()
+        if reason and not get_cached_tts_audio(workflow.chinese_analysis, workflow.voice_id):
+            print(f"⏭️ 跳过TTS: {reason}")
+            workflow.text_only = True
+            await workflow.reporter.update("step3", f"⏭️ **跳过语音**: {reason}，文字分析即为完整结果")
+            return True
+    
+    # 边下载边播放：音频还没有生成时，不等待下载完成就开始播放
+    if voice_channel_id and Config.TTS_STREAM_PLAYBACK and not workflow.audio_file:
+        if not await stream_tts_and_play(workflow, voice_channel_id):
+            workflow.text_only = text_first
+            return text_first
+        return True
+    
+    # 文字已发送时，语音失败不影响结果
+    if not await workflow.step3_generate_tts():
+        workflow.text_only = text_first
+        return text_first
+    
+    if voice_channel_id:
+        if not await workflow.step4_discord_play(voice_channel_id):
+            workflow.text_only = text_first
+            return text_first
+    
+    return True
+
+
+async def stream_tts_and_play(workflow, voice_channel_id):
+    """
+    步骤3-4（流式）: 边下载TTS音频边在Discord播放
+    
+    下载的数据块同时写入TTS缓存文件和ffmpeg管道，完整文件仍会保存并转码，供之后重播
+    
+    Args:
+        workflow: LOLWorkflow / VAWorkflow 实例（步骤2已完成）
+        voice_channel_id (int): Discord语音频道ID
+    
+    Returns:
+        bool: 是否生成并播放成功
+    """
+    reporter = workflow.reporter
+    await reporter.update("step3", "🎵 **步骤3**: 正在生成语音（边下载边播放）...")
+    
+    voice_channel = bot.get_channel(voice_channel_id)
+    if not voice_channel:
+        await reporter.update("step4", "❌ **步骤4失败**: 找不到指定的语音频道")
+        return False
+    
+    # 超过截止时间就不再播放过期的分析；此时下载线程还没有启动，无需取消
+    try:
+        if workflow.deadline:
+            workflow.deadline.check()
+    except DeadlineExceeded as e:
+        print(f"⏭️ 跳过语音播放: {e}")
+        await reporter.update("step4", f"⏭️ **跳过播放**: {e}")
+        return False
+    
+    pipe = AudioPipe()
+    
+    def download():
+        try:
+            return generate_tts_audio(
+                workflow.chinese_analysis, None, workflow.voice_id, workflow.deadline, pipe.write
+            )
+        finally:
+            pipe.close()
+    
+    tts_task = asyncio.ensure_future(asyncio.to_thread(download))
+    played = False
+    vc = None
+    try:
+        with tracer.span("discord.voice_connect"):
+            vc = await voice_channel.connect()
+        
+        loop = asyncio.get_running_loop()
+        done = asyncio.Event()
+        vc.play(create_stream_source(pipe), after=lambda err: loop.call_soon_threadsafe(done.set))
+        print("🎵 正在播放游戏分析（下载中）...")
+        await reporter.update("step4", "🎵 **正在播放**: 游戏分析音频...")
+        
+        with tracer.span("discord.playback"):
+            await done.wait()
+        played = True
+        await asyncio.sleep(1)
+    except asyncio.CancelledError:
+        # 任务被取消（请求者离开或发起新请求），立即停止播放；下载在后台写完缓存
+        if vc:
+            vc.stop()
+        print("🛑 播放已取消，已退出语音频道")
+        raise
+    except Exception as e:
+        print(f"[ERROR] Discord播放失败: {e}")
+        await reporter.update("step4", f"❌ **步骤4失败**: Discord播放失败 - {e}")
+    finally:
+        # 播放端结束后关闭管道，避免下载线程阻塞在写入上
+        pipe.abort()
+        if vc:
+            await vc.disconnect()
+    
+    workflow.audio_file = await tts_task
+    if not workflow.audio_file:
+        await reporter.update("step3", "❌ **步骤3失败**: TTS生成失败")
+        return False
+    
+    print(f"[OK] 语音文件生成成功: {workflow.audio_file}")
+    generation_cache.set_audio(workflow.cache_key, workflow.audio_file)
+    await reporter.update("step3", "✅ **步骤3完成**: 语音文件生成成功！")
+    
+    # 转码为Opus，之后重播直接透传
+    with tracer.span("audio.transcode"):
+        await asyncio.to_thread(transcode_to_opus, workflow.audio_file)
+    
+    if played:
+        print("[OK] 播放完成，已退出语音频道")
+        await reporter.update("step4", "✅ **步骤4完成**: 音频播放完成！")
+    return played
+
+
+async def archive_analysis(kind, match_data, style, text, player, path=None):
+    """把新生成的分析文本压缩追加到长期归档（文件I/O放到线程中）"""
+    try:
+        await asyncio.to_thread(match_archive.add, text.encode("utf-8"), kind,
+                                match_id=match_data.get("match_id"), player=player, style=style, path=path)
+    except Exception as e:
+        print(f"[WARNING] 归档分析文本失败: {e}")
+
+
+async def run_style_batch(workflow, match_data, styles, convert, models, voice_channel_id=None, force_fresh=False):
+    """
+    步骤2-4（多风格）: 同一场比赛按多个风格生成点评
+    
+    比赛数据只获取一次，各风格的LLM请求并发发出（各自与本地模板对冲），
+    TTS按各风格的voice_id并发生成，然后依次播放
+    
+    Args:
+        workflow: LOLWorkflow / VAWorkflow 实例（步骤1已完成）
+        match_data (dict): 已解析的比赛数据
+        styles (list): 风格列表
+        convert: 分析函数（LOL或Valorant的 convert_to_chinese_mature_tone）
+        models (list): 分析器的默认模型列表（缓存键的一部分）
+        voice_channel_id (int, optional): Discord语音频道ID
+        force_fresh (bool, optional): 忽略缓存
+    
+    Returns:
+        bool: 是否至少生成了一个风格的分析
+    """
+    style_names = get_style_display_names()
+    
+    await workflow.reporter.update("step2", f"**步骤2**: 正在并发生成 {len(styles)} 种风格的AI分析...")
+    with tracer.span("workflow.step2_analysis", styles=len(styles)):
+        results, paths = await generate_styles(match_data, styles, convert, models, workflow.deadline, force_fresh)
+        tracer.annotate(analysis_paths=",".join(f"{style}:{path}" for style, path in paths.items()))
+    if not results:
+        await workflow.reporter.update("step2", "❌ **步骤2失败**: 所有风格的分析生成失败")
+        return False
+    
+    # 超时/出错而使用本地模板的风格在进度中注明
+    path_notes = {TEMPLATE_PATH: "AI响应超时", FALLBACK_PATH: "AI服务出错"}
+    notes = [f"{style_names.get(style, style)}（{path_notes[path]}，模板）"
+             for style, path in paths.items() if path in path_notes]
+    summary = f"{len(results)}/{len(styles)} 种风格分析生成成功！"
+    if notes:
+        await workflow.reporter.update("step2", f"⚠️ **步骤2完成**: {summary} 使用本地模板: {'、'.join(notes)}")
+    else:
+        await workflow.reporter.update("step2", f"✅ **步骤2完成**: {summary}（LLM）")
+    
+    for style, result in results.items():
+        await workflow.reporter.post_result(f"📝 **{style_names.get(style, style)}**\n{result.text}")
+    
+    text_kind = "va_text" if isinstance(workflow, VAWorkflow) else "lol_text"
+    for style, result in results.items():
+        await archive_analysis(text_kind, match_data, style, result.text, workflow.riot_id, paths[style])
+    
+    await workflow.reporter.update("step3", "🎵 **步骤3**: 正在按风格并发生成语音...")
+    with tracer.span("workflow.step3_tts", styles=len(results)):
+        audio_files = await generate_style_audio(results, workflow.deadline)
+        await asyncio.gather(*[asyncio.to_thread(transcode_to_opus, f) for f in audio_files.values()])
+    if not audio_files:
+        workflow.text_only = True
+        await workflow.reporter.update("step3", "⏭️ **跳过语音**: 语音暂不可用，文字分析即为完整结果")
+        return True
+    await workflow.reporter.update("step3", f"✅ **步骤3完成**: {len(audio_files)} 个语音文件生成成功！")
+    
+    if voice_channel_id:
+        for style, audio_file in audio_files.items():
+            workflow.audio_file = audio_file
+            if not await workflow.step4_discord_play(voice_channel_id):
+                break
+    
+    return True
+
+
 class LOLWorkflow:
-    def __init__(self, ctx=None):
+    def __init__(self, ctx=None, reporter=None):
         self.current_match_file = None
         self.chinese_analysis = None
         self.audio_file = None
         self.voice_id = None  # 从风格配置中获取的voice_id
-        self.ctx = ctx  # Discord context for sending status updates
-        
+        self.ctx = ctx  # Discord context
+        self.deadline = None  # 整个工作流程的截止时间，所有上游调用共享
+        self.text_only = False  # 语音不可用时文字分析即为完整结果
+        self.force_fresh = False  # 为True时忽略缓存，重新生成分析和语音
+        self.cache_key = None  # 分析结果缓存键
+        self.analysis_path = None  # 分析由哪条路径生成: "llm" / "template"（超时）/ "fallback"（出错）
+        self.riot_id = None  # 当前分析的玩家，归档时使用
+        # 进度统一通过reporter汇报，工作流程不直接调用ctx.send
+        self.reporter = reporter or create_progress_reporter(ctx)
+        
+    @tracer.traced("workflow.step1_match_data")
     async def step1_get_match_data(self):
         """步骤1: 获取游戏数据"""
         print("步骤1: 获取最新游戏数据...")
-        if self.ctx:
-            await self.ctx.send("🔍 **步骤1**: 正在获取最新游戏数据...")
+        await self.reporter.update("step1", "🔍 **步骤1**: 正在获取最新游戏数据...")
         
         try:
             # 运行riot_checker获取数据
-            get_match_data()
+            await asyncio.to_thread(get_match_data)
             
-            # 找到最新生成的JSON文件（使用项目根目录的 analysis 目录，避免受当前工作目录影响）
-            root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-            analysis_dir = os.path.join(root_dir, "analysis")
-            self.current_match_file = find_latest_json_file(analysis_dir)
+            # 从产物清单取最新生成的JSON文件
+            self.current_match_file = find_latest_json_file()
             if not self.current_match_file:
                 raise FileNotFoundError("未找到游戏数据文件")
             
             print(f"游戏数据已保存: {self.current_match_file}")
             
-            if self.ctx:
-                await self.ctx.send("✅ **步骤1完成**: 游戏数据获取成功！")
+            await self.reporter.update("step1", "✅ **步骤1完成**: 游戏数据获取成功！")
             return True
             
         except Exception as e:
             print(f"获取游戏数据失败: {e}")
-            if self.ctx:
-                await self.ctx.send(f"❌ **步骤1失败**: 获取游戏数据失败 - {e}")
+            await self.reporter.update("step1", f"❌ **步骤1失败**: 获取游戏数据失败 - {e}")
             return False
     
+    @tracer.traced("workflow.step1_match_data")
     async def step1_get_match_data_with_user(self, game_name, tag_line):
         """步骤1: 获取指定用户的游戏数据"""
         print(f"步骤1: 获取用户 {game_name}#{tag_line} 的最新游戏数据...")
-        if self.ctx:
-            await self.ctx.send(f"🔍 **步骤1**: 正在获取 {game_name}#{tag_line} 的最新游戏数据...")
+        await self.reporter.update("step1", f"🔍 **步骤1**: 正在获取 {game_name}#{tag_line} 的最新游戏数据...")
         
         try:
+            self.riot_id = f"{game_name}#{tag_line}"
             # 导入动态用户数据获取函数
             from services.riot_checker import get_match_data_for_user
             
             # 运行riot_checker获取指定用户的数据
-            success = get_match_data_for_user(game_name, tag_line)
+            # 在线程中运行，任务被取消时不阻塞事件循环
+            success = await asyncio.to_thread(get_match_data_for_user, game_name, tag_line, self.deadline)
             if not success:
                 raise Exception("获取用户游戏数据失败")
             
-            # 找到最新生成的JSON文件（使用项目根目录的 analysis 目录，避免受当前工作目录影响）
-            root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-            analysis_dir = os.path.join(root_dir, "analysis")
-            self.current_match_file = find_latest_json_file(analysis_dir)
+            # 从产物清单取该用户最新的JSON文件（并发分析其他用户时不会拿错文件）
+            self.current_match_file = find_latest_json_file(player=self.riot_id)
             if not self.current_match_file:
                 raise FileNotFoundError("未找到游戏数据文件")
             
             print(f"用户 {game_name}#{tag_line} 的游戏数据已保存: {self.current_match_file}")
             
-            if self.ctx:
-                await self.ctx.send("✅ **步骤1完成**: 游戏数据获取成功！")
+            await self.reporter.update("step1", "✅ **步骤1完成**: 游戏数据获取成功！")
             return True
             
         except Exception as e:
             print(f"获取用户游戏数据失败: {e}")
-            if self.ctx:
-                await self.ctx.send(f"❌ **步骤1失败**: 获取游戏数据失败 - {e}")
+            await self.reporter.update("step1", f"❌ **步骤1失败**: 获取游戏数据失败 - {e}")
             return False
     
+    @tracer.traced("workflow.step2_analysis")
     async def step2_convert_to_chinese(self, prompt=None, system_role=None, style="default"):
         """步骤2: 转换为中文分析
         
@@ -159,8 +390,7 @@ class LOLWorkflow:
         """
         print(f"步骤2: 转换为中文分析...，style: {style}")
 
-        if self.ctx:
-            await self.ctx.send(f"**步骤2**: 正在生成AI中文分析... (风格: {style})")
+        await self.reporter.update("step2", f"**步骤2**: 正在生成AI中文分析... (风格: {style})")
         
         try:
             if not self.current_match_file:
@@ -170,61 +400,98 @@ class LOLWorkflow:
             match_data = load_json_file(self.current_match_file)
             if not match_data:
                 raise ValueError("无法加载游戏数据")
+            tracer.annotate(match_id=match_data.get('match_id'), style=style)
+            
+            # 相同比赛+玩家+风格+模板+模型的结果直接复用，不再调用OpenAI
+            self.cache_key = make_generation_key(match_data, style, LOL_MODELS, prompt, system_role)
+            cached = None if self.force_fresh else generation_cache.get(self.cache_key)
+            if cached:
+                self.chinese_analysis, self.voice_id = cached.text, cached.voice_id
+                if cached.has_audio():
+                    self.audio_file = cached.audio_file
+                print("⚡ 使用缓存的分析结果")
+                await self.reporter.update("step2", "⚡ **步骤2完成**: 使用缓存的AI分析结果！")
+                return True
             
             # 转换为中文分析，获取分析文本和voice_id
-            result = convert_to_chinese_mature_tone(match_data, prompt, system_role, style)
+            # LLM与超时赛跑，超时或出错时使用本地模板，保证在有限时间内完成
+            result, self.analysis_path = await hedge_with_template(
+                convert_to_chinese_mature_tone(match_data, prompt, system_role, style, self.deadline),
+                match_data, style, self.deadline
+            )
             if not result or result[0] is None:
                 raise ValueError("AI分析生成失败")
             
             self.chinese_analysis, self.voice_id = result
+            tracer.annotate(analysis_path=self.analysis_path)
+            # 只缓存LLM结果，模板结果下次仍尝试LLM
+            if self.analysis_path == LLM_PATH:
+                generation_cache.put(self.cache_key, self.chinese_analysis, self.voice_id)
 
+            await archive_analysis("lol_text", match_data, style, self.chinese_analysis, self.riot_id,
+                                   self.analysis_path)
+            
             # print(prompt if prompt else f"(风格: {style}，使用风格内置prompt)")
             
             print("[OK] 中文分析生成成功..")
             print(f"📝 分析内容: {self.chinese_analysis[:100]}...")
             
-            if self.ctx:
-                await self.ctx.send("✅ **步骤2完成**: AI中文分析生成成功！")
+            if self.analysis_path == LLM_PATH:
+                await self.reporter.update("step2", "✅ **步骤2完成**: AI中文分析生成成功！（LLM）")
+            elif self.analysis_path == TEMPLATE_PATH:
+                await self.reporter.update("step2", "⚡ **步骤2完成**: AI响应超时，已使用本地模板生成点评（模板）")
+            else:
+                await self.reporter.update("step2", "⚠️ **步骤2完成**: AI服务出错，已使用本地模板生成点评（模板）")
             return True
             
         except Exception as e:
             print(f"[ERROR] 中文分析生成失败: {e}")
-            if self.ctx:
-                await self.ctx.send(f"❌ **步骤2失败**: 中文分析生成失败 - {e}")
+            await self.reporter.update("step2", f"❌ **步骤2失败**: 中文分析生成失败 - {e}")
             return False
     
+    @tracer.traced("workflow.step3_tts")
     async def step3_generate_tts(self):
         """步骤3: 生成TTS音频"""
         print("步骤3: 生成语音文件...")
-        if self.ctx:
-            await self.ctx.send("🎵 **步骤3**: 正在生成语音文件...")
+        await self.reporter.update("step3", "🎵 **步骤3**: 正在生成语音文件...")
         
         try:
             if not self.chinese_analysis:
                 raise ValueError("没有可用的中文分析内容")
             
+            # 缓存命中且音频文件仍然存在时直接复用
+            if self.audio_file and os.path.exists(self.audio_file):
+                print(f"⚡ 使用缓存的语音文件: {self.audio_file}")
+                await self.reporter.update("step3", "⚡ **步骤3完成**: 使用缓存的语音文件！")
+                return True
+            
             # 使用 voicV TTS API生成音频，传入voice_id
-            self.audio_file = generate_tts_audio(self.chinese_analysis, voice_id=self.voice_id)
+            self.audio_file = await asyncio.to_thread(
+                generate_tts_audio, self.chinese_analysis, voice_id=self.voice_id, deadline=self.deadline
+            )
             if not self.audio_file:
                 raise ValueError("TTS生成失败")
             
             print(f"[OK] 语音文件生成成功: {self.audio_file}")
+            generation_cache.set_audio(self.cache_key, self.audio_file)
             
-            if self.ctx:
-                await self.ctx.send("✅ **步骤3完成**: 语音文件生成成功！")
+            # 一次性转码为Opus，播放时直接透传，无需每次解码重编码
+            with tracer.span("audio.transcode"):
+                await asyncio.to_thread(transcode_to_opus, self.audio_file)
+            
+            await self.reporter.update("step3", "✅ **步骤3完成**: 语音文件生成成功！")
             return True
             
         except Exception as e:
             print(f"[ERROR] TTS生成失败: {e}")
-            if self.ctx:
-                await self.ctx.send(f"❌ **步骤3失败**: TTS生成失败 - {e}")
+            await self.reporter.update("step3", f"❌ **步骤3失败**: TTS生成失败 - {e}")
             return False
     
+    @tracer.traced("workflow.step4_play")
     async def step4_discord_play(self, voice_channel_id=None):
         """步骤4: Discord播放音频"""
         print("步骤4: Discord播放音频...")
-        if self.ctx:
-            await self.ctx.send("🔊 **步骤4**: 正在连接语音频道并播放音频...")
+        await self.reporter.update("step4", "🔊 **步骤4**: 正在连接语音频道并播放音频...")
         
         try:
             if not self.audio_file or not os.path.exists(self.audio_file):
@@ -233,8 +500,7 @@ class LOLWorkflow:
             # 这里需要用户指定语音频道或从用户当前频道获取
             if not voice_channel_id:
                 print("[ERROR] 需要指定语音频道ID")
-                if self.ctx:
-                    await self.ctx.send("❌ **步骤4失败**: 需要指定语音频道ID")
+                await self.reporter.update("step4", "❌ **步骤4失败**: 需要指定语音频道ID")
                 return False
             
             # 连接语音频道
@@ -242,10 +508,16 @@ class LOLWorkflow:
             if not voice_channel:
                 raise ValueError("找不到指定的语音频道")
             
-            vc = await voice_channel.connect()
+            # 超过截止时间就不再播放过期的分析
+            if self.deadline:
+                self.deadline.check()
             
-            # 播放音频 - 使用ffmpeg-python自动查找ffmpeg
-            audio_source = discord.FFmpegPCMAudio(self.audio_file)
+            with tracer.span("discord.voice_connect"):
+                vc = await voice_channel.connect()
+            
+            # 播放音频 - 优先透传已缓存的Opus数据
+            # 缺少Opus缓存时要同步运行ffmpeg转码，放到线程中，不阻塞事件循环
+            audio_source = await asyncio.to_thread(create_audio_source, self.audio_file)
             done = asyncio.Event()
             
             def after_play(err):
@@ -254,27 +526,33 @@ class LOLWorkflow:
             vc.play(audio_source, after=after_play)
             print("🎵 正在播放游戏分析...")
             
-            if self.ctx:
-                await self.ctx.send("🎵 **正在播放**: 游戏分析音频...")
-            
-            await done.wait()
+            await self.reporter.update("step4", "🎵 **正在播放**: 游戏分析音频...")
             
+            try:
+                with tracer.span("discord.playback"):
+                    await done.wait()
+            except asyncio.CancelledError:
+                # 任务被取消（请求者离开或发起新请求），立即停止播放并退出语音频道
+                vc.stop()
+                await vc.disconnect()
+                print("🛑 播放已取消，已退出语音频道")
+                raise
+
             # 播放完成后断开连接
             await asyncio.sleep(1)
             await vc.disconnect()
             print("[OK] 播放完成，已退出语音频道")
             
-            if self.ctx:
-                await self.ctx.send("✅ **步骤4完成**: 音频播放完成！")
+            await self.reporter.update("step4", "✅ **步骤4完成**: 音频播放完成！")
             return True
             
         except Exception as e:
             print(f"[ERROR] Discord播放失败: {e}")
-            if self.ctx:
-                await self.ctx.send(f"❌ **步骤4失败**: Discord播放失败 - {e}")
+            await self.reporter.update("step4", f"❌ **步骤4失败**: Discord播放失败 - {e}")
             return False
     
-    async def run_full_workflow(self, voice_channel_id=None, prompt=None, system_role=None, style="default"):
+    @tracer.traced("lol.workflow", run=True)
+    async def run_full_workflow(self, voice_channel_id=None, prompt=None, system_role=None, style="default", text_first=None, force_fresh=False):
         """运行完整工作流程
         
         Args:
@@ -282,9 +560,14 @@ class LOLWorkflow:
             prompt (str, optional): 自定义提示词
             system_role (str, optional): 自定义系统角色
             style (str, optional): 风格名称 (default, professional, humorous)
+            text_first (bool, optional): 分析文字生成后立即发送，为None时使用 Config.TEXT_FIRST_REPLY
+            force_fresh (bool, optional): 忽略缓存，重新生成分析和语音
         """
         print("开始英雄联盟游戏分析完整流程")
         print("=" * 60)
+        tracer.annotate(style=style)
+        self.deadline = Deadline(Config.WORKFLOW_DEADLINE_SECONDS)
+        self.force_fresh = force_fresh
         
         # 步骤1: 获取游戏数据
         if not await self.step1_get_match_data():
@@ -294,25 +577,22 @@ class LOLWorkflow:
         if not await self.step2_convert_to_chinese(prompt, system_role, style):
             return False
         
-        # 步骤3: 生成TTS音频
-        if not await self.step3_generate_tts():
+        # 步骤3-4: 生成TTS音频并在Discord播放（文字优先模式下先发送文字）
+        if not await run_audio_steps(self, voice_channel_id, text_first):
             return False
         
-        # 步骤4: Discord播放
-        if voice_channel_id:
-            if not await self.step4_discord_play(voice_channel_id):
-                return False
-        
         # 步骤5: 清理旧文件（只保留最近5次记录）
         print("🧹 清理旧文件...")
-        cleanup_stats = cleanup_old_files(keep_count=5)
-        if cleanup_stats['analysis'] > 0 or cleanup_stats['audio'] > 0:
-            print(f"✅ 清理完成: 删除了 {cleanup_stats['analysis']} 个分析文件, {cleanup_stats['audio']} 个音频文件")
+        # 淘汰、归档压缩和清单写入都是磁盘I/O，放到线程中执行
+        cleanup_stats = await asyncio.to_thread(cleanup_old_files, keep_count=5)
+        if cleanup_stats['analysis'] > 0:
+            print(f"✅ 清理完成: 删除了 {cleanup_stats['analysis']} 个分析文件")
         
         print("🎉 完整流程执行成功!")
         return True
     
-    async def run_full_workflow_with_user(self, voice_channel_id=None, game_name=None, tag_line=None, prompt=None, system_role=None, style="default"):
+    @tracer.traced("lol.workflow", run=True)
+    async def run_full_workflow_with_user(self, voice_channel_id=None, game_name=None, tag_line=None, prompt=None, system_role=None, style="default", text_first=None, force_fresh=False):
         """运行完整工作流程（支持动态用户）
         
         Args:
@@ -322,9 +602,14 @@ class LOLWorkflow:
             prompt (str, optional): 自定义提示词
             system_role (str, optional): 自定义系统角色
             style (str, optional): 风格名称 (default, professional, humorous)
+            text_first (bool, optional): 分析文字生成后立即发送，为None时使用 Config.TEXT_FIRST_REPLY
+            force_fresh (bool, optional): 忽略缓存，重新生成分析和语音
         """
         print("开始英雄联盟游戏分析完整流程（动态用户）")
         print("=" * 60)
+        tracer.annotate(riot_id=f"{game_name}#{tag_line}", style=style)
+        self.deadline = Deadline(Config.WORKFLOW_DEADLINE_SECONDS)
+        self.force_fresh = force_fresh
         
         # 步骤1: 获取游戏数据（使用动态用户）
         if not await self.step1_get_match_data_with_user(game_name, tag_line):
@@ -334,80 +619,112 @@ class LOLWorkflow:
         if not await self.step2_convert_to_chinese(prompt, system_role, style):
             return False
         
-        # 步骤3: 生成TTS音频
-        if not await self.step3_generate_tts():
+        # 步骤3-4: 生成TTS音频并在Discord播放（文字优先模式下先发送文字）
+        if not await run_audio_steps(self, voice_channel_id, text_first):
             return False
         
-        # 步骤4: Discord播放
-        if voice_channel_id:
-            if not await self.step4_discord_play(voice_channel_id):
-                return False
-        
         # 步骤5: 清理旧文件（只保留最近5次记录）
         print("🧹 清理旧文件...")
-        cleanup_stats = cleanup_old_files(keep_count=5)
-        if cleanup_stats['analysis'] > 0 or cleanup_stats['audio'] > 0:
-            print(f"✅ 清理完成: 删除了 {cleanup_stats['analysis']} 个分析文件, {cleanup_stats['audio']} 个音频文件")
+        # 淘汰、归档压缩和清单写入都是磁盘I/O，放到线程中执行
+        cleanup_stats = await asyncio.to_thread(cleanup_old_files, keep_count=5)
+        if cleanup_stats['analysis'] > 0:
+            print(f"✅ 清理完成: 删除了 {cleanup_stats['analysis']} 个分析文件")
         
         print("🎉 完整流程执行成功!")
         return True
+    
+    @tracer.traced("lol.workflow_multi", run=True)
+    async def run_multi_style_workflow(self, voice_channel_id=None, game_name=None, tag_line=None, styles=None, force_fresh=False):
+        """运行多风格工作流程：获取一次比赛数据，按多个风格生成点评
+        
+        Args:
+            voice_channel_id (int, optional): Discord语音频道ID
+            game_name (str, optional): 游戏用户名
+            tag_line (str, optional): 用户标签
+            styles (list, optional): 风格列表
+            force_fresh (bool, optional): 忽略缓存，重新生成分析和语音
+        """
+        print(f"开始英雄联盟多风格分析流程: {styles}")
+        print("=" * 60)
+        tracer.annotate(riot_id=f"{game_name}#{tag_line}", style=",".join(styles or []))
+        self.deadline = Deadline(Config.WORKFLOW_DEADLINE_SECONDS)
+        
+        # 步骤1: 获取游戏数据（所有风格共享）
+        if not await self.step1_get_match_data_with_user(game_name, tag_line):
+            return False
+        
+        match_data = load_json_file(self.current_match_file)
+        if not match_data:
+            await self.reporter.update("step2", "❌ **步骤2失败**: 无法加载游戏数据")
+            return False
+        tracer.annotate(match_id=match_data.get('match_id'))
+        
+        # 步骤2-4: 并发生成各风格分析和语音，依次播放
+        if not await run_style_batch(self, match_data, styles or ["default"], convert_to_chinese_mature_tone,
+                                     LOL_MODELS, voice_channel_id, force_fresh):
+            return False
+        
+        await asyncio.to_thread(cleanup_old_files, keep_count=5)
+        print("🎉 多风格流程执行成功!")
+        return True
 
 
 class VAWorkflow:
-    def __init__(self, ctx=None):
+    def __init__(self, ctx=None, reporter=None):
         self.current_match_file = None
         self.chinese_analysis = None
         self.audio_file = None
         self.voice_id = None  # 从风格配置中获取的voice_id
-        self.ctx = ctx  # Discord context for sending status updates
-        
+        self.ctx = ctx  # Discord context
+        self.deadline = None  # 整个工作流程的截止时间，所有上游调用共享
+        self.text_only = False  # 语音不可用时文字分析即为完整结果
+        self.force_fresh = False  # 为True时忽略缓存，重新生成分析和语音
+        self.cache_key = None  # 分析结果缓存键
+        self.analysis_path = None  # 分析由哪条路径生成: "llm" / "template"（超时）/ "fallback"（出错）
+        self.riot_id = None  # 当前分析的玩家，归档时使用
+        # 进度统一通过reporter汇报，工作流程不直接调用ctx.send
+        self.reporter = reporter or create_progress_reporter(ctx)
+        
+    @tracer.traced("workflow.step1_match_data")
     async def step1_get_valorant_match_data(self, game_name, tag_line):
         """步骤1: 获取Valorant游戏数据"""
         print(f"步骤1: 获取Valorant用户 {game_name}#{tag_line} 的最新游戏数据...")
-        if self.ctx:
-            await self.ctx.send(f"🔍 **步骤1**: 正在获取 {game_name}#{tag_line} 的最新Valorant游戏数据...")
+        await self.reporter.update("step1", f"🔍 **步骤1**: 正在获取 {game_name}#{tag_line} 的最新Valorant游戏数据...")
         
         try:
+            self.riot_id = f"{game_name}#{tag_line}"
             # 运行valorant_checker获取数据
-            match_info = get_last_valorant_match(game_name, tag_line)
+            match_info = await asyncio.to_thread(get_last_valorant_match, game_name, tag_line, self.deadline)
             if not match_info:
                 raise Exception("获取Valorant游戏数据失败")
             
-            # 保存数据到文件
-            root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-            analysis_dir = os.path.join(root_dir, "analysis")
-            ensure_directory(analysis_dir)
-            
-            # 管理Valorant比赛文件，保持最多5个
-            from services.valorant_checker import manage_valorant_match_files
-            manage_valorant_match_files(analysis_dir)
-            
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            self.current_match_file = os.path.join(analysis_dir, f"valorant_last_match_{timestamp}.json")
-            
-            # 保存到JSON文件
-            import json
-            with open(self.current_match_file, 'w', encoding='utf-8') as f:
-                json.dump(match_info, f, ensure_ascii=False, indent=2)
+            # get_last_valorant_match 已经原子保存并登记了比赛数据，直接使用；否则在这里补存
+            self.current_match_file = match_info.get('output_file')
+            if not self.current_match_file:
+                from services.valorant_checker import manage_valorant_match_files
+                await asyncio.to_thread(manage_valorant_match_files)
+                self.current_match_file = artifact_store.new_path("va_match")
+                if not await save_json_file_async(match_info, self.current_match_file):
+                    raise Exception("保存Valorant游戏数据失败")
+                await asyncio.to_thread(artifact_store.add, self.current_match_file, "va_match",
+                                        match_id=match_info.get("match_id"), player=self.riot_id)
             
             print(f"Valorant游戏数据已保存: {self.current_match_file}")
             
-            if self.ctx:
-                await self.ctx.send("✅ **步骤1完成**: Valorant游戏数据获取成功！")
+            await self.reporter.update("step1", "✅ **步骤1完成**: Valorant游戏数据获取成功！")
             return True
             
         except Exception as e:
             print(f"获取Valorant游戏数据失败: {e}")
-            if self.ctx:
-                await self.ctx.send(f"❌ **步骤1失败**: 获取Valorant游戏数据失败 - {e}")
+            await self.reporter.update("step1", f"❌ **步骤1失败**: 获取Valorant游戏数据失败 - {e}")
             return False
     
+    @tracer.traced("workflow.step2_analysis")
     async def step2_convert_to_chinese(self, prompt=None, system_role=None, style="default"):
         """步骤2: 转换为中文分析"""
 
         print(f"步骤2: 转换为中文分析...， style: {style}")
-        if self.ctx:
-            await self.ctx.send(f"**步骤2**: 正在生成AI中文分析... (风格: {style})")
+        await self.reporter.update("step2", f"**步骤2**: 正在生成AI中文分析... (风格: {style})")
         
         try:
             if not self.current_match_file:
@@ -417,59 +734,96 @@ class VAWorkflow:
             match_data = va_load_json_file(self.current_match_file)
             if not match_data:
                 raise ValueError("无法加载Valorant游戏数据")
+            tracer.annotate(map=match_data.get('map'), style=style)
+            
+            # 相同比赛+玩家+风格+模板+模型的结果直接复用，不再调用OpenAI
+            self.cache_key = make_generation_key(match_data, style, VA_MODELS, prompt, system_role)
+            cached = None if self.force_fresh else generation_cache.get(self.cache_key)
+            if cached:
+                self.chinese_analysis, self.voice_id = cached.text, cached.voice_id
+                if cached.has_audio():
+                    self.audio_file = cached.audio_file
+                print("⚡ 使用缓存的分析结果")
+                await self.reporter.update("step2", "⚡ **步骤2完成**: 使用缓存的AI分析结果！")
+                return True
             
             # 转换为中文分析，获取分析文本和voice_id
-            result = va_convert_to_chinese_mature_tone(match_data, prompt, system_role, style)
+            # LLM与超时赛跑，超时或出错时使用本地模板，保证在有限时间内完成
+            result, self.analysis_path = await hedge_with_template(
+                va_convert_to_chinese_mature_tone(match_data, prompt, system_role, style, self.deadline),
+                match_data, style, self.deadline
+            )
             if not result or result[0] is None:
                 raise ValueError("AI分析生成失败")
             
             self.chinese_analysis, self.voice_id = result
+            tracer.annotate(analysis_path=self.analysis_path)
+            # 只缓存LLM结果，模板结果下次仍尝试LLM
+            if self.analysis_path == LLM_PATH:
+                generation_cache.put(self.cache_key, self.chinese_analysis, self.voice_id)
+            
+            await archive_analysis("va_text", match_data, style, self.chinese_analysis, self.riot_id,
+                                   self.analysis_path)
             
             print("[OK] 测试成功...分析生成成功.")
             print(f"📝 分析内容: {self.chinese_analysis[:100]}...")
             
-            if self.ctx:
-                await self.ctx.send("✅ **步骤2完成**: AI中文分析生成成功！")
+            if self.analysis_path == LLM_PATH:
+                await self.reporter.update("step2", "✅ **步骤2完成**: AI中文分析生成成功！（LLM）")
+            elif self.analysis_path == TEMPLATE_PATH:
+                await self.reporter.update("step2", "⚡ **步骤2完成**: AI响应超时，已使用本地模板生成点评（模板）")
+            else:
+                await self.reporter.update("step2", "⚠️ **步骤2完成**: AI服务出错，已使用本地模板生成点评（模板）")
             return True
             
         except Exception as e:
             print(f"[ERROR] Valorant中文分析生成失败: {e}")
-            if self.ctx:
-                await self.ctx.send(f"❌ **步骤2失败**: 中文分析生成失败 - {e}")
+            await self.reporter.update("step2", f"❌ **步骤2失败**: 中文分析生成失败 - {e}")
             return False
     
+    @tracer.traced("workflow.step3_tts")
     async def step3_generate_tts(self):
         """步骤3: 生成TTS音频"""
         print("步骤3: 生成语音文件...")
-        if self.ctx:
-            await self.ctx.send("🎵 **步骤3**: 正在生成语音文件...")
+        await self.reporter.update("step3", "🎵 **步骤3**: 正在生成语音文件...")
         
         try:
             if not self.chinese_analysis:
                 raise ValueError("没有可用的中文分析内容")
             
+            # 缓存命中且音频文件仍然存在时直接复用
+            if self.audio_file and os.path.exists(self.audio_file):
+                print(f"⚡ 使用缓存的语音文件: {self.audio_file}")
+                await self.reporter.update("step3", "⚡ **步骤3完成**: 使用缓存的语音文件！")
+                return True
+            
             # 使用 voicV TTS API生成音频，传入voice_id
-            self.audio_file = generate_tts_audio(self.chinese_analysis, voice_id=self.voice_id)
+            self.audio_file = await asyncio.to_thread(
+                generate_tts_audio, self.chinese_analysis, voice_id=self.voice_id, deadline=self.deadline
+            )
             if not self.audio_file:
                 raise ValueError("TTS生成失败")
             
             print(f"[OK] 语音文件生成成功: {self.audio_file}")
+            generation_cache.set_audio(self.cache_key, self.audio_file)
+            
+            # 一次性转码为Opus，播放时直接透传，无需每次解码重编码
+            with tracer.span("audio.transcode"):
+                await asyncio.to_thread(transcode_to_opus, self.audio_file)
             
-            if self.ctx:
-                await self.ctx.send("✅ **步骤3完成**: 语音文件生成成功！")
+            await self.reporter.update("step3", "✅ **步骤3完成**: 语音文件生成成功！")
             return True
             
         except Exception as e:
             print(f"[ERROR] TTS生成失败: {e}")
-            if self.ctx:
-                await self.ctx.send(f"❌ **步骤3失败**: TTS生成失败 - {e}")
+            await self.reporter.update("step3", f"❌ **步骤3失败**: TTS生成失败 - {e}")
             return False
     
+    @tracer.traced("workflow.step4_play")
     async def step4_discord_play(self, voice_channel_id=None):
         """步骤4: Discord播放音频"""
         print("步骤4: Discord播放音频...")
-        if self.ctx:
-            await self.ctx.send("🔊 **步骤4**: 正在连接语音频道并播放音频...")
+        await self.reporter.update("step4", "🔊 **步骤4**: 正在连接语音频道并播放音频...")
         
         try:
             if not self.audio_file or not os.path.exists(self.audio_file):
@@ -478,8 +832,7 @@ class VAWorkflow:
             # 这里需要用户指定语音频道或从用户当前频道获取
             if not voice_channel_id:
                 print("[ERROR] 需要指定语音频道ID")
-                if self.ctx:
-                    await self.ctx.send("❌ **步骤4失败**: 需要指定语音频道ID")
+                await self.reporter.update("step4", "❌ **步骤4失败**: 需要指定语音频道ID")
                 return False
             
             # 连接语音频道
@@ -487,10 +840,16 @@ class VAWorkflow:
             if not voice_channel:
                 raise ValueError("找不到指定的语音频道")
             
-            vc = await voice_channel.connect()
+            # 超过截止时间就不再播放过期的分析
+            if self.deadline:
+                self.deadline.check()
+            
+            with tracer.span("discord.voice_connect"):
+                vc = await voice_channel.connect()
             
-            # 播放音频 - 使用ffmpeg-python自动查找ffmpeg
-            audio_source = discord.FFmpegPCMAudio(self.audio_file)
+            # 播放音频 - 优先透传已缓存的Opus数据
+            # 缺少Opus缓存时要同步运行ffmpeg转码，放到线程中，不阻塞事件循环
+            audio_source = await asyncio.to_thread(create_audio_source, self.audio_file)
             done = asyncio.Event()
             
             def after_play(err):
@@ -499,27 +858,33 @@ class VAWorkflow:
             vc.play(audio_source, after=after_play)
             print("🎵 正在播放Valorant游戏分析...")
             
-            if self.ctx:
-                await self.ctx.send("🎵 **正在播放**: Valorant游戏分析音频...")
-            
-            await done.wait()
+            await self.reporter.update("step4", "🎵 **正在播放**: Valorant游戏分析音频...")
             
+            try:
+                with tracer.span("discord.playback"):
+                    await done.wait()
+            except asyncio.CancelledError:
+                # 任务被取消（请求者离开或发起新请求），立即停止播放并退出语音频道
+                vc.stop()
+                await vc.disconnect()
+                print("🛑 播放已取消，已退出语音频道")
+                raise
+
             # 播放完成后断开连接
             await asyncio.sleep(1)
             await vc.disconnect()
             print("[OK] 播放完成，已退出语音频道")
             
-            if self.ctx:
-                await self.ctx.send("✅ **步骤4完成**: 音频播放完成！")
+            await self.reporter.update("step4", "✅ **步骤4完成**: 音频播放完成！")
             return True
             
         except Exception as e:
             print(f"[ERROR] Discord播放失败: {e}")
-            if self.ctx:
-                await self.ctx.send(f"❌ **步骤4失败**: Discord播放失败 - {e}")
+            await self.reporter.update("step4", f"❌ **步骤4失败**: Discord播放失败 - {e}")
             return False
     
-    async def run_full_workflow(self, voice_channel_id=None, game_name=None, tag_line=None, prompt=None, system_role=None, style="default"):
+    @tracer.traced("va.workflow", run=True)
+    async def run_full_workflow(self, voice_channel_id=None, game_name=None, tag_line=None, prompt=None, system_role=None, style="default", text_first=None, force_fresh=False):
         """运行完整Valorant工作流程
         
         Args:
@@ -529,9 +894,14 @@ class VAWorkflow:
             prompt (str, optional): 自定义提示词
             system_role (str, optional): 自定义系统角色
             style (str, optional): 风格名称 (default, professional, humorous)
+            text_first (bool, optional): 分析文字生成后立即发送，为None时使用 Config.TEXT_FIRST_REPLY
+            force_fresh (bool, optional): 忽略缓存，重新生成分析和语音
         """
         print("开始Valorant游戏分析完整流程")
         print("=" * 60)
+        tracer.annotate(riot_id=f"{game_name}#{tag_line}", style=style)
+        self.deadline = Deadline(Config.WORKFLOW_DEADLINE_SECONDS)
+        self.force_fresh = force_fresh
         
         # 步骤1: 获取Valorant游戏数据
         if not await self.step1_get_valorant_match_data(game_name, tag_line):
@@ -541,23 +911,54 @@ class VAWorkflow:
         if not await self.step2_convert_to_chinese(prompt, system_role, style):
             return False
         
-        # 步骤3: 生成TTS音频
-        if not await self.step3_generate_tts():
+        # 步骤3-4: 生成TTS音频并在Discord播放（文字优先模式下先发送文字）
+        if not await run_audio_steps(self, voice_channel_id, text_first):
             return False
         
-        # 步骤4: Discord播放
-        if voice_channel_id:
-            if not await self.step4_discord_play(voice_channel_id):
-                return False
-        
         # 步骤5: 清理旧文件（只保留最近5次记录）
         print("🧹 清理旧文件...")
-        cleanup_stats = cleanup_old_files(keep_count=5)
-        if cleanup_stats['analysis'] > 0 or cleanup_stats['audio'] > 0:
-            print(f"✅ 清理完成: 删除了 {cleanup_stats['analysis']} 个分析文件, {cleanup_stats['audio']} 个音频文件")
+        # 淘汰、归档压缩和清单写入都是磁盘I/O，放到线程中执行
+        cleanup_stats = await asyncio.to_thread(cleanup_old_files, keep_count=5)
+        if cleanup_stats['analysis'] > 0:
+            print(f"✅ 清理完成: 删除了 {cleanup_stats['analysis']} 个分析文件")
         
         print("🎉 Valorant完整流程执行成功!")
         return True
+    
+    @tracer.traced("va.workflow_multi", run=True)
+    async def run_multi_style_workflow(self, voice_channel_id=None, game_name=None, tag_line=None, styles=None, force_fresh=False):
+        """运行Valorant多风格工作流程：获取一次比赛数据，按多个风格生成点评
+        
+        Args:
+            voice_channel_id (int, optional): Discord语音频道ID
+            game_name (str, optional): 游戏用户名
+            tag_line (str, optional): 用户标签
+            styles (list, optional): 风格列表
+            force_fresh (bool, optional): 忽略缓存，重新生成分析和语音
+        """
+        print(f"开始Valorant多风格分析流程: {styles}")
+        print("=" * 60)
+        tracer.annotate(riot_id=f"{game_name}#{tag_line}", style=",".join(styles or []))
+        self.deadline = Deadline(Config.WORKFLOW_DEADLINE_SECONDS)
+        
+        # 步骤1: 获取Valorant游戏数据（所有风格共享）
+        if not await self.step1_get_valorant_match_data(game_name, tag_line):
+            return False
+        
+        match_data = va_load_json_file(self.current_match_file)
+        if not match_data:
+            await self.reporter.update("step2", "❌ **步骤2失败**: 无法加载Valorant游戏数据")
+            return False
+        tracer.annotate(map=match_data.get('map'))
+        
+        # 步骤2-4: 并发生成各风格分析和语音，依次播放
+        if not await run_style_batch(self, match_data, styles or ["default"], va_convert_to_chinese_mature_tone,
+                                     VA_MODELS, voice_channel_id, force_fresh):
+            return False
+        
+        await asyncio.to_thread(cleanup_old_files, keep_count=5)
+        print("🎉 Valorant多风格流程执行成功!")
+        return True
 
 
 # Discord Bot 命令
@@ -565,9 +966,9 @@ class VAWorkflow:
 async def lol_analysis(ctx, *, args: str = None):
     """
     运行完整的LOL游戏分析流程
-    用法: !lol username#tag [风格名称]
+    用法: !lol username#tag [风格名称] [--fresh]
     示例: !lol Faker#KR1 professional
-    注意: 需要先加入语音频道
+    注意: 需要先加入语音频道；--fresh 忽略缓存重新生成
     """
     # 检查频道权限
     if not await check_channel_permission(ctx):
@@ -581,6 +982,10 @@ async def lol_analysis(ctx, *, args: str = None):
         # 解析参数：username#tag [style]
         parts = args.split()
         
+        # --fresh: 忽略分析结果缓存
+        force_fresh = "--fresh" in parts
+        parts = [part for part in parts if part != "--fresh"]
+        
         if len(parts) < 1:
             await ctx.reply("❌ 请提供用户名和标签，格式: `!lol username#tag [风格]`")
             return
@@ -629,8 +1034,6 @@ async def lol_analysis(ctx, *, args: str = None):
         
         username, tag = username_tag.split('#', 1)
         
-        workflow = LOLWorkflow(ctx=ctx)  # 传递Discord上下文
-        
         # 检查用户是否在语音频道中
         if not ctx.author.voice or not ctx.author.voice.channel:
             await ctx.reply("❌ 请先加入语音频道再使用此命令")
@@ -641,7 +1044,7 @@ async def lol_analysis(ctx, *, args: str = None):
         # 动态获取风格名称映射
         style_names = get_style_display_names()
         
-        await ctx.reply(f"🎮 **开始{style_names[style]}分析 {username}#{tag} 的最新游戏...**")
+        workflow = LOLWorkflow(ctx=ctx)  # 传递Discord上下文
         
         # 运行完整流程，传入用户名、标签和风格参数
         print("voice_channel_id:", voice_channel_id)
@@ -649,12 +1052,29 @@ async def lol_analysis(ctx, *, args: str = None):
         print("tag:", tag)
         print("style:", style)
 
-        success = await workflow.run_full_workflow_with_user(voice_channel_id, username, tag, style=style)
+        async def run_job():
+            await workflow.reporter.start(f"🎮 **开始{style_names[style]}分析 {username}#{tag} 的最新游戏...**")
+            return await workflow.run_full_workflow_with_user(voice_channel_id, username, tag, style=style, force_fresh=force_fresh)
+        
+        # 相同玩家+风格的进行中分析直接加入，不重复运行
+        job_key = make_job_key("LOL", f"{username}#{tag}", style)
+        job, attached = job_registry.submit(job_key, ctx.author.id, run_job)
+        if attached:
+            await ctx.reply(f"🔗 **{username}#{tag} 的{style_names[style]}分析已在进行中**，已加入该任务。")
+            return
         
-        if success:
-            await ctx.reply(f"🎉 **{style_names[style]}分析完成！** 游戏分析完成，音频已播放完毕。")
+        try:
+            success = await job.wait()
+        except asyncio.CancelledError:
+            await workflow.reporter.finish("🛑 **分析已取消**（请求者离开语音频道或发起了新的分析）")
+            return
+        
+        if success and workflow.text_only:
+            await workflow.reporter.finish(f"🎉 **{style_names[style]}分析完成！** 语音暂不可用，文字分析已发送。")
+        elif success:
+            await workflow.reporter.finish(f"🎉 **{style_names[style]}分析完成！** 游戏分析完成，音频已播放完毕。")
         else:
-            await ctx.reply("❌ **游戏分析失败**，请检查配置。")
+            await workflow.reporter.finish("❌ **游戏分析失败**，请检查配置。")
             
     except Exception as e:
         await ctx.reply(f"❌ **执行失败**: {e}")
@@ -670,19 +1090,19 @@ async def test_workflow(ctx):
     try:
         workflow = LOLWorkflow(ctx=ctx)  # 传递Discord上下文
         
-        await ctx.reply("🧪 **开始测试工作流程...**")
+        await workflow.reporter.start("🧪 **开始测试工作流程...**")
         
         # 只运行前3步
         if await workflow.step1_get_match_data():
             if await workflow.step2_convert_to_chinese():
                 if await workflow.step3_generate_tts():
-                    await ctx.reply("✅ **测试成功！** 音频文件已生成。")
+                    await workflow.reporter.finish("✅ **测试成功！** 音频文件已生成。")
                 else:
-                    await ctx.reply("❌ **TTS生成失败**")
+                    await workflow.reporter.finish("❌ **TTS生成失败**")
             else:
-                await ctx.reply("❌ **中文分析生成失败**")
+                await workflow.reporter.finish("❌ **中文分析生成失败**")
         else:
-            await ctx.reply("❌ **游戏数据获取失败**")
+            await workflow.reporter.finish("❌ **游戏数据获取失败**")
             
     except Exception as e:
         await ctx.reply(f"❌ **测试失败**: {e}")
@@ -692,9 +1112,9 @@ async def test_workflow(ctx):
 async def va_analysis(ctx, *, args: str = None):
     """
     检查指定用户的Valorant最新游戏数据
-    用法: !va username#tag [风格名称]
+    用法: !va username#tag [风格名称] [--fresh]
     示例: !va TenZ#SEN professional
-    注意: 需要先加入语音频道
+    注意: 需要先加入语音频道；--fresh 忽略缓存重新生成
     """
     # 检查频道权限
     if not await check_channel_permission(ctx):
@@ -709,6 +1129,10 @@ async def va_analysis(ctx, *, args: str = None):
         # 处理用户名和标签可能被空格分隔的情况
         parts = args.split()
         
+        # --fresh: 忽略分析结果缓存
+        force_fresh = "--fresh" in parts
+        parts = [part for part in parts if part != "--fresh"]
+        
         if len(parts) < 1:
             await ctx.reply("❌ 请提供用户名和标签，格式: `!va username#tag [风格]`")
             return
@@ -780,23 +1204,148 @@ async def va_analysis(ctx, *, args: str = None):
         # 动态获取风格名称映射
         style_names = get_style_display_names()
         
-        await ctx.reply(f"🔫 **开始{style_names[style]}分析 {game_name}#{tag_line} 的最新Valorant游戏...**")
-        
         # 创建Valorant工作流程
         workflow = VAWorkflow(ctx=ctx)
         
         # 运行完整流程，传入动态用户参数和风格
-        success = await workflow.run_full_workflow(voice_channel_id, game_name, tag_line, style=style)
+        async def run_job():
+            await workflow.reporter.start(f"🔫 **开始{style_names[style]}分析 {game_name}#{tag_line} 的最新Valorant游戏...**")
+            return await workflow.run_full_workflow(voice_channel_id, game_name, tag_line, style=style, force_fresh=force_fresh)
+        
+        # 相同玩家+风格的进行中分析直接加入，不重复运行
+        job_key = make_job_key("VALORANT", f"{game_name}#{tag_line}", style)
+        job, attached = job_registry.submit(job_key, ctx.author.id, run_job)
+        if attached:
+            await ctx.reply(f"🔗 **{game_name}#{tag_line} 的{style_names[style]}Valorant分析已在进行中**，已加入该任务。")
+            return
+        
+        try:
+            success = await job.wait()
+        except asyncio.CancelledError:
+            await workflow.reporter.finish("🛑 **Valorant分析已取消**（请求者离开语音频道或发起了新的分析）")
+            return
         
-        if success:
-            await ctx.reply(f"🎉 **{game_name}#{tag_line} 的{style_names[style]}Valorant分析完成！** 游戏分析完成，音频已播放完毕。")
+        if success and workflow.text_only:
+            await workflow.reporter.finish(f"🎉 **{game_name}#{tag_line} 的{style_names[style]}Valorant分析完成！** 语音暂不可用，文字分析已发送。")
+        elif success:
+            await workflow.reporter.finish(f"🎉 **{game_name}#{tag_line} 的{style_names[style]}Valorant分析完成！** 游戏分析完成，音频已播放完毕。")
         else:
-            await ctx.reply("❌ **Valorant游戏分析失败**，请检查用户名和标签是否正确。")
+            await workflow.reporter.finish("❌ **Valorant游戏分析失败**，请检查用户名和标签是否正确。")
             
     except Exception as e:
         await ctx.reply(f"❌ **执行失败**: {e}")
 
 
+def parse_multi_style_args(args):
+    """
+    解析多风格命令参数: username#tag 风格1 风格2 ... [--fresh]
+    
+    Returns:
+        tuple: (game_name, tag_line, styles, force_fresh, 错误信息)
+    """
+    from services.prompts import prompt_manager
+    valid_styles = prompt_manager.get_available_styles()
+    
+    parts = (args or "").split()
+    force_fresh = "--fresh" in parts
+    parts = [part for part in parts if part != "--fresh"]
+    
+    username_tag = next((part for part in parts if '#' in part), None)
+    if not username_tag:
+        return None, None, [], force_fresh, "❌ 请提供用户名和标签，格式: `username#tag 风格1 风格2 ...`"
+    
+    game_name, tag_line = [x.strip() for x in username_tag.split('#', 1)]
+    if not game_name or not tag_line:
+        return None, None, [], force_fresh, "❌ 用户名和标签不能为空"
+    
+    styles = []
+    for part in parts[parts.index(username_tag) + 1:]:
+        if part not in valid_styles:
+            return None, None, [], force_fresh, f"❌ 无效的风格名称 '{part}'。可用风格: {', '.join(valid_styles)}"
+        if part not in styles:
+            styles.append(part)
+    
+    if len(styles) < 2:
+        return None, None, [], force_fresh, "❌ 请至少提供两个风格，例如: `Faker#KR1 kfk azi`"
+    
+    return game_name, tag_line, styles, force_fresh, None
+
+
+async def run_multi_style_command(ctx, args, game, workflow_class):
+    """!lol_multi / !va_multi 的共同逻辑"""
+    game_name, tag_line, styles, force_fresh, error = parse_multi_style_args(args)
+    if error:
+        await ctx.reply(error)
+        return
+    
+    # 检查用户是否在语音频道中
+    if not ctx.author.voice or not ctx.author.voice.channel:
+        await ctx.reply("❌ 请先加入语音频道再使用此命令")
+        return
+    
+    voice_channel_id = ctx.author.voice.channel.id
+    style_names = get_style_display_names()
+    workflow = workflow_class(ctx=ctx)
+    
+    async def run_job():
+        names = "、".join(style_names[style] for style in styles)
+        await workflow.reporter.start(f"🎭 **开始多风格分析 {game_name}#{tag_line}**: {names}")
+        return await workflow.run_multi_style_workflow(voice_channel_id, game_name, tag_line, styles, force_fresh=force_fresh)
+    
+    job_key = make_job_key(game, f"{game_name}#{tag_line}", "+".join(styles))
+    job, attached = job_registry.submit(job_key, ctx.author.id, run_job)
+    if attached:
+        await ctx.reply(f"🔗 **{game_name}#{tag_line} 的多风格分析已在进行中**，已加入该任务。")
+        return
+    
+    try:
+        success = await job.wait()
+    except asyncio.CancelledError:
+        await workflow.reporter.finish("🛑 **多风格分析已取消**（请求者离开语音频道或发起了新的分析）")
+        return
+    
+    if success:
+        await workflow.reporter.finish(f"🎉 **{game_name}#{tag_line} 的多风格分析完成！**")
+    else:
+        await workflow.reporter.finish("❌ **多风格分析失败**，请检查用户名和标签是否正确。")
+
+
+@bot.command(name="lol_multi")
+async def lol_multi_analysis(ctx, *, args: str = None):
+    """
+    同一场LOL游戏按多个风格生成点评（只获取一次比赛数据）
+    用法: !lol_multi username#tag 风格1 风格2 ... [--fresh]
+    示例: !lol_multi Faker#KR1 kfk azi dingzhen
+    注意: 需要先加入语音频道
+    """
+    # 检查频道权限
+    if not await check_channel_permission(ctx):
+        return
+    
+    try:
+        await run_multi_style_command(ctx, args, "LOL", LOLWorkflow)
+    except Exception as e:
+        await ctx.reply(f"❌ **执行失败**: {e}")
+
+
+@bot.command(name="va_multi")
+async def va_multi_analysis(ctx, *, args: str = None):
+    """
+    同一场Valorant游戏按多个风格生成点评（只获取一次比赛数据）
+    用法: !va_multi username#tag 风格1 风格2 ... [--fresh]
+    示例: !va_multi TenZ#SEN va_kfk va_kfk_dp
+    注意: 需要先加入语音频道
+    """
+    # 检查频道权限
+    if not await check_channel_permission(ctx):
+        return
+    
+    try:
+        await run_multi_style_command(ctx, args, "VALORANT", VAWorkflow)
+    except Exception as e:
+        await ctx.reply(f"❌ **执行失败**: {e}")
+
+
 @bot.command(name="files")
 async def show_file_stats(ctx):
     """
@@ -812,9 +1361,17 @@ async def show_file_stats(ctx):
         
         stats_msg = f"📊 **文件统计信息**\n"
         stats_msg += f"📄 分析文件: {stats['analysis']} 个\n"
-        stats_msg += f"🎵 音频文件: {stats['audio']} 个\n"
         stats_msg += f"📝 中文分析: {stats['chinese_analysis']} 个\n"
-        stats_msg += f"💾 总计: {sum(stats.values())} 个文件"
+        stats_msg += f"💾 总计: {sum(stats.values())} 个文件, {artifact_store.get_stats()['bytes'] / 1024:.0f} KB\n"
+        
+        archive_stats = match_archive.get_stats()
+        stats_msg += (f"🗃️ 归档: {archive_stats['records']} 条, "
+                      f"{archive_stats['stored_bytes'] / 1024:.0f} KB（原始 {archive_stats['raw_bytes'] / 1024:.0f} KB）\n")
+        
+        cache_stats = tts_cache.get_stats()
+        stats_msg += (f"🗄️ TTS缓存: {cache_stats['entries']} 个文件, "
+                      f"{cache_stats['bytes'] / 1024 / 1024:.1f} MB, "
+                      f"命中 {cache_stats['hits']} / 未命中 {cache_stats['misses']}")
         
         await ctx.reply(stats_msg)
         
@@ -822,6 +1379,56 @@ async def show_file_stats(ctx):
         await ctx.reply(f"❌ **获取统计失败**: {e}")
 
 
+@bot.command(name="latency")
+async def show_latency_stats(ctx, last_n: int = 50):
+    """
+    显示工作流程各步骤和上游调用的延迟统计
+    用法: !latency [最近N次运行]
+    """
+    # 检查频道权限
+    if not await check_channel_permission(ctx):
+        return
+    
+    if last_n <= 0:
+        await ctx.reply("❌ **参数错误**: 运行次数必须是正整数，例如 `!latency 50`")
+        return
+    
+    try:
+        stats = tracer.get_stats(last_n=last_n)
+        if not stats:
+            await ctx.reply("📊 暂无延迟数据，请先运行一次分析。")
+            return
+        
+        lines = [f"{'步骤':<24}{'次数':>6}{'p50':>9}{'p95':>9}{'p99':>9}"]
+        for name in sorted(stats):
+            item = stats[name]
+            lines.append(
+                f"{name:<24}{item['count']:>6}"
+                f"{item['p50'] / 1000:>8.2f}s{item['p95'] / 1000:>8.2f}s{item['p99'] / 1000:>8.2f}s"
+            )
+        
+        runs = min(last_n, len(tracer.get_recent_runs(last_n)))
+        stats_msg = f"⏱️ **延迟统计（最近 {runs} 次运行）**\n```\n" + "\n".join(lines) + "\n```"
+        
+        llm_stats = llm_client.get_stats()
+        if llm_stats["requests"]:
+            stats_msg += (
+                f"\n🤖 OpenAI: {llm_stats['requests']} 次请求, {llm_stats['failures']} 次失败, "
+                f"排队 {llm_stats['queued']} 次, 平均 {llm_stats['avg_latency_ms'] / 1000:.2f}s, "
+                f"tokens {llm_stats['prompt_tokens']}/{llm_stats['completion_tokens']}"
+            )
+        
+        for model, item in model_router.get_stats().items():
+            stats_msg += (
+                f"\n🧠 {model}: {item['requests']} 次, 错误率 {item['error_rate']:.0%}, "
+                f"对冲 {item['hedges']} 次, p50 {item['p50'] / 1000:.2f}s, p95 {item['p95'] / 1000:.2f}s"
+            )
+        await ctx.reply(stats_msg[:2000])
+        
+    except Exception as e:
+        await ctx.reply(f"❌ **获取延迟统计失败**: {e}")
+
+
 # 全局频道检查事件
 @bot.event
 async def on_message(message):
@@ -856,10 +1463,13 @@ async def on_ready():
     print("可用命令:")
     print("  !lol username#tag [风格] - 分析指定用户的LOL最新游戏数据")
     print("  !va username#tag [风格] - 分析指定用户的Valorant最新游戏数据")
+    print("  !lol_multi / !va_multi username#tag 风格1 风格2 ... - 同一场游戏按多个风格生成点评")
+    print("  （在命令末尾加 --fresh 忽略缓存重新生成）")
     print("  !register_riot username#tag - 注册Riot ID绑定")
     print("  !unregister_riot - 取消Riot ID绑定")
     print("  !test - 测试工作流程（不播放音频）")
     print("  !files - 显示文件统计信息")
+    print("  !latency [N] - 显示最近N次运行的各步骤延迟 p50/p95/p99")
     print("  !check_presence [RiotID] - 检查用户在线状态")
     print("  !online_players - 显示所有在线玩家")
     print("  !voice_players - 显示所有在语音频道的玩家")
@@ -0,0 +1,142 @@
+"""
+Workflow Progress Reporter Module
+工作流程进度汇报 - 只发送一条状态消息并原地编辑，合并短时间内的多次更新
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import discord
+
+# Discord单条消息的最大长度
+MAX_MESSAGE_LENGTH = 2000
+
+
+class ProgressReporter:
+    """
+    进度汇报接口
+
+    工作流程只通过该接口汇报进度，不直接调用 ctx.send。
+    默认实现不做任何事（用于自动监控等没有Discord上下文的场景，
+    各步骤本身已经输出控制台日志）
+    """
+
+    async def start(self, title: str):
+        """开始汇报，title 为状态消息的标题"""
+        pass
+
+    async def update(self, key: str, text: str):
+        """更新某个步骤的状态，相同 key 的更新会覆盖之前的内容"""
+        pass
+
+    async def finish(self, text: str):
+        """结束汇报，text 为最终结果"""
+        pass
+
+    async def post_result(self, text: str):
+        """单独发送结果内容（例如文字版分析），不影响状态消息"""
+        pass
+
+
+class DiscordProgressReporter(ProgressReporter):
+    """
+    Discord进度汇报器
+
+    第一次汇报时发送一条状态消息，后续更新通过编辑该消息完成。
+    两次编辑之间至少间隔 min_interval 秒，间隔内的更新会被合并为一次编辑
+    """
+
+    def __init__(self, ctx, min_interval: float = 1.5):
+        self.ctx = ctx
+        self.min_interval = min_interval
+        self.title = ""
+        self.footer = ""
+        self.lines = OrderedDict()
+        self.message: Optional[discord.Message] = None
+        self._last_edit = 0.0
+        self._flush_task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    def render(self) -> str:
+        """将标题、各步骤状态和结果拼接为消息内容"""
+        parts = [self.title] if self.title else []
+        parts.extend(self.lines.values())
+        if self.footer:
+            parts.append(self.footer)
+        content = "\n".join(parts)
+        if len(content) > MAX_MESSAGE_LENGTH:
+            content = content[:MAX_MESSAGE_LENGTH - 3] + "..."
+        return content
+
+    async def start(self, title: str):
+        self.title = title
+        await self._flush()
+
+    async def update(self, key: str, text: str):
+        self.lines[key] = text
+
+        if self.message is None:
+            await self._flush()
+            return
+
+        # 已有待执行的编辑，本次更新会随它一起发送
+        if self._flush_task and not self._flush_task.done():
+            return
+
+        delay = self._last_edit + self.min_interval - time.monotonic()
+        if delay <= 0:
+            await self._flush()
+        else:
+            self._flush_task = asyncio.create_task(self._delayed_flush(delay))
+
+    async def finish(self, text: str):
+        self.footer = text
+        if self._flush_task and not self._flush_task.done():
+            self._flush_task.cancel()
+        await self._flush()
+
+    async def post_result(self, text: str):
+        # 结果可能超过单条消息长度，按长度切分发送
+        for start in range(0, len(text), MAX_MESSAGE_LENGTH):
+            await self.ctx.send(text[start:start + MAX_MESSAGE_LENGTH])
+
+    async def _delayed_flush(self, delay: float):
+        try:
+            await asyncio.sleep(delay)
+            await self._flush()
+        except asyncio.CancelledError:
+            pass
+
+    async def _flush(self):
+        """发送或编辑状态消息"""
+        async with self._lock:
+            content = self.render()
+            if not content:
+                return
+            try:
+                if self.message is None:
+                    self.message = await self.ctx.reply(content)
+                else:
+                    await self.message.edit(content=content)
+            except discord.HTTPException as e:
+                # 状态消息被删除等情况下重新发送一条
+                print(f"⚠️ 编辑进度消息失败，重新发送: {e}")
+                self.message = await self.ctx.send(content)
+            self._last_edit = time.monotonic()
+
+
+def create_progress_reporter(ctx=None) -> ProgressReporter:
+    """
+    根据是否有Discord上下文创建进度汇报器
+
+    Args:
+        ctx: Discord命令上下文，为None时不汇报
+
+    Returns:
+        进度汇报器实例
+    """
+    if ctx is None:
+        return ProgressReporter()
+    return DiscordProgressReporter(ctx)
@@ -7,6 +7,7 @@ from .utils import (
     find_latest_json_file,
     load_json_file,
     save_json_file,
+    save_json_file_async,
     generate_timestamp,
     ensure_directory,
     get_audio_filename,
@@ -22,6 +23,7 @@ __all__ = [
     'find_latest_json_file',
     'load_json_file', 
     'save_json_file',
+    'save_json_file_async',
     'generate_timestamp',
     'ensure_directory',
     'get_audio_filename',
@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""
+分析产物存储（比赛数据 JSON、中文分析文本）
+- 所有产物放在同一个根目录（ARTIFACT_ROOT，默认项目根目录下的 analysis/），不再混用相对当前目录的路径
+- 小型清单 manifest.json 记录每个产物的 类型/比赛ID/玩家/风格/创建时间/大小
+- 每次登记/删除只向 manifest.json.log 追加一行（O(1)），日志行数超过条目数时才重写清单并清空日志
+- 内存中按 (类型, 玩家) 维护时间顺序队列，“某玩家最新的产物”为 O(1)
+- 按字节预算和每种类型的保留数量淘汰最旧的产物，不再每次命令都 glob + stat 整个目录
+- 淘汰的产物先压缩追加到长期归档（match_archive.py），再从工作目录删除
+"""
+
+import json
+import os
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from services.config import Config
+from services.match_archive import MatchArchive, match_archive
+
+MANIFEST_NAME = "manifest.json"
+
+# 类型 -> (文件名前缀, 扩展名)，沿用原来的文件名
+KINDS = {
+    "lol_match": ("match_analysis_", ".json"),
+    "va_match": ("valorant_last_match_", ".json"),
+    "lol_text": ("chinese_analysis_", ".txt"),
+    "va_text": ("valorant_chinese_analysis_", ".txt"),
+}
+
+
+class ArtifactStore:
+    """带清单索引的产物存储（线程安全）"""
+
+    def __init__(self, root: str, max_bytes: int = 0, archive: Optional[MatchArchive] = None):
+        """
+        Args:
+            root: 产物根目录
+            max_bytes: 所有产物的字节预算，<=0 表示不限制
+            archive: 淘汰时写入的长期归档，None 表示直接删除
+        """
+        self.root = os.path.abspath(root)
+        self.archive = archive
+        self.manifest_path = os.path.join(self.root, MANIFEST_NAME)
+        self.journal_path = self.manifest_path + ".log"
+        self._journal_lines = 0
+        self._snapshot_size = 0  # 上次重写时清单中的条目数
+        self.max_bytes = max_bytes
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()  # 文件名 -> 条目，按创建时间
+        self._queues: Dict[Tuple[str, Optional[str]], Deque[str]] = {}  # (类型, 玩家或None) -> 文件名
+        self._by_match: Dict[Tuple[str, str], str] = {}  # (类型, 比赛ID) -> 最新的文件名
+        self._bytes = 0
+
+    # ---------- 清单 ----------
+
+    def _load(self):
+        """第一次使用时读取清单；清单不存在或损坏时扫描一次目录重建"""
+        if self._loaded:
+            return
+        self._loaded = True
+        os.makedirs(self.root, exist_ok=True)
+
+        entries = None
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                entries = json.load(f).get("artifacts")
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            print(f"WARNING: 产物清单损坏，重新扫描目录: {e}")
+
+        if entries is None:
+            # 清单不可用时日志也没有意义，扫描结果写成新的清单
+            entries = self._scan()
+            self._index_all(entries)
+            self._save()
+        else:
+            self._index_all(entries)
+            self._snapshot_size = len(entries)
+            self._replay()
+
+    def _replay(self):
+        """把清单之后追加的登记/删除重新应用到索引"""
+        try:
+            with open(self.journal_path, "rb") as f:
+                for raw in f:
+                    if not raw.endswith(b"\n"):
+                        break  # 进程崩溃留下的半行
+                    try:
+                        record = json.loads(raw)
+                    except ValueError:
+                        print("WARNING: 跳过损坏的清单日志行")
+                        continue
+                    self._apply(record)
+                    self._journal_lines += 1
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"WARNING: 读取清单日志失败: {e}")
+
+    def _apply(self, record: Dict[str, Any]):
+        if record.get("op") == "add":
+            self._unindex(record["entry"]["name"])
+            self._index(record["entry"])
+        elif record.get("op") == "remove":
+            self._unindex(record["name"])
+
+    def _scan(self) -> List[Dict[str, Any]]:
+        """从目录中已有的文件重建清单（只在没有清单时执行一次）"""
+        entries = []
+        for name in os.listdir(self.root):
+            kind = self._kind_of(name)
+            if not kind:
+                continue
+            stat = os.stat(os.path.join(self.root, name))
+            entries.append({
+                "name": name,
+                "kind": kind,
+                "match_id": None,
+                "player": None,
+                "style": None,
+                "created": datetime.fromtimestamp(stat.st_mtime).isoformat(),
+                "size": stat.st_size,
+            })
+        entries.sort(key=lambda entry: entry["created"])
+        return entries
+
+    @staticmethod
+    def _kind_of(name: str) -> Optional[str]:
+        for kind, (prefix, ext) in KINDS.items():
+            if name.startswith(prefix) and name.endswith(ext):
+                return kind
+        return None
+
+    def _index_all(self, entries: List[Dict[str, Any]]):
+        self._entries.clear()
+        self._queues.clear()
+        self._by_match.clear()
+        self._bytes = 0
+        for entry in entries:
+            self._index(entry)
+
+    def _index(self, entry: Dict[str, Any]):
+        self._entries[entry["name"]] = entry
+        self._bytes += entry["size"]
+        self._queues.setdefault((entry["kind"], None), deque()).append(entry["name"])
+        if entry.get("player"):
+            self._queues.setdefault((entry["kind"], entry["player"]), deque()).append(entry["name"])
+        if entry.get("match_id"):
+            self._by_match[(entry["kind"], entry["match_id"])] = entry["name"]
+
+    def _unindex(self, name: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.pop(name, None)
+        if not entry:
+            return None
+        self._bytes -= entry["size"]
+        if self._by_match.get((entry["kind"], entry.get("match_id"))) == name:
+            del self._by_match[(entry["kind"], entry["match_id"])]
+        for key in ((entry["kind"], None), (entry["kind"], entry.get("player"))):
+            queue = self._queues.get(key)
+            if queue and name in queue:
+                # 淘汰的总是最旧的，通常在队首
+                if queue[0] == name:
+                    queue.popleft()
+                else:
+                    queue.remove(name)
+        return entry
+
+    def _save(self):
+        """原子写入清单，然后清空已包含在清单中的日志"""
+        temp_path = self.manifest_path + ".tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump({"artifacts": list(self._entries.values())}, f, ensure_ascii=False)
+            os.replace(temp_path, self.manifest_path)
+            open(self.journal_path, "w").close()
+            self._journal_lines = 0
+            self._snapshot_size = len(self._entries)
+        except OSError as e:
+            print(f"ERROR: 保存产物清单失败: {e}")
+
+    def _journal(self, record: Dict[str, Any]):
+        """追加一条登记/删除记录，日志比上次的清单还长时压缩成新的清单（均摊 O(1)）"""
+        if self._journal_lines >= max(64, self._snapshot_size):
+            self._save()
+            return
+        try:
+            with open(self.journal_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._journal_lines += 1
+        except OSError as e:
+            print(f"WARNING: 写入清单日志失败，改为重写清单: {e}")
+            self._save()
+
+    # ---------- 写入 ----------
+
+    def new_path(self, kind: str) -> str:
+        """为新产物生成根目录下的文件路径（同一秒内的多个产物加序号区分）"""
+        prefix, ext = KINDS[kind]
+        with self._lock:
+            self._load()
+            stem = f"{prefix}{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+            name = stem + ext
+            sequence = 1
+            while name in self._entries or os.path.exists(os.path.join(self.root, name)):
+                name = f"{stem}_{sequence}{ext}"
+                sequence += 1
+            return os.path.join(self.root, name)
+
+    def add(self, path: str, kind: str, match_id: Optional[str] = None,
+            player: Optional[str] = None, style: Optional[str] = None) -> bool:
+        """
+        登记已写入根目录的产物，并按预算淘汰旧产物
+
+        Returns:
+            是否登记成功
+        """
+        if kind not in KINDS:
+            raise ValueError(f"未知产物类型: {kind}")
+        path = os.path.abspath(path)
+        if os.path.dirname(path) != self.root:
+            print(f"WARNING: 产物不在根目录 {self.root} 中，未登记: {path}")
+            return False
+        try:
+            size = os.path.getsize(path)
+        except OSError as e:
+            print(f"ERROR: 无法登记产物 {path}: {e}")
+            return False
+
+        name = os.path.basename(path)
+        with self._lock:
+            self._load()
+            entry = {
+                "name": name,
+                "kind": kind,
+                "match_id": match_id,
+                "player": player,
+                "style": style,
+                "created": datetime.now().isoformat(),
+                "size": size,
+            }
+            self._unindex(name)
+            self._index(entry)
+            self._journal({"op": "add", "entry": entry})
+            self._evict_locked()
+        return True
+
+    # ---------- 查询 ----------
+
+    def latest(self, kind: str, player: Optional[str] = None) -> Optional[str]:
+        """
+        某类型（可选：某玩家）最新产物的路径，O(1)
+
+        Returns:
+            文件路径，没有时返回None
+        """
+        with self._lock:
+            self._load()
+            queue = self._queues.get((kind, player))
+            while queue:
+                path = os.path.join(self.root, queue[-1])
+                if os.path.exists(path):
+                    return path
+                # 文件被手动删除，清单随之更新
+                name = queue[-1]
+                self._unindex(name)
+                self._journal({"op": "remove", "name": name})
+            return None
+
+    def find(self, kind: str, match_id: str) -> Optional[str]:
+        """按比赛ID查找最新的产物，O(1)"""
+        with self._lock:
+            self._load()
+            name = self._by_match.get((kind, match_id))
+            return os.path.join(self.root, name) if name else None
+
+    def count(self, kind: Optional[str] = None) -> int:
+        with self._lock:
+            self._load()
+            if kind is None:
+                return len(self._entries)
+            return len(self._queues.get((kind, None), ()))
+
+    def get_stats(self) -> Dict[str, int]:
+        """各类型的产物数量和总字节数"""
+        with self._lock:
+            self._load()
+            stats = {kind: len(self._queues.get((kind, None), ())) for kind in KINDS}
+            stats["bytes"] = self._bytes
+            return stats
+
+    # ---------- 淘汰 ----------
+
+    def _remove_locked(self, name: str) -> Optional[Dict[str, Any]]:
+        """
+        淘汰一个产物：先归档，归档成功后才移出清单并删除文件
+
+        Returns:
+            被淘汰的条目；归档失败时文件和清单条目都保留，返回None
+        """
+        entry = self._entries.get(name)
+        if not entry:
+            return None
+        path = os.path.join(self.root, name)
+        if self.archive is not None and os.path.exists(path):
+            if not self.archive.add_file(
+                path, entry["kind"], match_id=entry.get("match_id"),
+                player=entry.get("player"), style=entry.get("style"), created=entry.get("created"),
+            ):
+                print(f"WARNING: 归档失败，保留产物 {name}")
+                return None
+        self._unindex(name)
+        self._journal({"op": "remove", "name": name})
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"❌ 删除文件失败 {name}: {e}")
+        return entry
+
+    def _evict_locked(self) -> List[Dict[str, Any]]:
+        removed = []
+        # 从最旧的开始，归档失败的跳过，避免一直卡在同一个文件上
+        for name in list(self._entries):
+            if self.max_bytes <= 0 or self._bytes <= self.max_bytes or len(self._entries) <= 1:
+                break
+            entry = self._remove_locked(name)
+            if entry:
+                removed.append(entry)
+        return removed
+
+    def evict(self, keep_per_kind: Optional[int] = None, kinds: Optional[List[str]] = None) -> Dict[str, int]:
+        """
+        淘汰最旧的产物：每种类型只保留 keep_per_kind 个，且总大小不超过字节预算
+
+        Args:
+            keep_per_kind: 每种类型保留的数量，None 表示只按字节预算
+            kinds: 只处理这些类型，None 表示全部
+
+        Returns:
+            {类型: 删除数量}
+        """
+        removed: Dict[str, int] = {kind: 0 for kind in KINDS}
+        with self._lock:
+            self._load()
+            if keep_per_kind is not None:
+                for kind in kinds or KINDS:
+                    queue = list(self._queues.get((kind, None), ()))
+                    for name in queue[:max(len(queue) - keep_per_kind, 0)]:
+                        if self._remove_locked(name):
+                            removed[kind] += 1
+            for entry in self._evict_locked():
+                removed[entry["kind"]] += 1
+        return removed
+
+
+# 全局产物存储
+artifact_store = ArtifactStore(Config.ARTIFACT_ROOT, Config.ARTIFACT_MAX_BYTES,
+                               archive=match_archive if Config.ARCHIVE_ENABLED else None)
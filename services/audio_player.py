@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Discord 音频播放模块
+将TTS音频一次性转码为 Ogg/Opus (48kHz)，播放时直接透传Opus数据包，
+避免每次播放都启动ffmpeg解码并在Python中重新编码
+"""
+
+import os
+from typing import Optional
+
+import discord
+import ffmpeg
+from discord.oggparse import OggStream, OggError
+
+from services.tts_cache import tts_cache
+
+# Discord 语音使用的采样率和声道数
+OPUS_SAMPLE_RATE = 48000
+OPUS_CHANNELS = 2
+OPUS_BITRATE = "64k"
+
+
+def get_opus_path(audio_file: str) -> str:
+    """
+    获取音频文件对应的Opus缓存路径
+
+    Args:
+        audio_file: 原始音频文件路径
+
+    Returns:
+        同目录下同名的 .opus 文件路径
+    """
+    base, _ = os.path.splitext(audio_file)
+    return f"{base}.opus"
+
+
+def is_opus_cache_valid(audio_file: str, opus_file: str) -> bool:
+    """
+    检查Opus缓存是否可用（存在、非空且不早于原始文件）
+    """
+    if not os.path.exists(opus_file) or os.path.getsize(opus_file) == 0:
+        return False
+    if os.path.exists(audio_file) and os.path.getmtime(opus_file) < os.path.getmtime(audio_file):
+        return False
+    return True
+
+
+def transcode_to_opus(audio_file: str, opus_file: str = None) -> Optional[str]:
+    """
+    将音频文件转码为 Ogg/Opus (48kHz)，结果会被缓存
+
+    Args:
+        audio_file: 原始音频文件路径（mp3/wav等）
+        opus_file: 输出路径，如果为None则使用同名 .opus 文件
+
+    Returns:
+        Opus文件路径，失败返回None
+    """
+    if audio_file.endswith(".opus"):
+        return audio_file
+
+    if not opus_file:
+        opus_file = get_opus_path(audio_file)
+
+    # 已转码过则直接复用
+    if is_opus_cache_valid(audio_file, opus_file):
+        return opus_file
+
+    if not os.path.exists(audio_file):
+        print(f"[ERROR] 音频文件不存在: {audio_file}")
+        return None
+
+    # 先写入临时文件再重命名，避免播放到未写完的文件
+    tmp_file = f"{opus_file}.tmp"
+    try:
+        (
+            ffmpeg
+            .input(audio_file)
+            .output(
+                tmp_file,
+                format="ogg",
+                acodec="libopus",
+                ar=OPUS_SAMPLE_RATE,
+                ac=OPUS_CHANNELS,
+                audio_bitrate=OPUS_BITRATE,
+                map_metadata=-1,
+            )
+            .overwrite_output()
+            .run(quiet=True)
+        )
+        os.replace(tmp_file, opus_file)
+        # TTS缓存中的音频：转码结果一并计入缓存字节预算
+        tts_cache.track_sibling(audio_file, opus_file)
+        print(f"🎼 Opus转码完成: {opus_file}")
+        return opus_file
+    except Exception as e:
+        print(f"[ERROR] Opus转码失败: {e}")
+        if os.path.exists(tmp_file):
+            try:
+                os.remove(tmp_file)
+            except OSError:
+                pass
+        return None
+
+
+class OggOpusAudio(discord.AudioSource):
+    """
+    直接读取 Ogg/Opus 文件的音频源
+
+    discord.py 对 is_opus() 为 True 的音频源不会再做编码，
+    数据包原样发送，因此播放时既不需要ffmpeg进程也不需要PCM编码
+    """
+
+    def __init__(self, opus_file: str):
+        self._file = open(opus_file, "rb")
+        self._packets = OggStream(self._file).iter_packets()
+
+    def read(self) -> bytes:
+        try:
+            while True:
+                packet = next(self._packets, b"")
+                # 跳过Ogg/Opus头部包，只发送音频数据
+                if packet.startswith(b"OpusHead") or packet.startswith(b"OpusTags"):
+                    continue
+                return packet
+        except OggError as e:
+            print(f"[ERROR] Opus数据解析失败: {e}")
+            return b""
+
+    def is_opus(self) -> bool:
+        return True
+
+    def cleanup(self) -> None:
+        if self._file and not self._file.closed:
+            self._file.close()
+
+
+def create_audio_source(audio_file: str) -> discord.AudioSource:
+    """
+    为音频文件创建Discord音频源
+
+    优先使用已缓存的Opus文件透传播放，缓存不存在时尝试转码；
+    转码失败则回退到 FFmpegPCMAudio。
+    转码会同步运行ffmpeg，在事件循环中请用 asyncio.to_thread 调用
+
+    Args:
+        audio_file: 音频文件路径
+
+    Returns:
+        Discord音频源
+    """
+    opus_file = transcode_to_opus(audio_file)
+    if opus_file:
+        return OggOpusAudio(opus_file)
+
+    print("⚠️ Opus不可用，回退到FFmpegPCMAudio播放")
+    return discord.FFmpegPCMAudio(audio_file)
+
+
+class AudioPipe:
+    """
+    边下载边播放的管道
+
+    下载线程调用 write() 写入音频数据块，播放端从 reader 读取；
+    播放端提前退出时写入静默失败，下载仍会继续写完磁盘文件
+    """
+
+    def __init__(self):
+        read_fd, write_fd = os.pipe()
+        self.reader = os.fdopen(read_fd, "rb")
+        self._writer = os.fdopen(write_fd, "wb", buffering=0)
+        self.broken = False
+
+    def write(self, chunk: bytes) -> None:
+        if self.broken:
+            return
+        try:
+            self._writer.write(chunk)
+        except (OSError, ValueError):
+            # 播放端已关闭
+            self.broken = True
+
+    def close(self) -> None:
+        """下载结束，播放端读到EOF后停止"""
+        try:
+            self._writer.close()
+        except OSError:
+            pass
+
+    def abort(self) -> None:
+        """播放取消，关闭读取端使阻塞中的写入立即返回"""
+        self.broken = True
+        try:
+            self.reader.close()
+        except OSError:
+            pass
+        self.close()
+
+
+def create_stream_source(pipe: AudioPipe) -> discord.AudioSource:
+    """
+    为下载中的mp3数据创建Discord音频源（ffmpeg从管道读取并编码为Opus）
+
+    Args:
+        pipe: 音频管道
+
+    Returns:
+        Discord音频源
+    """
+    return discord.FFmpegOpusAudio(pipe.reader, pipe=True, before_options="-f mp3")
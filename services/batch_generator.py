@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+多风格批量生成
+同一场已分析的比赛按多个风格生成点评：比赛数据只获取和解析一次，
+各风格的 LLM 请求并发发出（每个风格单独与本地模板对冲），
+TTS 按各风格的 voice_id 并发生成，LLM 结果写入分析结果缓存
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from services.config import Config
+from services.generation_cache import GenerationResult, generation_cache, make_generation_key
+from services.template_engine import LLM_PATH, hedge_with_template
+from services.voicv_tts import generate_tts_audio, get_cached_tts_audio, get_tts_unavailable_reason
+
+# convert_to_chinese_mature_tone(match_data, prompt, system_role, style, deadline) -> (text, voice_id)
+ConvertFunc = Callable[..., Awaitable]
+
+
+async def generate_styles(match_data: Dict[str, Any], styles: List[str], convert: ConvertFunc,
+                          models: List[str], deadline=None,
+                          force_fresh: bool = False) -> Tuple[Dict[str, GenerationResult], Dict[str, str]]:
+    """
+    并发生成多个风格的分析文字，每个风格的LLM请求超时或出错时使用本地模板
+
+    Args:
+        match_data: 已解析的比赛数据
+        styles: 风格列表
+        convert: 分析函数（LOL或Valorant的 convert_to_chinese_mature_tone）
+        models: 分析器的默认模型列表（风格配置了 "models" 时以风格为准，缓存键的一部分）
+        deadline: 工作流程截止时间
+        force_fresh: 忽略缓存
+
+    Returns:
+        ({风格: 生成结果}, {风格: 胜出路径 "llm" / "template" / "fallback"})，
+        LLM和模板都失败的风格不包含在内；缓存命中的风格路径为 "llm"（只缓存LLM结果）
+    """
+    results: Dict[str, GenerationResult] = {}
+    paths: Dict[str, str] = {}
+    keys = {style: make_generation_key(match_data, style, models) for style in styles}
+
+    pending = []
+    for style in styles:
+        cached = None if force_fresh else generation_cache.get(keys[style])
+        if cached:
+            print(f"⚡ 使用缓存的分析结果: {style}")
+            results[style] = cached
+            paths[style] = LLM_PATH
+        else:
+            pending.append(style)
+
+    # 未命中缓存的风格并发请求（全局并发由共享LLM客户端控制）
+    outputs = await asyncio.gather(*[
+        hedge_with_template(convert(match_data, None, None, style, deadline), match_data, style, deadline)
+        for style in pending
+    ])
+    for style, (output, path) in zip(pending, outputs):
+        text, voice_id = output if output else (None, None)
+        if not text:
+            print(f"[ERROR] 风格 {style} 分析生成失败")
+            continue
+        paths[style] = path
+        # 只缓存LLM结果，模板结果下次仍尝试LLM
+        if path == LLM_PATH:
+            results[style] = generation_cache.put(keys[style], text, voice_id)
+        else:
+            results[style] = GenerationResult(text, voice_id)
+
+    # 按请求的风格顺序返回
+    ordered = [style for style in styles if style in results]
+    return {style: results[style] for style in ordered}, {style: paths[style] for style in ordered}
+
+
+async def generate_style_audio(results: Dict[str, GenerationResult], deadline=None) -> Dict[str, str]:
+    """
+    按各风格的 voice_id 并发生成语音，已有音频的风格直接复用
+
+    Args:
+        results: generate_styles 的返回结果
+        deadline: 工作流程截止时间
+
+    Returns:
+        {风格: 音频文件路径}，TTS不可用或失败的风格不包含在内
+    """
+    audio_files = {style: result.audio_file for style, result in results.items() if result.has_audio()}
+
+    missing = [style for style in results if style not in audio_files]
+    if not missing:
+        return audio_files
+
+    # TTS不可用时只生成已在TTS缓存中的风格
+    reason = get_tts_unavailable_reason()
+    if reason:
+        missing = [style for style in missing
+                   if get_cached_tts_audio(results[style].text, results[style].voice_id)]
+        if not missing:
+            print(f"⏭️ 跳过批量TTS: {reason}")
+            return audio_files
+
+    semaphore = asyncio.Semaphore(Config.TTS_MAX_CONCURRENCY)
+
+    async def render(style: str) -> Optional[str]:
+        result = results[style]
+        # 音频按内容哈希保存在TTS缓存中，不同风格不会互相覆盖
+        async with semaphore:
+            return await asyncio.to_thread(
+                generate_tts_audio, result.text, None, result.voice_id, deadline
+            )
+
+    rendered = await asyncio.gather(*[render(style) for style in missing])
+    for style, audio_file in zip(missing, rendered):
+        if audio_file:
+            # 结果对象就是缓存条目，音频随之写入缓存
+            results[style].audio_file = audio_file
+            audio_files[style] = audio_file
+
+    return {style: audio_files[style] for style in results if style in audio_files}
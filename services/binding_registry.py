@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""
+进程内共享的玩家绑定注册表
+- 启动时从玩家存储加载一次，按 Discord ID 和 Riot ID 建立字典索引，查询只访问内存
+- 其他进程通过同一数据库提交修改后（PRAGMA data_version 变化）重新加载，保留本进程尚未写回的状态；
+  写回带 last_check 条件，不覆盖其他进程写入的更新状态
+- 注册/解绑立即写入存储（需要保证唯一性和持久化）
+- 状态更新先与当前状态比较：只有 last_check 变化的心跳只保存在内存中，
+  真正的状态变化标记为脏，去抖后批量写回（每个写回间隔一次事务）
+- 状态变化同时追加到事件日志；启动时用日志快照恢复数据库中尚未写回的状态
+- 在线玩家的 last_check 放进最小堆，过期清理只弹出已过期的条目（O(k log n)）
+- 心跳不写入数据库，启动时在线玩家的 last_check 重置为启动时间，由监控在一个过期周期内重新确认
+"""
+
+import atexit
+import heapq
+import os
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from services.player_store import COLUMNS, PlayerStore, get_player_store
+from services.status_log import STATUS_FIELDS, StatusEventLog
+
+# 只有这些字段变化时视为心跳，不写入数据库
+HEARTBEAT_FIELDS = frozenset({"last_check"})
+
+
+class BindingRegistry:
+    """带写回缓存的玩家绑定注册表（线程安全）"""
+
+    def __init__(self, store: PlayerStore, flush_delay: float = 2.0,
+                 status_log: Optional[StatusEventLog] = None):
+        """
+        Args:
+            store: 底层玩家存储
+            flush_delay: 状态更新后等待多久批量写回（秒），<=0 表示立即写入
+            status_log: 状态事件日志，None 表示不记录历史
+        """
+        self.store = store
+        self.flush_delay = flush_delay
+        self.status_log = status_log
+        self.flushes = 0
+        self.transitions = 0  # 需要写回的状态变化次数
+        self.heartbeats = 0  # 只保存在内存中的心跳次数
+        self._lock = threading.RLock()
+        self._by_discord: Dict[str, Dict[str, Any]] = {}
+        self._by_riot: Dict[str, Dict[str, Any]] = {}
+        self._dirty: Dict[str, Set[str]] = {}  # discord_id -> 待写回的字段
+        # (last_check, discord_id) 最小堆；玩家的 last_check 变化后旧条目作废，弹出时丢弃
+        self._expiry: List[Tuple[str, str]] = []
+        self._timer: Optional[threading.Timer] = None
+        # 串行化写回：取快照和写入数据库在同一把锁内，后取的快照一定后提交
+        # 加锁顺序固定为 _flush_lock -> _lock，持有 _lock 时不调用 flush
+        self._flush_lock = threading.Lock()
+        self._version: Optional[int] = None  # 加载时存储的 data_version
+        self._load()
+        if status_log is not None:
+            with self._lock:
+                self._restore_from_log()
+            self._flush_if_immediate()
+        with self._lock:
+            self._grant_startup_grace(datetime.now().isoformat())
+
+    def _load(self):
+        with self._lock:
+            self._version = self.store.data_version()
+            self._by_discord.clear()
+            self._by_riot.clear()
+            for player in self.store.all():
+                self._index(player)
+            self._rebuild_expiry()
+
+    def _refresh(self):
+        """其他进程提交了修改时重新加载；本进程未写回的状态和更新的 last_check 保留"""
+        if self.store.data_version() == self._version:
+            return
+        previous = dict(self._by_discord)
+        self._load()
+        for discord_id, names in list(self._dirty.items()):
+            old, player = previous.get(discord_id), self._by_discord.get(discord_id)
+            if not player or not old or (player.get("last_check") or "") > (old.get("last_check") or ""):
+                # 已被其他进程解绑，或其他进程写入了更新的状态
+                del self._dirty[discord_id]
+                continue
+            player.update({name: old.get(name) for name in names})
+        for discord_id, old in previous.items():
+            player = self._by_discord.get(discord_id)
+            if player and (old.get("last_check") or "") > (player.get("last_check") or ""):
+                player["last_check"] = old["last_check"]
+        self._rebuild_expiry()
+
+    def _restore_from_log(self):
+        """日志中比数据库新的状态（进程在写回前退出）重新应用并写回"""
+        restored = 0
+        for riot_id, state in self.status_log.replay().items():
+            player = self._by_riot.get(riot_id)
+            if not player or (player.get("last_check") or "") >= state.get("ts", ""):
+                continue
+            changes = {name: state[name] for name in STATUS_FIELDS
+                       if name in state and player.get(name) != state[name]}
+            if changes:
+                player.update(changes)
+                self._mark_dirty(player["discord_id"], changes)
+                self._track(player)
+                restored += 1
+        if restored:
+            print(f"SUCCESS: 从状态事件日志恢复了 {restored} 个玩家的状态")
+
+    def _grant_startup_grace(self, now: str):
+        """
+        数据库中在线玩家的 last_check 是最后一次状态变化的时间（心跳只在内存中），
+        直接用它清理会在重启后立刻把所有在线玩家标记为离线并写入虚假的离开事件；
+        因此只在内存中把它们的 last_check 设为启动时间
+        """
+        for player in self._by_discord.values():
+            if self._is_online(player) and player["last_check"] < now:
+                player["last_check"] = now
+        self._rebuild_expiry()
+
+    def _index(self, player: Dict[str, Any]):
+        self._by_discord[player["discord_id"]] = player
+        self._by_riot[player["riot_id"]] = player
+
+    # ---------- 过期堆 ----------
+
+    @staticmethod
+    def _is_online(player: Dict[str, Any]) -> bool:
+        return bool(player.get("last_check") and (player.get("is_in_voice") or player.get("is_in_game")))
+
+    def _track(self, player: Dict[str, Any]):
+        """玩家 last_check 或在线状态变化后调用"""
+        if self._is_online(player):
+            heapq.heappush(self._expiry, (player["last_check"], player["discord_id"]))
+            if len(self._expiry) > 4 * len(self._by_discord) + 64:
+                # 作废条目太多时重建
+                self._rebuild_expiry()
+
+    def _rebuild_expiry(self):
+        self._expiry = [
+            (player["last_check"], discord_id)
+            for discord_id, player in self._by_discord.items() if self._is_online(player)
+        ]
+        heapq.heapify(self._expiry)
+
+    def _is_live(self, entry: Tuple[str, str]) -> bool:
+        player = self._by_discord.get(entry[1])
+        return bool(player and player.get("last_check") == entry[0] and self._is_online(player))
+
+    def next_expiry(self) -> Optional[str]:
+        """在线玩家中最早的 last_check，没有在线玩家时返回None"""
+        with self._lock:
+            self._refresh()
+            while self._expiry and not self._is_live(self._expiry[0]):
+                heapq.heappop(self._expiry)
+            return self._expiry[0][0] if self._expiry else None
+
+    # ---------- 查询（内存，另有一次 data_version 检查） ----------
+
+    def get_by_discord(self, discord_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._refresh()
+            player = self._by_discord.get(discord_id)
+            return dict(player) if player else None
+
+    def get_by_riot(self, riot_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._refresh()
+            player = self._by_riot.get(riot_id)
+            return dict(player) if player else None
+
+    def all(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            self._refresh()
+            return [dict(player) for player in self._by_discord.values()]
+
+    def count(self) -> int:
+        with self._lock:
+            self._refresh()
+            return len(self._by_discord)
+
+    # ---------- 注册 / 解绑（立即写入） ----------
+
+    def register(self, player: Dict[str, Any]) -> bool:
+        """注册新绑定，Discord ID 或 Riot ID 已存在时返回False"""
+        with self._lock:
+            self._refresh()
+            if player["discord_id"] in self._by_discord or player["riot_id"] in self._by_riot:
+                return False
+            if not self.store.insert(player):
+                return False
+            # 读回规范化后的行（默认值、布尔列）
+            self._index(self.store.get_by_discord(player["discord_id"]))
+            return True
+
+    def unregister(self, discord_id: str) -> bool:
+        with self._lock:
+            self._refresh()
+            player = self._by_discord.get(discord_id)
+            if not player:
+                return False
+            self.store.delete_by_discord(discord_id)
+            del self._by_discord[discord_id]
+            self._by_riot.pop(player["riot_id"], None)
+            self._dirty.pop(discord_id, None)
+            return True
+
+    # ---------- 状态更新（写回） ----------
+
+    def update(self, riot_id: str, **fields) -> bool:
+        """
+        与当前状态比较后更新内存中的字段，有真正的状态变化时安排写回
+
+        Returns:
+            是否找到该玩家
+        """
+        unknown = [name for name in fields if name not in COLUMNS]
+        if unknown:
+            raise ValueError(f"未知字段: {', '.join(unknown)}")
+        with self._lock:
+            self._refresh()
+            player = self._by_riot.get(riot_id)
+            if not player:
+                return False
+            changed = {name: value for name, value in fields.items() if player.get(name) != value}
+            if not changed:
+                return True
+            player.update(changed)
+            self._track(player)
+
+            if changed.keys() <= HEARTBEAT_FIELDS:
+                # 心跳：维护任务只需要内存中的 last_check
+                self.heartbeats += 1
+            else:
+                self.transitions += 1
+                self._mark_dirty(player["discord_id"], changed)
+                self._log(player, changed)
+        self._flush_if_immediate()
+        return True
+
+    def mark_stale_offline(self, cutoff: str, now: str) -> int:
+        """
+        将 last_check 早于 cutoff 且仍显示在线/游戏中的玩家标记为离线
+        只弹出堆顶已过期的条目，不扫描所有玩家
+
+        Returns:
+            更新的玩家数
+        """
+        with self._lock:
+            self._refresh()
+            stale = 0
+            while self._expiry and self._expiry[0][0] < cutoff:
+                entry = heapq.heappop(self._expiry)
+                if not self._is_live(entry):
+                    continue
+                player = self._by_discord[entry[1]]
+                fields = {"is_in_voice": False, "is_in_game": False, "active_match": None, "last_check": now}
+                player.update(fields)
+                self._mark_dirty(player["discord_id"], fields)
+                self._log(player, fields)
+                stale += 1
+        self._flush_if_immediate()
+        return stale
+
+    def _log(self, player: Dict[str, Any], changes: Dict[str, Any]):
+        if self.status_log is not None:
+            self.status_log.append(player["riot_id"], player["discord_id"], changes)
+
+    def _mark_dirty(self, discord_id: str, fields: Dict[str, Any]):
+        self._dirty.setdefault(discord_id, set()).update(fields)
+        if self.flush_delay > 0 and self._timer is None:
+            # 去抖：第一次变脏时开始计时，计时期间的更新一起写回
+            self._timer = threading.Timer(self.flush_delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _flush_if_immediate(self):
+        """flush_delay <= 0 时立即写回（在释放 _lock 之后调用）"""
+        if self.flush_delay <= 0 and self.dirty_count():
+            self.flush()
+
+    def flush(self) -> int:
+        """
+        将脏数据在一个事务中写回存储
+        多个线程同时写回时依次执行，不会出现旧快照晚于新快照提交的情况
+
+        Returns:
+            写回的玩家数
+        """
+        with self._flush_lock:
+            return self._flush_locked()
+
+    def _flush_locked(self) -> int:
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._dirty:
+                return 0
+            dirty, self._dirty = self._dirty, {}
+            # 只写回改动过的字段，加上作为版本的 last_check
+            rows = {
+                self._by_discord[discord_id]["riot_id"]: {
+                    name: self._by_discord[discord_id].get(name) for name in names | {"last_check"}
+                }
+                for discord_id, names in dirty.items() if discord_id in self._by_discord
+            }
+
+        # 写入数据库时只持有 _flush_lock，查询和状态更新不会被阻塞
+        try:
+            updated = self.store.update_many(rows, newer_only=True)
+        except Exception as e:
+            print(f"ERROR: 写回玩家状态失败: {e}")
+            with self._lock:
+                # 保持脏标记，下一次更新时重试
+                for discord_id, names in dirty.items():
+                    if discord_id in self._by_discord:
+                        self._dirty.setdefault(discord_id, set()).update(names)
+            return 0
+
+        with self._lock:
+            self.flushes += 1
+            if updated < len(rows):
+                # 有的行被其他进程写入了更新的状态，下一次访问时重新加载
+                self._version = None
+        return len(rows)
+
+    def replace_all(self, players: List[Dict[str, Any]]):
+        """用完整列表替换所有玩家"""
+        with self._lock:
+            self._dirty.clear()
+            self.store.replace_all(players)
+            self._load()
+
+    def dirty_count(self) -> int:
+        with self._lock:
+            return len(self._dirty)
+
+    def get_stats(self) -> Dict[str, int]:
+        """玩家数、状态变化、心跳、写回次数和待写回的玩家数"""
+        with self._lock:
+            return {
+                "players": len(self._by_discord),
+                "transitions": self.transitions,
+                "heartbeats": self.heartbeats,
+                "flushes": self.flushes,
+                "dirty": len(self._dirty),
+            }
+
+
+# 同一数据库文件在进程内共享一个注册表
+_registries: Dict[str, BindingRegistry] = {}
+_registries_lock = threading.Lock()
+
+
+def get_binding_registry(db_path: str, legacy_json_path: Optional[str] = None,
+                         flush_delay: float = 2.0, status_log_path: Optional[str] = None,
+                         fsync_interval: float = 1.0, keep_rotated_logs: int = 30) -> BindingRegistry:
+    """获取（或创建）指定数据库文件的共享注册表"""
+    key = os.path.abspath(db_path)
+    with _registries_lock:
+        if key not in _registries:
+            store = get_player_store(db_path, legacy_json_path)
+            status_log = StatusEventLog(
+                status_log_path, fsync_interval=fsync_interval, keep_rotated=keep_rotated_logs
+            ) if status_log_path else None
+            _registries[key] = BindingRegistry(store, flush_delay=flush_delay, status_log=status_log)
+        return _registries[key]
+
+
+@atexit.register
+def _flush_all():
+    """进程退出前写回所有未保存的状态"""
+    for registry in list(_registries.values()):
+        registry.flush()
+        if registry.status_log is not None:
+            registry.status_log.close()
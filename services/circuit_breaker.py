@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+熔断器模块
+上游服务（VoicV等）连续失败或超时后暂时停止调用，
+冷却时间过后放行一次试探请求，成功则恢复
+"""
+
+import threading
+import time
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """线程安全的熔断器 - 上游调用在工作线程中执行"""
+
+    def __init__(self, name: str, failure_threshold: int = 3, reset_timeout: float = 60.0):
+        """
+        Args:
+            name: 上游服务名称（用于日志）
+            failure_threshold: 连续失败多少次后熔断
+            reset_timeout: 熔断后多少秒放行试探请求
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return CLOSED
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return HALF_OPEN
+        return OPEN
+
+    @property
+    def is_open(self) -> bool:
+        """熔断中（包括半开状态下试探请求尚未返回）"""
+        with self._lock:
+            state = self._state()
+            return state == OPEN or (state == HALF_OPEN and self._trial_in_flight)
+
+    def allow_request(self) -> bool:
+        """是否允许本次调用，半开状态下只放行一个试探请求"""
+        with self._lock:
+            state = self._state()
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self._opened_at is not None:
+                print(f"✅ {self.name} 熔断恢复")
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def release(self):
+        """调用因本地原因（缺少配置、截止时间已到）未完成：不计成功或失败，只释放半开试探名额"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            half_open = self._trial_in_flight
+            self._trial_in_flight = False
+            if half_open or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                print(f"⚡ {self.name} 连续失败 {self._failures} 次，熔断 {self.reset_timeout:.0f} 秒")
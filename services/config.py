@@ -29,11 +29,77 @@ class Config:
     ANALYSIS_DIR = "analysis"
     AUDIO_DIR = "audio"
     KEEP_FILES_COUNT = 5
+    ARTIFACT_ROOT = os.getenv("ARTIFACT_ROOT", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "analysis"))  # 分析产物的唯一根目录
+    ARTIFACT_MAX_BYTES = int(os.getenv("ARTIFACT_MAX_BYTES", str(50 * 1024 * 1024)))  # 分析产物的字节预算，0表示不限制
+    ARCHIVE_ENABLED = os.getenv("ARCHIVE_ENABLED", "true").lower() == "true"  # 淘汰的产物压缩归档而不是删除
+    ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", os.path.join(ARTIFACT_ROOT, "archive"))  # 按月分段的压缩归档目录
+    JSON_PRETTY = os.getenv("JSON_PRETTY", "false").lower() == "true"  # 调试模式：JSON文件缩进排版，默认紧凑写入
+    JSON_FSYNC = os.getenv("JSON_FSYNC", "true").lower() == "true"  # 替换前fsync临时文件，断电后也不会留下空文件
     
     # Presence管理配置
     DISCORD_POLL_INTERVAL = int(os.getenv("DISCORD_POLL_INTERVAL", "300"))  # 状态检测间隔（秒）
     RIOT_POLL_INTERVAL = int(os.getenv("RIOT_POLL_INTERVAL", "180"))      # 比赛检测间隔（秒）
-    PLAYER_LINKS_PATH = os.getenv("PLAYER_LINKS_PATH", "data/player_links.json")
+    PLAYER_LINKS_PATH = os.getenv("PLAYER_LINKS_PATH", "data/player_links.json")  # 旧的JSON绑定文件，首次启动时迁移
+    PLAYER_DB_PATH = os.getenv("PLAYER_DB_PATH", "data/players.db")  # 玩家绑定数据库（SQLite）
+    BINDING_FLUSH_DELAY_SECONDS = float(os.getenv("BINDING_FLUSH_DELAY_SECONDS", "2"))  # 状态更新批量写回的去抖时间，0表示立即写入
+    STATUS_LOG_PATH = os.getenv("STATUS_LOG_PATH", "data/status_events.jsonl")  # 状态变化事件日志（只追加），留空则不记录
+    STATUS_LOG_FSYNC_SECONDS = float(os.getenv("STATUS_LOG_FSYNC_SECONDS", "1"))  # 事件日志批量fsync的间隔，0表示每条都fsync
+    STATUS_LOG_KEEP_ROTATED = int(os.getenv("STATUS_LOG_KEEP_ROTATED", "30"))  # 压缩后保留的历史日志分段数，0表示不保留
+    
+    # 延迟追踪配置
+    TRACE_HISTORY_SIZE = int(os.getenv("TRACE_HISTORY_SIZE", "200"))  # 每个步骤保留的样本数
+    TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH")  # 设置后每次运行追加写入JSON Lines
+    
+    # 工作流程截止时间配置
+    WORKFLOW_DEADLINE_SECONDS = float(os.getenv("WORKFLOW_DEADLINE_SECONDS", "180"))  # 单次分析的总体时间预算
+    
+    # 文字优先回复配置
+    TEXT_FIRST_REPLY = os.getenv("TEXT_FIRST_REPLY", "true").lower() == "true"  # 分析文字生成后立即发送
+    TTS_MAX_CONCURRENCY = int(os.getenv("TTS_MAX_CONCURRENCY", "2"))  # 同时进行的TTS请求上限，超过视为繁忙
+    TTS_BREAKER_FAILURES = int(os.getenv("TTS_BREAKER_FAILURES", "3"))  # 连续失败多少次后熔断
+    TTS_BREAKER_RESET_SECONDS = float(os.getenv("TTS_BREAKER_RESET_SECONDS", "60"))  # 熔断冷却时间
+    
+    # OpenAI客户端配置
+    OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "4"))  # 同时进行的补全请求上限
+    OPENAI_TIMEOUT_SECONDS = float(os.getenv("OPENAI_TIMEOUT_SECONDS", "60"))  # 单次请求超时上限
+    
+    # 分析结果缓存配置
+    GENERATION_CACHE_SIZE = int(os.getenv("GENERATION_CACHE_SIZE", "200"))  # 最多缓存的结果数
+    GENERATION_CACHE_TTL_SECONDS = float(os.getenv("GENERATION_CACHE_TTL_SECONDS", "86400"))  # 缓存有效期
+    
+    # TTS音频缓存配置
+    TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", "audio/tts_cache")  # 缓存目录（文件名为内容哈希）
+    TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))  # 缓存总大小上限（字节）
+    TTS_DOWNLOAD_CHUNK_BYTES = int(os.getenv("TTS_DOWNLOAD_CHUNK_BYTES", "65536"))  # 流式下载每块大小
+    TTS_STREAM_PLAYBACK = os.getenv("TTS_STREAM_PLAYBACK", "false").lower() == "true"  # 边下载边播放，不等待下载完成
+    
+    # 分句TTS配置
+    TTS_SEGMENTED = os.getenv("TTS_SEGMENTED", "false").lower() == "true"  # 按句子切分并发合成后拼接
+    TTS_SEGMENT_MAX_CHARS = int(os.getenv("TTS_SEGMENT_MAX_CHARS", "80"))  # 单句最大字数，超过按逗号切分
+    TTS_SEGMENT_CONCURRENCY = int(os.getenv("TTS_SEGMENT_CONCURRENCY", "4"))  # 每个voice_id同时合成的分句数
+    TTS_SEGMENT_RETRIES = int(os.getenv("TTS_SEGMENT_RETRIES", "2"))  # 单句失败后的重试次数
+    
+    # TTS后端配置
+    TTS_BACKEND = os.getenv("TTS_BACKEND", "voicv")  # voicv 或 local（本地后端，压测用）
+    TTS_LOCAL_FALLBACK = os.getenv("TTS_LOCAL_FALLBACK", "true").lower() == "true"  # VoicV不可用时回退本地TTS
+    TTS_LOCAL_VOICE = os.getenv("TTS_LOCAL_VOICE", "cmn")  # espeak-ng 语音（cmn 为普通话）
+    TTS_LOCAL_MAX_WORKERS = int(os.getenv("TTS_LOCAL_MAX_WORKERS", "2"))  # 同时运行的本地合成进程数
+    TTS_LOCAL_MIN_SECONDS = float(os.getenv("TTS_LOCAL_MIN_SECONDS", "15"))  # 剩余时间少于该值时优先本地TTS
+    
+    # 提示词与输出长度配置
+    TARGET_SPEECH_SECONDS = float(os.getenv("TARGET_SPEECH_SECONDS", "45"))  # 默认目标语音时长（风格可单独设置 target_seconds）
+    SPEECH_CHARS_PER_SECOND = float(os.getenv("SPEECH_CHARS_PER_SECOND", "4.5"))  # 中文语音语速（字/秒）
+    TOKENS_PER_CHAR = float(os.getenv("TOKENS_PER_CHAR", "1.0"))  # 每个中文字符约占的token数
+    OPENAI_MAX_OUTPUT_TOKENS = int(os.getenv("OPENAI_MAX_OUTPUT_TOKENS", "500"))  # 输出token上限
+    PROMPT_MAX_TOKENS = int(os.getenv("PROMPT_MAX_TOKENS", "2000"))  # 提示词（系统角色+模板）token上限，超过时不发送，0表示不限制
+    
+    # LLM对冲配置
+    LLM_HEDGE_SECONDS = float(os.getenv("LLM_HEDGE_SECONDS", "20"))  # 超过该时间使用本地模板，0表示关闭
+    
+    # 模型路由配置（风格可在 prompts/config.json 中用 models 覆盖）
+    LOL_LLM_MODELS = os.getenv("LOL_LLM_MODELS", "gpt-4.1-mini,gpt-4o-mini").split(",")  # LOL分析模型，按优先级排列
+    VA_LLM_MODELS = os.getenv("VA_LLM_MODELS", "gpt-4o-mini,gpt-4.1-mini").split(",")  # Valorant分析模型，按优先级排列
+    LLM_ROUTER_HEDGE_PERCENTILE = float(os.getenv("LLM_ROUTER_HEDGE_PERCENTILE", "95"))  # 超过该延迟百分位时对冲下一个模型，0表示关闭
     
     # KDA评分配置
     KDA_KILL_WEIGHT = 1.0
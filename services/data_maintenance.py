@@ -1,28 +1,33 @@
 #!/usr/bin/env python3
 """
 Data Maintenance Service
-Lightweight maintenance for player_links.json
+Lightweight maintenance for the player store
+Sleeps until the next status actually expires instead of polling on a fixed interval
 """
 
 import asyncio
 import os
 import sys
 from datetime import datetime, timedelta
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
 # Add services directory to Python path
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'services'))
 
-from services.presence_manager import PresenceManager
+from services.presence_manager import presence_manager
 
 class DataMaintenance:
     """Lightweight data maintenance for player_links.json"""
     
     def __init__(self):
-        self.presence_manager = PresenceManager()
+        self.presence_manager = presence_manager
         self.is_running = False
         self.task = None
-        self.maintenance_interval = 300  # 5 minutes (not 1 minute to avoid overhead)
+        self.maintenance_interval = 300  # Status log compaction interval (5 minutes)
+        self.stale_after = timedelta(minutes=10)  # Online status without a check for this long is stale
+        self.min_sleep = 1.0  # Coalesce deadlines that are less than a second apart
+        self.next_run: Optional[datetime] = None
+        self.last_compaction: Optional[datetime] = None
     
     async def start_maintenance(self):
         """Start the maintenance task"""
@@ -56,7 +61,9 @@ class DataMaintenance:
             while self.is_running:
                 try:
                     await self._perform_maintenance()
-                    await asyncio.sleep(self.maintenance_interval)
+                    delay = self._seconds_until_next_run()
+                    self.next_run = datetime.now() + timedelta(seconds=delay)
+                    await asyncio.sleep(delay)
                 except Exception as e:
                     print(f"ERROR in maintenance loop: {e}")
                     await asyncio.sleep(60)  # Wait 1 minute before retry
@@ -66,44 +73,43 @@ class DataMaintenance:
             print(f"ERROR in maintenance loop: {e}")
         finally:
             self.is_running = False
+            self.next_run = None
+    
+    def _seconds_until_next_run(self) -> float:
+        """
+        Sleep until the oldest online status expires or the next compaction is due
+        New statuses always expire at least stale_after from now, so nothing is missed
+        """
+        now = datetime.now()
+        wake = (self.last_compaction or now) + timedelta(seconds=self.maintenance_interval)
+        oldest = self.presence_manager.next_status_expiry()
+        if oldest is not None:
+            wake = min(wake, oldest + self.stale_after)
+        return max(self.min_sleep, (wake - now).total_seconds())
     
     async def _perform_maintenance(self):
         """Perform maintenance tasks"""
         try:
             print("Performing data maintenance...")
             
-            # Load current data
-            data = self.presence_manager.load_bindings()
-            updated = False
-            
-            # Check for stale data (older than 10 minutes)
-            cutoff_time = datetime.now() - timedelta(minutes=10)
+            # Mark stale data as potentially offline; only expired heap entries are touched
+            now = datetime.now()
+            updated = self.presence_manager.mark_stale_players_offline(now - self.stale_after)
             
-            for player in data["players"]:
-                last_check = player.get('last_check')
-                if last_check:
-                    try:
-                        last_check_time = datetime.fromisoformat(last_check)
-                        if last_check_time < cutoff_time:
-                            # Mark as potentially offline
-                            if player.get('is_in_voice', False) or player.get('is_in_game', False):
-                                print(f"MAINTENANCE: Marking {player['riot_id']} as potentially offline (stale data)")
-                                player['is_in_voice'] = False
-                                player['is_in_game'] = False
-                                player['active_match'] = None
-                                player['last_check'] = datetime.now().isoformat()
-                                updated = True
-                    except ValueError:
-                        # Invalid timestamp, update it
-                        player['last_check'] = datetime.now().isoformat()
-                        updated = True
-            
-            # Save if updated
             if updated:
-                self.presence_manager.save_bindings(data)
-                print("SUCCESS: Data maintenance completed with updates")
+                print(f"SUCCESS: Data maintenance completed, marked {updated} players as potentially offline (stale data)")
             else:
                 print("SUCCESS: Data maintenance completed (no updates needed)")
+            
+            # Fold the status event log and back up the database (file I/O, off the event loop)
+            if self.last_compaction is None or now - self.last_compaction >= timedelta(seconds=self.maintenance_interval):
+                self.last_compaction = now
+                folded = await asyncio.to_thread(self.presence_manager.compact_status_log)
+                if folded:
+                    print(f"SUCCESS: Compacted {folded} status events into snapshot")
+                # Keep a last-known-good copy of the database for corruption recovery
+                if not await asyncio.to_thread(self.presence_manager.backup_store):
+                    print("WARNING: Player store backup failed, keeping previous backup")
                 
         except Exception as e:
             print(f"ERROR during maintenance: {e}")
@@ -113,9 +119,19 @@ class DataMaintenance:
         return {
             "is_running": self.is_running,
             "interval_minutes": self.maintenance_interval // 60,
-            "next_check_in": "N/A" if not self.is_running else "Active"
+            "stale_minutes": int(self.stale_after.total_seconds()) // 60,
+            "next_check_in": self._format_next_run()
         }
 
+    
+    def _format_next_run(self) -> str:
+        if not self.is_running:
+            return "N/A"
+        if self.next_run is None:
+            return "Active"
+        seconds = max(0, int((self.next_run - datetime.now()).total_seconds()))
+        return f"{seconds // 60}m {seconds % 60}s"
+
 
 # Global maintenance instance
 data_maintenance = DataMaintenance()
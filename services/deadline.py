@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+工作流程截止时间
+每次分析携带一个总体截止时间，向下传递给所有上游调用，
+上游请求的超时不会超过剩余时间
+"""
+
+import time
+from typing import Optional
+
+
+class DeadlineExceeded(Exception):
+    """工作流程已超过截止时间"""
+    pass
+
+
+class Deadline:
+    """总体截止时间"""
+
+    def __init__(self, seconds: float):
+        """
+        Args:
+            seconds: 从现在开始的可用时间（秒）
+        """
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        """剩余时间（秒），已超时返回0"""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def check(self):
+        """已超时则抛出 DeadlineExceeded"""
+        if self.expired:
+            raise DeadlineExceeded(f"超过截止时间 ({self.seconds:.0f}秒)")
+
+    def timeout(self, cap: float) -> float:
+        """
+        计算单次上游调用的超时时间
+
+        Args:
+            cap: 该调用自身的超时上限
+
+        Returns:
+            min(cap, 剩余时间)
+        """
+        self.check()
+        return min(cap, self.remaining())
+
+
+def get_timeout(deadline: Optional[Deadline], cap: float) -> float:
+    """没有截止时间时使用调用自身的超时上限"""
+    if deadline is None:
+        return cap
+    return deadline.timeout(cap)
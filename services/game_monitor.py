@@ -17,7 +17,8 @@ sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'services'))
 
 from services.riot_checker import get_summoner_info, get_recent_matches, get_match_details
 from services.valorant_checker import get_last_valorant_match
-from services.presence_manager import PresenceManager
+from services.presence_manager import presence_manager
+from services.workflow_jobs import job_registry, make_job_key
 
 # Load environment variables
 load_dotenv()
@@ -40,7 +41,8 @@ class GameMonitor:
         self.idle_interval = 90   # 90 seconds when not in game
         self.max_idle_checks = 10  # Stop after 10 idle checks
         self.idle_count = 0
-        self.presence_manager = PresenceManager()  # Initialize presence manager
+        self.presence_manager = presence_manager
+        self.last_status = None  # (is_in_voice, is_in_game, active_match) last reported
         
         print(f"Creating game monitor: {riot_id} ({self.game_type})")
     
@@ -255,7 +257,8 @@ class GameMonitor:
             game_name, tag_line = self.riot_id.split('#', 1)
             
             # Get last Valorant match
-            match_info = get_last_valorant_match(game_name, tag_line)
+            # 网络请求和保存比赛文件都在线程中执行，不阻塞事件循环
+            match_info = await asyncio.to_thread(get_last_valorant_match, game_name, tag_line)
             if not match_info:
                 return None
             
@@ -313,11 +316,10 @@ class GameMonitor:
             from bots.discord_bot import LOLWorkflow, VAWorkflow
             
             # Create appropriate workflow
+            game_name, tag_line = self.riot_id.split('#', 1)
             if self.game_type == "LOL":
                 workflow = LOLWorkflow()
-                # Parse riot_id for workflow
-                game_name, tag_line = self.riot_id.split('#', 1)
-                success = await workflow.run_full_workflow_with_user(
+                factory = lambda: workflow.run_full_workflow_with_user(
                     voice_channel_id=self.voice_channel.id,
                     game_name=game_name,
                     tag_line=tag_line,
@@ -325,9 +327,7 @@ class GameMonitor:
                 )
             elif self.game_type == "VALORANT":
                 workflow = VAWorkflow()
-                # Parse riot_id for workflow
-                game_name, tag_line = self.riot_id.split('#', 1)
-                success = await workflow.run_full_workflow(
+                factory = lambda: workflow.run_full_workflow(
                     voice_channel_id=self.voice_channel.id,
                     game_name=game_name,
                     tag_line=tag_line,
@@ -337,6 +337,23 @@ class GameMonitor:
                 print(f"ERROR 不支持的Game Type: {self.game_type}")
                 return
             
+            # Join an identical in-flight analysis instead of running it twice;
+            # the job is cancelled if the user leaves voice before it finishes
+            job_key = make_job_key(self.game_type, self.riot_id, "default")
+            job, attached = job_registry.submit(job_key, self.discord_user.id, factory)
+            if attached:
+                print(f"INFO Joined in-flight workflow: {self.riot_id}")
+            try:
+                success = await job.wait()
+            except asyncio.CancelledError:
+                # Re-raise only when this monitor task is being cancelled;
+                # otherwise the shared job was cancelled (requester left voice)
+                current = asyncio.current_task()
+                if current is not None and current.cancelling():
+                    raise
+                print(f"INFO Automatic workflow cancelled: {self.riot_id}")
+                return
+            
             if success:
                 print(f"SUCCESS Automatic workflow completed: {self.riot_id}")
                 # Stop monitoring after successful workflow
@@ -373,7 +390,7 @@ class GameMonitor:
             print(f"ERROR Failed to send match start notification: {e}")
     
     async def _update_user_status(self, is_in_voice: bool, is_in_game: bool, active_match: Optional[str] = None):
-        """Update user status in player_links.json"""
+        """Update user status (heartbeats stay in memory, only transitions are persisted)"""
         try:
             # Get current timestamp
             current_time = datetime.now().isoformat()
@@ -388,7 +405,10 @@ class GameMonitor:
             )
             
             if success:
-                print(f"STATUS Updated: {self.riot_id} - Voice: {is_in_voice}, Game: {is_in_game}, Match: {active_match}")
+                status = (is_in_voice, is_in_game, active_match)
+                if status != self.last_status:
+                    self.last_status = status
+                    print(f"STATUS Updated: {self.riot_id} - Voice: {is_in_voice}, Game: {is_in_game}, Match: {active_match}")
             else:
                 print(f"WARNING Failed to update status for {self.riot_id}")
                 
@@ -400,7 +420,7 @@ class GameMonitorManager:
     """Manages all game monitoring tasks"""
     
     def __init__(self):
-        self.presence_manager = PresenceManager()
+        self.presence_manager = presence_manager
     
     async def start_monitoring_for_user(self, discord_user: discord.Member, voice_channel: discord.VoiceChannel) -> bool:
         """Start monitoring for a specific user"""
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+分析结果缓存
+同一场比赛、同一玩家、同一风格的重复请求直接返回已生成的文字和语音，
+不再调用 OpenAI 和 VoicV
+"""
+
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from services.config import Config
+from services.prompts import prompt_manager
+
+CacheKey = Tuple[str, str, str, str, str]
+
+
+class GenerationResult:
+    """一次生成结果：分析文字、voice_id 和已生成的音频文件"""
+
+    def __init__(self, text: str, voice_id: Optional[str] = None, audio_file: Optional[str] = None):
+        self.text = text
+        self.voice_id = voice_id
+        self.audio_file = audio_file
+        self.created_at = time.monotonic()
+
+    def has_audio(self) -> bool:
+        """音频文件仍然存在（可能已被清理）"""
+        return bool(self.audio_file) and os.path.exists(self.audio_file)
+
+
+def prompt_template_hash(*parts: Optional[str]) -> str:
+    """计算提示词模板和系统角色的哈希，模板修改后旧缓存自动失效"""
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update((part or "").encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+
+def make_generation_key(match_data: Dict[str, Any], style: str, models: Union[str, List[str]],
+                        prompt: Optional[str] = None, system_role: Optional[str] = None) -> Optional[CacheKey]:
+    """
+    生成缓存键 (比赛ID, PUUID, 风格, 模板哈希, 模型列表)
+
+    与分析器选择模型的规则一致：使用风格模板时，风格配置中的 "models" 优先于默认模型列表，
+    不同模型列表生成的结果不会共用缓存
+
+    Args:
+        match_data: 比赛数据，需要包含 match_id 和 puuid
+        style: 风格名称
+        models: 分析器的默认模型列表（或单个模型）
+        prompt: 自定义提示词，None 表示使用风格模板
+        system_role: 自定义系统角色，None 表示使用风格角色
+
+    Returns:
+        缓存键，比赛数据缺少ID时返回None（不缓存）
+    """
+    match_id = match_data.get("match_id")
+    puuid = match_data.get("puuid")
+    if not match_id or not puuid:
+        return None
+
+    if isinstance(models, str):
+        models = [models]
+    if prompt is None or system_role is None:
+        style_config = prompt_manager.get_style_config(style)
+        prompt = style_config["prompt"] if prompt is None else prompt
+        system_role = style_config["system_role"] if system_role is None else system_role
+        models = style_config.get("models") or models
+
+    return (match_id, puuid, style, prompt_template_hash(prompt, system_role), ",".join(models))
+
+
+class GenerationCache:
+    """LRU + TTL 的进程内缓存"""
+
+    def __init__(self, max_entries: int = 200, ttl_seconds: float = 86400):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[CacheKey, GenerationResult]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Optional[CacheKey]) -> Optional[GenerationResult]:
+        """获取缓存结果，过期的条目会被删除"""
+        if key is None:
+            return None
+
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        if time.monotonic() - entry.created_at > self.ttl_seconds:
+            del self._entries[key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key: Optional[CacheKey], text: str, voice_id: Optional[str] = None,
+            audio_file: Optional[str] = None) -> GenerationResult:
+        """保存生成的文字（音频稍后通过 set_audio 补充），返回缓存条目"""
+        entry = GenerationResult(text, voice_id, audio_file)
+        if key is None or not text:
+            return entry
+
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry
+
+    def set_audio(self, key: Optional[CacheKey], audio_file: str):
+        """为已缓存的文字补充生成的音频文件"""
+        entry = self._entries.get(key) if key is not None else None
+        if entry is not None:
+            entry.audio_file = audio_file
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# 全局分析结果缓存
+generation_cache = GenerationCache(
+    max_entries=Config.GENERATION_CACHE_SIZE,
+    ttl_seconds=Config.GENERATION_CACHE_TTL_SECONDS,
+)
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+共享异步 OpenAI 客户端
+- LOL 和 Valorant 分析器共用一个 AsyncOpenAI 客户端（连接复用）
+- 全局并发信号量：突发的比赛结束工作流程排队等待，而不是阻塞事件循环
+- 每次请求的超时不超过工作流程剩余时间
+- 记录请求数、token 用量和延迟
+"""
+
+import asyncio
+import os
+import time
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+from openai import AsyncOpenAI
+
+from services.config import Config
+from services.tracing import tracer
+from services.deadline import DeadlineExceeded, get_timeout
+
+# Load environment variables
+load_dotenv()
+
+
+class LLMClient:
+    """共享的异步聊天补全客户端"""
+
+    def __init__(self, max_concurrency: int = 4, timeout: float = 60.0):
+        """
+        Args:
+            max_concurrency: 同时进行的请求上限
+            timeout: 单次请求的超时上限（秒）
+        """
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self._client: Optional[AsyncOpenAI] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop = None
+        self._pending = 0  # 排队中和进行中的请求数
+        self.stats = {
+            "requests": 0,
+            "failures": 0,
+            "queued": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "total_latency_ms": 0.0,
+        }
+
+    def _get_client(self) -> AsyncOpenAI:
+        """首次使用时创建客户端，导入模块时不需要API key"""
+        if self._client is None:
+            self._client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=1)
+        return self._client
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # 信号量绑定到事件循环，命令行多次 asyncio.run 时重新创建
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+        return self._semaphore
+
+    async def chat(self, system_role: str, prompt: str, model: str = "gpt-4.1-mini",
+                   max_tokens: int = 500, temperature: float = 0.7,
+                   deadline=None, **span_attrs) -> Optional[str]:
+        """
+        发送一次聊天补全请求
+
+        Args:
+            system_role: 系统角色
+            prompt: 用户提示词
+            model: 模型名称
+            max_tokens: 最大生成token数
+            temperature: 温度
+            deadline: 工作流程截止时间，排队和请求都不超过剩余时间
+            span_attrs: 追踪属性（风格等）
+
+        Returns:
+            生成的文本，失败返回None
+        """
+        messages: List[Dict[str, str]] = [
+            {"role": "system", "content": system_role},
+            {"role": "user", "content": prompt},
+        ]
+        semaphore = self._get_semaphore()
+
+        if self._pending >= self.max_concurrency:
+            self.stats["queued"] += 1
+            print(f"⏳ OpenAI并发已满 ({self.max_concurrency})，排队等待...")
+        self._pending += 1
+        try:
+            await asyncio.wait_for(semaphore.acquire(), timeout=get_timeout(deadline, self.timeout))
+        except (asyncio.TimeoutError, DeadlineExceeded):
+            self._pending -= 1
+            self.stats["failures"] += 1
+            print("❌ OpenAI排队超时")
+            return None
+        except asyncio.CancelledError:
+            self._pending -= 1
+            raise
+
+        start = time.perf_counter()
+        try:
+            self.stats["requests"] += 1
+            with tracer.span("openai.chat", model=model,
+                             prompt_chars=len(system_role) + len(prompt), **span_attrs) as span:
+                response = await self._get_client().chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    max_tokens=max_tokens,
+                    temperature=temperature,
+                    timeout=get_timeout(deadline, self.timeout),
+                )
+                if response.usage:
+                    span.set(prompt_tokens=response.usage.prompt_tokens,
+                             completion_tokens=response.usage.completion_tokens)
+                    self.stats["prompt_tokens"] += response.usage.prompt_tokens
+                    self.stats["completion_tokens"] += response.usage.completion_tokens
+
+            return response.choices[0].message.content.strip()
+
+        except Exception as e:
+            self.stats["failures"] += 1
+            print(f"❌ OpenAI API错误: {e}")
+            return None
+        finally:
+            self.stats["total_latency_ms"] += (time.perf_counter() - start) * 1000
+            semaphore.release()
+            self._pending -= 1
+
+    def get_stats(self) -> Dict[str, float]:
+        """获取请求计数、token用量和平均延迟"""
+        stats = dict(self.stats)
+        requests = stats["requests"]
+        stats["avg_latency_ms"] = stats["total_latency_ms"] / requests if requests else 0.0
+        return stats
+
+
+# 全局共享客户端
+llm_client = LLMClient(max_concurrency=Config.OPENAI_MAX_CONCURRENCY, timeout=Config.OPENAI_TIMEOUT_SECONDS)
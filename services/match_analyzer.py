@@ -1,14 +1,20 @@
 import json
 import os
-from openai import OpenAI
+import asyncio
 from dotenv import load_dotenv
 from .prompts import prompt_manager
+from .config import Config
+from .llm_client import llm_client
+from .model_router import model_router
+from .prompt_renderer import render_prompt
+from .artifact_store import artifact_store
 
 # Load environment variables
 load_dotenv()
 
-# Initialize OpenAI client
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# 分析使用的默认模型列表（按优先级，风格可在配置中覆盖），实际使用的模型列表是分析结果缓存键的一部分
+MODELS = Config.LOL_LLM_MODELS
+MODEL = MODELS[0]
 
 def load_json_file(filename):
     """Load and parse JSON file"""
@@ -22,7 +28,7 @@ def load_json_file(filename):
         print(f"❌ JSON解析错误: {filename}")
         return None
 
-def convert_to_chinese_mature_tone(match_data, prompt=None, system_role=None, style="default"):
+async def convert_to_chinese_mature_tone(match_data, prompt=None, system_role=None, style="default", deadline=None):
     """Convert match data to Chinese paragraph with specified style
     
     Args:
@@ -30,6 +36,7 @@ def convert_to_chinese_mature_tone(match_data, prompt=None, system_role=None, st
         prompt (str, optional): Custom prompt for the AI. If None, uses style-based prompt
         system_role (str, optional): Custom system role for the AI. If None, uses style-based system role
         style (str, optional): Style name (default, professional, humorous). Defaults to "default"
+        deadline (Deadline, optional): Workflow deadline; the request timeout never exceeds the remaining time
     
     Returns:
         tuple: (Generated Chinese analysis text, voice_id) or (None, None) if failed
@@ -43,30 +50,40 @@ def convert_to_chinese_mature_tone(match_data, prompt=None, system_role=None, st
         if system_role is None:
             system_role = style_config["system_role"]
         
-        # Get voice_id from style config
+        # Get voice_id and target speech duration from style config
         voice_id = style_config.get("voice_id")
+        target_seconds = style_config.get("target_seconds")
+        models = style_config.get("models") or MODELS
     else:
         voice_id = None
+        target_seconds = None
+        models = MODELS
     
-    # Format the prompt with match data
-    formatted_prompt = prompt_manager.format_prompt(prompt, match_data)
+    # 固定的系统角色作为前缀，模板填入比赛字段；输出长度由目标语音时长决定
+    rendered = render_prompt(system_role, prompt, match_data, target_seconds, MODEL)
+    if rendered is None:
+        return None, None
+    print(f"📏 提示词约 {rendered.prompt_tokens} tokens，输出上限 {rendered.max_tokens} tokens")
 
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4.1-mini",
-            messages=[
-                {"role": "system", "content": system_role},
-                {"role": "user", "content": formatted_prompt}
-            ],
-            max_tokens=500,
-            temperature=0.7
-        )
-        
-        return response.choices[0].message.content.strip(), voice_id
-    
-    except Exception as e:
-        print(f"❌ OpenAI API错误: {e}")
+    # 共享异步客户端：不阻塞事件循环，并发受全局信号量限制
+    # 模型路由：出错/超时切换备用模型，主模型过慢时对冲下一个模型
+    analysis, model = await model_router.complete(
+        models,
+        lambda model: llm_client.chat(
+            rendered.system,
+            rendered.user,
+            model=model,
+            max_tokens=rendered.max_tokens,
+            temperature=0.7,
+            deadline=deadline,
+            style=style,
+            prompt_tokens_est=rendered.prompt_tokens,
+        ),
+    )
+    if not analysis:
         return None, None
+    print(f"🤖 分析模型: {model}")
+    return analysis, voice_id
 
 def main(json_filename=None):
     """Main function - 支持自动文件名"""
@@ -79,35 +96,20 @@ def main(json_filename=None):
         if not json_filename:
             json_filename = "match_analysis_NA1_5396081690_20251018_221827.json"
     
-    # 检查文件是否在analysis文件夹中
-    # 获取根目录的analysis文件夹路径
-    root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    analysis_dir = os.path.join(root_dir, "analysis")
+    # 检查文件是否在产物根目录中
+    analysis_dir = artifact_store.root
     if not json_filename.startswith(analysis_dir + os.sep):
-        # 如果文件路径不包含analysis目录，尝试在analysis目录中查找
+        # 如果文件路径不包含产物根目录，尝试在根目录中查找
         if os.path.exists(os.path.join(analysis_dir, json_filename)):
             json_filename = os.path.join(analysis_dir, json_filename)
         elif not os.path.exists(json_filename):
-            # 如果根目录也没有，尝试在analysis目录中查找
-            if os.path.exists(analysis_dir):
-                analysis_files = [f for f in os.listdir(analysis_dir) if f.endswith('.json')]
-                if analysis_files:
-                    print(f"📁 在analysis目录中找到 {len(analysis_files)} 个JSON文件:")
-                    for i, file in enumerate(analysis_files[:5], 1):
-                        print(f"   {i}. {file}")
-                    if len(analysis_files) > 5:
-                        print(f"   ... 还有 {len(analysis_files) - 5} 个文件")
-                    
-                    # 使用最新的文件
-                    latest_file = max(analysis_files, key=lambda x: os.path.getctime(os.path.join(analysis_dir, x)))
-                    json_filename = os.path.join(analysis_dir, latest_file)
-                    print(f"🔄 自动选择最新文件: {json_filename}")
-                else:
-                    print(f"❌ analysis目录中没有JSON文件")
-                    return None
-            else:
-                print(f"❌ analysis目录不存在")
+            # 都没有时使用清单中最新的比赛数据
+            latest_file = artifact_store.latest("lol_match")
+            if not latest_file:
+                print(f"❌ {analysis_dir} 中没有比赛数据文件")
                 return None
+            json_filename = latest_file
+            print(f"🔄 自动选择最新文件: {json_filename}")
     
     # Check if OpenAI API key is set
     if not os.getenv("OPENAI_API_KEY"):
@@ -126,7 +128,7 @@ def main(json_filename=None):
     print("🤖 正在调用OpenAI API生成御姐风格的分析...")
     
     # Convert to Chinese mature tone
-    result = convert_to_chinese_mature_tone(match_data)
+    result = asyncio.run(convert_to_chinese_mature_tone(match_data))
     if result and result[0]:
         chinese_analysis = result[0]
     else:
@@ -139,19 +141,11 @@ def main(json_filename=None):
         print(chinese_analysis)
         print("=" * 50)
         
-        # Save to file in analysis directory
-        # 使用根目录的analysis文件夹
-        root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        analysis_dir = os.path.join(root_dir, "analysis")
-        os.makedirs(analysis_dir, exist_ok=True)
-        
-        # 获取文件名（不包含路径）
-        base_filename = os.path.basename(json_filename)
-        output_filename = f"chinese_analysis_{base_filename.replace('.json', '')}.txt"
-        output_path = os.path.join(analysis_dir, output_filename)
-        
+        # Save to the artifact root and register it in the manifest
+        output_path = artifact_store.new_path("lol_text")
         with open(output_path, 'w', encoding='utf-8') as f:
             f.write(chinese_analysis)
+        artifact_store.add(output_path, "lol_text", match_id=match_data.get("match_id"))
         print(f"💾 分析结果已保存到: {output_path}")
         return chinese_analysis
     else:
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+比赛长期归档（压缩、只追加）
+- 超出工作集的比赛数据和中文分析不再删除，而是压缩追加到按月分段的文件 YYYY-MM.seg
+- 每条记录是一个独立的 gzip 成员，分段文件本身也是合法的 .gz，可以整体流式解压
+- index.jsonl 记录每条记录的 分段/偏移/长度 和 类型/比赛ID/玩家/风格/生成路径，启动时读入内存
+- 比赛数据按 (类型, 比赛ID, 玩家) 去重；分析文本按内容去重，同一比赛同一风格的新文本（如重新生成、LLM替代模板）追加后成为最新版本
+- 按比赛ID随机读取只需一次 seek + 解压一条记录；按玩家按时间顺序流式遍历
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from services.config import Config
+
+INDEX_NAME = "index.jsonl"
+
+
+class MatchArchive:
+    """按月分段的压缩归档（线程安全）"""
+
+    def __init__(self, root: str, compresslevel: int = 9):
+        """
+        Args:
+            root: 归档目录
+            compresslevel: gzip 压缩级别
+        """
+        self.root = os.path.abspath(root)
+        self.index_path = os.path.join(self.root, INDEX_NAME)
+        self.compresslevel = compresslevel
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._records: List[Dict[str, Any]] = []  # 按归档顺序
+        self._by_match: Dict[Tuple[str, str, Optional[str]], Dict[str, Any]] = {}  # (类型, 比赛ID, 玩家) -> 最新记录
+        self._latest_by_match: Dict[Tuple[str, str], Dict[str, Any]] = {}  # (类型, 比赛ID) -> 任意玩家的最新记录
+        self._by_player: Dict[str, List[Dict[str, Any]]] = {}
+        self._seen = set()  # 已归档内容的去重键，见 _key
+        self.raw_bytes = 0
+        self.stored_bytes = 0
+
+    # ---------- 索引 ----------
+
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        os.makedirs(self.root, exist_ok=True)
+        if not os.path.exists(self.index_path):
+            return
+        with open(self.index_path, "rb") as f:
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break  # 进程崩溃留下的半行
+                try:
+                    self._index(json.loads(raw))
+                except ValueError:
+                    print("WARNING: 跳过损坏的归档索引行")
+
+    def _index(self, record: Dict[str, Any]):
+        self._records.append(record)
+        if record.get("match_id"):
+            self._by_match[(record["kind"], record["match_id"], record.get("player"))] = record
+            self._latest_by_match[(record["kind"], record["match_id"])] = record
+            self._seen.add(self._key(record["kind"], record["match_id"], record.get("player"),
+                                     record.get("style"), record.get("digest")))
+        if record.get("player"):
+            self._by_player.setdefault(record["player"], []).append(record)
+        self.raw_bytes += record.get("raw", 0)
+        self.stored_bytes += record["length"]
+
+    @staticmethod
+    def _key(kind: str, match_id: str, player: Optional[str], style: Optional[str],
+             digest: Optional[str]) -> Tuple[Optional[str], ...]:
+        # 比赛数据每个玩家归档一份；分析文本只有内容完全相同时才算重复
+        if kind.endswith("_match"):
+            return (kind, match_id, player)
+        return (kind, match_id, player, style, digest)
+
+    # ---------- 写入 ----------
+
+    def add(self, data: bytes, kind: str, match_id: Optional[str] = None, player: Optional[str] = None,
+            style: Optional[str] = None, created: Optional[str] = None, name: Optional[str] = None,
+            path: Optional[str] = None) -> bool:
+        """
+        压缩并追加一条记录（先写分段，再写索引；中途崩溃只会留下无索引的字节）
+
+        Args:
+            path: 分析文本的生成路径（"llm" / "template"）
+
+        Returns:
+            内容已在归档中（重复）或写入成功时返回True，写入失败返回False
+        """
+        created = created or datetime.now().isoformat()
+        digest = None if kind.endswith("_match") else hashlib.sha1(data).hexdigest()
+        with self._lock:
+            self._load()
+            if match_id and self._key(kind, match_id, player, style, digest) in self._seen:
+                return True
+
+            blob = gzip.compress(data, compresslevel=self.compresslevel, mtime=0)
+            segment = f"{created[:7]}.seg"
+            try:
+                with open(os.path.join(self.root, segment), "ab") as f:
+                    offset = f.tell()
+                    f.write(blob)
+                record = {
+                    "segment": segment,
+                    "offset": offset,
+                    "length": len(blob),
+                    "raw": len(data),
+                    "kind": kind,
+                    "match_id": match_id,
+                    "player": player,
+                    "style": style,
+                    "path": path,
+                    "digest": digest,
+                    "created": created,
+                    "name": name,
+                }
+                with open(self.index_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            except OSError as e:
+                print(f"ERROR: 写入比赛归档失败: {e}")
+                return False
+            self._index(record)
+            return True
+
+    def add_file(self, path: str, kind: str, **tags) -> bool:
+        """归档一个文件；比赛数据没有比赛ID时从内容中读取"""
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError as e:
+            print(f"ERROR: 读取待归档文件失败 {path}: {e}")
+            return False
+        if not tags.get("match_id") and path.endswith(".json"):
+            try:
+                tags["match_id"] = json.loads(data).get("match_id")
+            except (ValueError, AttributeError):
+                pass
+        return self.add(data, kind, name=os.path.basename(path), **tags)
+
+    # ---------- 读取 ----------
+
+    def _read(self, record: Dict[str, Any], handle=None) -> Any:
+        if handle is None:
+            with open(os.path.join(self.root, record["segment"]), "rb") as f:
+                return self._read(record, f)
+        handle.seek(record["offset"])
+        data = gzip.decompress(handle.read(record["length"]))
+        return json.loads(data) if record["kind"].endswith("_match") else data.decode("utf-8")
+
+    def get(self, match_id: str, kind: Optional[str] = None, player: Optional[str] = None) -> Optional[Any]:
+        """
+        按比赛ID读取最新的记录（比赛数据返回 dict，分析文本返回 str）
+
+        Args:
+            match_id: 比赛ID
+            kind: 产物类型，None 时依次查找 lol_match / va_match
+            player: 只读取该玩家的记录，None 表示任意玩家
+        """
+        with self._lock:
+            self._load()
+            kinds = [kind] if kind else ["lol_match", "va_match"]
+            if player is None:
+                index, keys = self._latest_by_match, [(k, match_id) for k in kinds]
+            else:
+                index, keys = self._by_match, [(k, match_id, player) for k in kinds]
+            record = next((index[key] for key in keys if key in index), None)
+        if not record:
+            return None
+        try:
+            return self._read(record)
+        except (OSError, ValueError, EOFError) as e:
+            print(f"ERROR: 读取归档记录失败 {match_id}: {e}")
+            return None
+
+    def iter_player(self, player: str, kind: Optional[str] = None) -> Iterator[Tuple[Dict[str, Any], Any]]:
+        """
+        按归档顺序流式遍历某玩家的记录，每次只解压一条
+
+        Yields:
+            (索引记录, 内容)
+        """
+        with self._lock:
+            self._load()
+            records = [r for r in self._by_player.get(player, []) if kind is None or r["kind"] == kind]
+        handles: Dict[str, Any] = {}
+        try:
+            for record in records:
+                if record["segment"] not in handles:
+                    handles[record["segment"]] = open(os.path.join(self.root, record["segment"]), "rb")
+                yield record, self._read(record, handles[record["segment"]])
+        finally:
+            for handle in handles.values():
+                handle.close()
+
+    def get_stats(self) -> Dict[str, int]:
+        """记录数、原始字节数和压缩后字节数"""
+        with self._lock:
+            self._load()
+            return {"records": len(self._records), "raw_bytes": self.raw_bytes, "stored_bytes": self.stored_bytes}
+
+
+# 全局归档
+match_archive = MatchArchive(Config.ARCHIVE_DIR)
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+LLM 模型路由
+- 每个风格一个有序的模型列表，出错或超时自动切换到下一个模型
+- 主模型超过其历史延迟百分位仍未返回时，向下一个模型发出对冲请求，先成功者胜出
+- 记录每个模型的延迟和错误，连续失败的模型暂时排到最后
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from services.config import Config
+from services.tracing import percentile
+
+# call(model) -> 生成的文本，失败返回None
+ModelCall = Callable[[str], Awaitable[Optional[str]]]
+
+
+class ModelStats:
+    """单个模型的延迟和错误统计"""
+
+    def __init__(self, history_size: int = 50):
+        self.latencies = deque(maxlen=history_size)  # 成功请求的延迟（毫秒）
+        self.outcomes = deque(maxlen=history_size)  # 最近请求是否成功
+        self.requests = 0
+        self.errors = 0
+        self.hedges = 0
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+
+    def record(self, ok: bool, latency_ms: float):
+        self.requests += 1
+        self.outcomes.append(ok)
+        if ok:
+            self.latencies.append(latency_ms)
+            self.consecutive_failures = 0
+        else:
+            self.errors += 1
+            self.consecutive_failures += 1
+
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return 1 - sum(self.outcomes) / len(self.outcomes)
+
+    def to_dict(self) -> Dict[str, float]:
+        values = list(self.latencies)
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "hedges": self.hedges,
+            "error_rate": round(self.error_rate(), 3),
+            "p50": percentile(values, 50),
+            "p95": percentile(values, 95),
+        }
+
+
+class ModelRouter:
+    """按模型列表路由聊天补全请求"""
+
+    def __init__(self, hedge_percentile: float = 95, min_samples: int = 5,
+                 failure_threshold: int = 3, cooldown_seconds: float = 60):
+        """
+        Args:
+            hedge_percentile: 主模型超过该延迟百分位时发出对冲请求，<=0 表示不对冲
+            min_samples: 至少有多少个延迟样本才启用对冲
+            failure_threshold: 连续失败多少次后暂时降级该模型
+            cooldown_seconds: 降级持续时间
+        """
+        self.hedge_percentile = hedge_percentile
+        self.min_samples = min_samples
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self._stats: Dict[str, ModelStats] = {}
+
+    def stats_for(self, model: str) -> ModelStats:
+        if model not in self._stats:
+            self._stats[model] = ModelStats()
+        return self._stats[model]
+
+    def order(self, models: List[str]) -> List[str]:
+        """健康的模型保持配置顺序，降级中的模型排到最后"""
+        now = time.monotonic()
+        healthy = [m for m in models if self.stats_for(m).cooldown_until <= now]
+        cooling = [m for m in models if m not in healthy]
+        return healthy + cooling
+
+    def hedge_delay(self, model: str) -> Optional[float]:
+        """对冲等待时间（秒），样本不足或未启用时返回None"""
+        if self.hedge_percentile <= 0:
+            return None
+        latencies = list(self.stats_for(model).latencies)
+        if len(latencies) < self.min_samples:
+            return None
+        return percentile(latencies, self.hedge_percentile) / 1000
+
+    async def _timed(self, model: str, call: ModelCall) -> Optional[str]:
+        stats = self.stats_for(model)
+        start = time.perf_counter()
+        try:
+            text = await call(model)
+        except asyncio.CancelledError:
+            # 对冲中落败的请求不计入统计
+            raise
+        except Exception as e:
+            print(f"❌ 模型 {model} 调用异常: {e}")
+            text = None
+
+        stats.record(bool(text), (time.perf_counter() - start) * 1000)
+        if not text and stats.consecutive_failures >= self.failure_threshold:
+            stats.cooldown_until = time.monotonic() + self.cooldown_seconds
+            print(f"⚡ 模型 {model} 连续失败 {stats.consecutive_failures} 次，降级 {self.cooldown_seconds:.0f} 秒")
+        return text
+
+    async def complete(self, models: List[str], call: ModelCall) -> Tuple[Optional[str], Optional[str]]:
+        """
+        按模型列表完成一次请求
+
+        Args:
+            models: 有序模型列表
+            call: 使用指定模型发出请求的函数
+
+        Returns:
+            (生成的文本, 使用的模型)，全部失败返回 (None, None)
+        """
+        ordered = self.order(models)
+        index = 0
+        tasks: Dict[asyncio.Task, str] = {}
+        try:
+            while index < len(ordered):
+                model = ordered[index]
+                tasks = {asyncio.create_task(self._timed(model, call)): model}
+
+                # 主模型超过历史延迟百分位仍未返回，向下一个模型发出对冲请求
+                delay = self.hedge_delay(model) if index + 1 < len(ordered) else None
+                if delay is not None:
+                    done, _ = await asyncio.wait(set(tasks), timeout=delay)
+                    if not done:
+                        index += 1
+                        backup = ordered[index]
+                        self.stats_for(model).hedges += 1
+                        print(f"⏱️ {model} 超过 p{self.hedge_percentile:.0f} ({delay:.1f}s)，对冲请求 {backup}")
+                        tasks[asyncio.create_task(self._timed(backup, call))] = backup
+
+                pending = set(tasks)
+                while pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        text = task.result()
+                        if text:
+                            return text, tasks[task]
+
+                # 本轮全部失败，切换到下一个模型
+                index += 1
+                if index < len(ordered):
+                    print(f"🔁 切换到备用模型: {ordered[index]}")
+            return None, None
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def get_stats(self) -> Dict[str, Dict[str, float]]:
+        """每个模型的请求数、错误率和延迟（毫秒）"""
+        return {model: stats.to_dict() for model, stats in self._stats.items() if stats.requests}
+
+
+# 全局模型路由器（LOL和Valorant分析器共享）
+model_router = ModelRouter(hedge_percentile=Config.LLM_ROUTER_HEDGE_PERCENTILE)
@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+"""
+玩家绑定存储（SQLite）
+- WAL 模式，读写互不阻塞，多个监控同时写入不会产生写了一半的文件
+- discord_id 为主键，riot_id 为唯一索引，按ID查询为 O(log n)
+- 状态更新只修改对应的一行，不再整份重写 player_links.json
+- 首次启动时从 player_links.json 一次性迁移
+- 多进程共用同一数据库时，打开/检查/恢复/备份在文件锁（fcntl）内进行
+- 打开时做完整性检查，损坏的数据库移到一边并从最近一次完好的备份恢复
+"""
+
+import json
+import os
+import shutil
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # Windows：只依赖 SQLite 自身的锁
+
+# 表中的列，其他字段保存在 extra（JSON）中
+COLUMNS = (
+    "discord_id", "riot_id", "game", "registered_at", "last_match_id",
+    "is_in_voice", "is_in_game", "active_match", "last_check",
+)
+BOOL_COLUMNS = ("is_in_voice", "is_in_game")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS players (
+    discord_id TEXT PRIMARY KEY,
+    riot_id TEXT NOT NULL,
+    game TEXT NOT NULL DEFAULT 'LOL',
+    registered_at TEXT,
+    last_match_id TEXT,
+    is_in_voice INTEGER,
+    is_in_game INTEGER,
+    active_match TEXT,
+    last_check TEXT,
+    extra TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_players_riot_id ON players(riot_id);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+@contextmanager
+def _file_lock(lock_path: str):
+    """跨进程的排他建议锁（没有 fcntl 时不加锁）"""
+    if fcntl is None:
+        yield
+        return
+    with open(lock_path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, check_same_thread=False, timeout=5.0)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _quick_check(conn: sqlite3.Connection) -> str:
+    return conn.execute("PRAGMA quick_check").fetchone()[0]
+
+
+class PlayerStore:
+    """玩家绑定的 SQLite 存储（线程安全，同一进程共享一个连接）"""
+
+    def __init__(self, db_path: str = "data/players.db", legacy_json_path: Optional[str] = None):
+        """
+        Args:
+            db_path: 数据库文件路径
+            legacy_json_path: 旧的 player_links.json，首次启动时迁移其中的数据
+        """
+        self.db_path = db_path
+        self.backup_path = db_path + ".bak"
+        self.lock_path = db_path + ".lock"
+        self._lock = threading.RLock()
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # 其他进程可能正在恢复或迁移同一个数据库
+        with _file_lock(self.lock_path):
+            self._conn = self._open_checked()
+            with self._lock:
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute("PRAGMA synchronous=NORMAL")
+                self._conn.execute("PRAGMA busy_timeout=5000")
+                self._conn.executescript(SCHEMA)
+
+            if legacy_json_path:
+                self.migrate_from_json(legacy_json_path)
+
+    # ---------- 完整性 / 恢复 / 备份 ----------
+
+    def _open_checked(self) -> sqlite3.Connection:
+        """打开数据库并做完整性检查，损坏时从备份恢复"""
+        conn = None
+        try:
+            conn = _connect(self.db_path)
+            reason = _quick_check(conn)
+            if reason == "ok":
+                return conn
+        except sqlite3.DatabaseError as e:
+            reason = str(e)
+        if conn is not None:
+            conn.close()
+
+        print(f"ERROR: 玩家数据库 {self.db_path} 已损坏: {reason}")
+        self._quarantine()
+        if self._restore_backup():
+            print(f"SUCCESS: 已从备份 {self.backup_path} 恢复玩家数据库")
+        else:
+            print("WARNING: 没有可用的备份，玩家数据库将重新创建（会再次从 player_links.json 迁移）")
+        return _connect(self.db_path)
+
+    def _quarantine(self):
+        """把损坏的数据库（连同 WAL 文件）移到一边，保留以便排查"""
+        suffix = datetime.now().strftime("%Y%m%d%H%M%S")
+        for ext in ("", "-wal", "-shm"):
+            if os.path.exists(self.db_path + ext):
+                os.replace(self.db_path + ext, f"{self.db_path}.corrupt-{suffix}{ext}")
+
+    def _restore_backup(self) -> bool:
+        if not os.path.exists(self.backup_path):
+            return False
+        try:
+            conn = _connect(self.backup_path)
+            try:
+                if _quick_check(conn) != "ok":
+                    print(f"ERROR: 备份 {self.backup_path} 也已损坏")
+                    return False
+            finally:
+                conn.close()
+            temp_path = self.db_path + ".restore"
+            shutil.copyfile(self.backup_path, temp_path)
+            with open(temp_path, "rb") as f:
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.db_path)
+            return True
+        except (OSError, sqlite3.DatabaseError) as e:
+            print(f"ERROR: 从备份恢复失败: {e}")
+            return False
+
+    def check_integrity(self) -> bool:
+        """对正在使用的数据库做完整性检查"""
+        try:
+            with self._lock:
+                return _quick_check(self._conn) == "ok"
+        except sqlite3.DatabaseError as e:
+            print(f"ERROR: 玩家数据库完整性检查失败: {e}")
+            return False
+
+    def backup(self) -> bool:
+        """
+        生成一致的备份：SQLite 在线备份到临时文件 → 检查 → fsync → 原子替换
+        备份不完整或检查失败时保留上一份完好的备份
+
+        Returns:
+            是否成功
+        """
+        temp_path = self.backup_path + ".tmp"
+        try:
+            with _file_lock(self.lock_path):
+                target = sqlite3.connect(temp_path)
+                try:
+                    with self._lock:
+                        self._conn.backup(target)
+                    # 备份文件不使用 WAL，单个文件即可完整恢复
+                    target.execute("PRAGMA journal_mode=DELETE")
+                    ok = _quick_check(target) == "ok"
+                finally:
+                    target.close()
+                if not ok:
+                    os.remove(temp_path)
+                    print("ERROR: 玩家数据库备份未通过完整性检查，保留上一份备份")
+                    return False
+                with open(temp_path, "rb") as f:
+                    os.fsync(f.fileno())
+                os.replace(temp_path, self.backup_path)
+            return True
+        except (OSError, sqlite3.Error) as e:
+            print(f"ERROR: 备份玩家数据库失败: {e}")
+            return False
+
+    # ---------- 行转换 ----------
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        player = {column: row[column] for column in COLUMNS}
+        for column in BOOL_COLUMNS:
+            if player[column] is not None:
+                player[column] = bool(player[column])
+        if row["extra"]:
+            player.update(json.loads(row["extra"]))
+        return player
+
+    @staticmethod
+    def _to_row(player: Dict[str, Any]) -> tuple:
+        values = [player.get(column) for column in COLUMNS]
+        for index, column in enumerate(COLUMNS):
+            if column in BOOL_COLUMNS and values[index] is not None:
+                values[index] = int(bool(values[index]))
+        if not values[COLUMNS.index("game")]:
+            values[COLUMNS.index("game")] = "LOL"
+        extra = {key: value for key, value in player.items() if key not in COLUMNS}
+        return tuple(values) + (json.dumps(extra, ensure_ascii=False) if extra else None,)
+
+    # ---------- 迁移 ----------
+
+    def migrate_from_json(self, json_path: str) -> int:
+        """
+        从 player_links.json 一次性迁移（只执行一次，原文件保留不动）
+
+        Returns:
+            迁移的玩家数
+        """
+        with self._lock:
+            done = self._conn.execute("SELECT value FROM meta WHERE key = 'migrated_json'").fetchone()
+            if done or not os.path.exists(json_path):
+                return 0
+
+            try:
+                with open(json_path, 'r', encoding='utf-8') as f:
+                    players = json.load(f).get("players", [])
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"WARNING: 无法读取 {json_path}，跳过迁移: {e}")
+                return 0
+
+            placeholders = ", ".join("?" * (len(COLUMNS) + 1))
+            with self._conn:
+                self._conn.executemany(
+                    f"INSERT OR IGNORE INTO players ({', '.join(COLUMNS)}, extra) VALUES ({placeholders})",
+                    [self._to_row(player) for player in players if player.get("discord_id") and player.get("riot_id")],
+                )
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated_json', ?)", (json_path,)
+                )
+            print(f"SUCCESS: 已从 {json_path} 迁移 {len(players)} 个玩家到 {self.db_path}")
+            return len(players)
+
+    # ---------- 查询 ----------
+
+    def get_by_discord(self, discord_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM players WHERE discord_id = ?", (discord_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def get_by_riot(self, riot_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM players WHERE riot_id = ?", (riot_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def all(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM players ORDER BY rowid").fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM players").fetchone()[0]
+
+    def data_version(self) -> int:
+        """其他连接（其他进程）提交修改后才会变化的版本号，本连接的写入不改变它"""
+        with self._lock:
+            return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    # ---------- 写入 ----------
+
+    def insert(self, player: Dict[str, Any]) -> bool:
+        """插入新玩家，discord_id 或 riot_id 已存在时返回False"""
+        placeholders = ", ".join("?" * (len(COLUMNS) + 1))
+        try:
+            with self._lock, self._conn:
+                self._conn.execute(
+                    f"INSERT INTO players ({', '.join(COLUMNS)}, extra) VALUES ({placeholders})",
+                    self._to_row(player),
+                )
+            return True
+        except sqlite3.IntegrityError:
+            return False
+
+    def delete_by_discord(self, discord_id: str) -> bool:
+        with self._lock, self._conn:
+            cursor = self._conn.execute("DELETE FROM players WHERE discord_id = ?", (discord_id,))
+        return cursor.rowcount > 0
+
+    def update_by_riot(self, riot_id: str, **fields) -> bool:
+        """
+        只更新一行的指定列
+
+        Returns:
+            是否找到该玩家
+        """
+        unknown = [name for name in fields if name not in COLUMNS]
+        if unknown:
+            raise ValueError(f"未知字段: {', '.join(unknown)}")
+        values = [int(bool(value)) if name in BOOL_COLUMNS and value is not None else value
+                  for name, value in fields.items()]
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                f"UPDATE players SET {assignments} WHERE riot_id = ?", (*values, riot_id)
+            )
+        return cursor.rowcount > 0
+
+    def update_many(self, rows: Dict[str, Dict[str, Any]], newer_only: bool = False) -> int:
+        """
+        在一个事务中更新多行
+
+        Args:
+            rows: {riot_id: {列名: 值}}
+            newer_only: 只在库中的 last_check 不比要写入的新时更新（其他进程写入的更新状态不被覆盖）
+
+        Returns:
+            实际更新的行数
+        """
+        updated = 0
+        with self._lock, self._conn:
+            for riot_id, fields in rows.items():
+                values = [int(bool(value)) if name in BOOL_COLUMNS and value is not None else value
+                          for name, value in fields.items()]
+                assignments = ", ".join(f"{name} = ?" for name in fields)
+                sql = f"UPDATE players SET {assignments} WHERE riot_id = ?"
+                params = (*values, riot_id)
+                if newer_only and fields.get("last_check"):
+                    sql += " AND (last_check IS NULL OR last_check <= ?)"
+                    params += (fields["last_check"],)
+                updated += self._conn.execute(sql, params).rowcount
+        return updated
+
+    def mark_stale_offline(self, cutoff: str, now: str) -> int:
+        """
+        将 last_check 早于 cutoff 且仍显示在线/游戏中的玩家标记为离线
+
+        Returns:
+            更新的玩家数
+        """
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "UPDATE players SET is_in_voice = 0, is_in_game = 0, active_match = NULL, last_check = ? "
+                "WHERE last_check < ? AND (is_in_voice = 1 OR is_in_game = 1)",
+                (now, cutoff),
+            )
+        return cursor.rowcount
+
+    def replace_all(self, players: List[Dict[str, Any]]) -> None:
+        """用完整列表替换所有玩家（兼容旧的 save_bindings 接口）"""
+        placeholders = ", ".join("?" * (len(COLUMNS) + 1))
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM players")
+            self._conn.executemany(
+                f"INSERT INTO players ({', '.join(COLUMNS)}, extra) VALUES ({placeholders})",
+                [self._to_row(player) for player in players],
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# 同一数据库文件在进程内共享一个存储实例
+_stores: Dict[str, PlayerStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_player_store(db_path: str, legacy_json_path: Optional[str] = None) -> PlayerStore:
+    """获取（或创建）指定数据库文件的共享存储"""
+    key = os.path.abspath(db_path)
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = PlayerStore(db_path, legacy_json_path)
+        return _stores[key]
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+已注册玩家的 Discord 在线/语音索引
+- 由网关事件（语音状态、在线状态）增量维护，查询不再遍历所有绑定和服务器
+- 在线和语音中的玩家分别放在集合中，online_players / voice_players 的代价与结果数量成正比
+- 第一次查询时从缓存的成员信息重建一次（Bot 重启后事件不会重放）
+"""
+
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+import discord
+
+# 与原来的 check_discord_presence 一致：勿扰不算在线
+ONLINE_STATUSES = (discord.Status.online, discord.Status.idle)
+
+
+class PresenceIndex:
+    """Discord ID -> 服务器/语音频道/在线状态 的索引（线程安全）"""
+
+    def __init__(self):
+        self.ready = False
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._online: Set[str] = set()
+        self._voice: Set[str] = set()
+
+    @staticmethod
+    def _empty_entry(discord_id: str) -> Dict[str, Any]:
+        return {
+            "discord_id": discord_id,
+            "is_online": False,
+            "in_voice": False,
+            "voice_channel": None,
+            "voice_channel_id": None,
+            "guild_name": None,
+            "guild_id": None,
+            "member": None,
+        }
+
+    def update_member(self, member: discord.Member):
+        """
+        根据成员当前的状态更新索引（语音状态或在线状态变化时调用）
+        同一用户在多个服务器中时，以所在语音频道的服务器为准
+        """
+        discord_id = str(member.id)
+        voice_channel = member.voice.channel if member.voice else None
+        with self._lock:
+            entry = self._entries.setdefault(discord_id, self._empty_entry(discord_id))
+            entry["is_online"] = member.status in ONLINE_STATUSES
+
+            if voice_channel is not None:
+                entry.update({
+                    "in_voice": True,
+                    "voice_channel": voice_channel.name,
+                    "voice_channel_id": voice_channel.id,
+                    "guild_name": member.guild.name,
+                    "guild_id": member.guild.id,
+                    "member": member,
+                })
+            elif not entry["in_voice"] or entry["guild_id"] == member.guild.id:
+                # 离开语音，或者本来就不在语音中
+                entry.update({
+                    "in_voice": False,
+                    "voice_channel": None,
+                    "voice_channel_id": None,
+                    "guild_name": member.guild.name,
+                    "guild_id": member.guild.id,
+                    "member": member,
+                })
+
+            self._set_flag(self._online, discord_id, entry["is_online"])
+            self._set_flag(self._voice, discord_id, entry["in_voice"])
+
+    @staticmethod
+    def _set_flag(members: Set[str], discord_id: str, value: bool):
+        if value:
+            members.add(discord_id)
+        else:
+            members.discard(discord_id)
+
+    def remove(self, discord_id: str):
+        """解绑后移出索引"""
+        with self._lock:
+            self._entries.pop(discord_id, None)
+            self._online.discard(discord_id)
+            self._voice.discard(discord_id)
+
+    def rebuild(self, bot_client: discord.Client, discord_ids: Iterable[str]):
+        """
+        从 Bot 缓存的成员信息重建索引（启动后第一次查询时调用一次）
+
+        Args:
+            bot_client: Discord Bot
+            discord_ids: 已注册的 Discord ID
+        """
+        with self._lock:
+            self._entries.clear()
+            self._online.clear()
+            self._voice.clear()
+        for discord_id in discord_ids:
+            self.refresh(bot_client, discord_id)
+        self.ready = True
+
+    def refresh(self, bot_client: discord.Client, discord_id: str):
+        """从 Bot 缓存重新读取一个用户在各服务器中的状态（新注册时调用）"""
+        with self._lock:
+            self._entries[discord_id] = self._empty_entry(discord_id)
+            self._online.discard(discord_id)
+            self._voice.discard(discord_id)
+        for guild in bot_client.guilds:
+            member = guild.get_member(int(discord_id))
+            if member:
+                self.update_member(member)
+
+    def get(self, discord_id: str) -> Optional[Dict[str, Any]]:
+        """已索引的用户返回状态副本，不在任何服务器中的用户返回离线状态"""
+        with self._lock:
+            entry = self._entries.get(discord_id)
+            return dict(entry) if entry else self._empty_entry(discord_id)
+
+    def online(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [dict(self._entries[discord_id]) for discord_id in self._online]
+
+    def in_voice(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [dict(self._entries[discord_id]) for discord_id in self._voice]
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"indexed": len(self._entries), "online": len(self._online), "voice": len(self._voice)}
+
+
+# 全局索引
+presence_index = PresenceIndex()
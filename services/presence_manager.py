@@ -3,44 +3,77 @@ Presence Manager Module
 Manages Riot ID to Discord ID bindings and checks Discord presence status
 """
 
-import json
-import os
 from datetime import datetime
 from typing import Dict, List, Optional, Any
 import discord
+from services.config import Config
+from services.binding_registry import BindingRegistry, get_binding_registry
+from services.presence_index import PresenceIndex, presence_index
 
 class PresenceManager:
-    def __init__(self, data_path: str = "data/player_links.json"):
+    """
+    Facade over the process-wide binding registry
+    All instances for the same database share one in-memory index, so lookups never touch disk
+    """
+    
+    def __init__(self, data_path: str = "data/player_links.json", db_path: Optional[str] = None,
+                 status_log_path: Optional[str] = None, index: Optional[PresenceIndex] = None):
+        """
+        Args:
+            data_path: Legacy JSON file, migrated into the database once
+            db_path: SQLite database path (default: Config.PLAYER_DB_PATH)
+            status_log_path: Status event log path (default: Config.STATUS_LOG_PATH, empty disables it)
+            index: Discord presence index fed by gateway events (default: the shared index)
+        """
         self.data_path = data_path
-        self.ensure_data_directory()
+        self.db_path = db_path or Config.PLAYER_DB_PATH
+        self.status_log_path = Config.STATUS_LOG_PATH if status_log_path is None else status_log_path
+        self._registry: Optional[BindingRegistry] = None
+        self.index = index or presence_index
+    
+    @property
+    def registry(self) -> BindingRegistry:
+        """Shared registry, opened on first use"""
+        if self._registry is None:
+            self._registry = get_binding_registry(
+                self.db_path, legacy_json_path=self.data_path, flush_delay=Config.BINDING_FLUSH_DELAY_SECONDS,
+                status_log_path=self.status_log_path or None, fsync_interval=Config.STATUS_LOG_FSYNC_SECONDS,
+                keep_rotated_logs=Config.STATUS_LOG_KEEP_ROTATED
+            )
+        return self._registry
     
-    def ensure_data_directory(self):
-        """Ensure the data directory exists"""
-        os.makedirs(os.path.dirname(self.data_path), exist_ok=True)
-        if not os.path.exists(self.data_path):
-            self.save_bindings({"players": []})
+    @property
+    def store(self):
+        """Underlying SQLite player store"""
+        return self.registry.store
+    
+    def flush(self) -> int:
+        """
+        Write pending status updates to the database now
+        Returns: number of players written
+        """
+        return self.registry.flush()
     
     def load_bindings(self) -> Dict[str, Any]:
         """
-        Load binding data from JSON file
+        Load all bindings
         Returns: dict containing players list
         """
         try:
-            with open(self.data_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
+            return {"players": self.registry.all()}
+        except Exception as e:
+            print(f"Error loading bindings: {e}")
             return {"players": []}
     
     def save_bindings(self, data: Dict[str, Any]) -> bool:
         """
-        Save binding data to JSON file
+        Replace all bindings (prefer the row-level methods below)
         Args:
             data: dict containing players list
         Returns: bool indicating success
         """
         try:
-            with open(self.data_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
+            self.registry.replace_all(data["players"])
             return True
         except Exception as e:
             print(f"Error saving bindings: {e}")
@@ -53,22 +86,9 @@ class PresenceManager:
             discord_id: Discord user ID
             riot_id: Riot ID (Name#TAG format)
             game: Game type (default: LOL)
-        Returns: bool indicating success
+        Returns: bool indicating success (False if either ID is already bound)
         """
         try:
-            data = self.load_bindings()
-            
-            # Check if Discord ID already exists
-            for player in data["players"]:
-                if player["discord_id"] == discord_id:
-                    return False
-            
-            # Check if Riot ID already exists
-            for player in data["players"]:
-                if player["riot_id"] == riot_id:
-                    return False
-            
-            # Add new binding
             new_binding = {
                 "discord_id": discord_id,
                 "riot_id": riot_id,
@@ -76,9 +96,7 @@ class PresenceManager:
                 "registered_at": datetime.now().isoformat(),
                 "last_match_id": None
             }
-            
-            data["players"].append(new_binding)
-            return self.save_bindings(data)
+            return self.registry.register(new_binding)
             
         except Exception as e:
             print(f"Error registering binding: {e}")
@@ -92,20 +110,8 @@ class PresenceManager:
         Returns: bool indicating success
         """
         try:
-            data = self.load_bindings()
-            
-            # Find and remove the binding
-            original_count = len(data["players"])
-            data["players"] = [
-                player for player in data["players"] 
-                if player["discord_id"] != discord_id
-            ]
-            
-            # Check if any binding was removed
-            if len(data["players"]) < original_count:
-                return self.save_bindings(data)
-            return False
-            
+            self.index.remove(discord_id)
+            return self.registry.unregister(discord_id)
         except Exception as e:
             print(f"Error unregistering binding: {e}")
             return False
@@ -118,13 +124,7 @@ class PresenceManager:
         Returns: dict with binding info or None
         """
         try:
-            data = self.load_bindings()
-            
-            for player in data["players"]:
-                if player["discord_id"] == discord_id:
-                    return player
-            return None
-            
+            return self.registry.get_by_discord(discord_id)
         except Exception as e:
             print(f"Error getting binding by Discord ID: {e}")
             return None
@@ -137,13 +137,7 @@ class PresenceManager:
         Returns: dict with binding info or None
         """
         try:
-            data = self.load_bindings()
-            
-            for player in data["players"]:
-                if player["riot_id"] == riot_id:
-                    return player
-            return None
-            
+            return self.registry.get_by_riot(riot_id)
         except Exception as e:
             print(f"Error getting binding by Riot ID: {e}")
             return None
@@ -154,8 +148,7 @@ class PresenceManager:
         Returns: list of all binding dictionaries
         """
         try:
-            data = self.load_bindings()
-            return data["players"]
+            return self.registry.all()
         except Exception as e:
             print(f"Error getting all bindings: {e}")
             return []
@@ -169,21 +162,82 @@ class PresenceManager:
         Returns: bool indicating success
         """
         try:
-            data = self.load_bindings()
-            
-            for player in data["players"]:
-                if player["riot_id"] == riot_id:
-                    player["last_match_id"] = match_id
-                    return self.save_bindings(data)
-            return False
-            
+            return self.registry.update(riot_id, last_match_id=match_id)
         except Exception as e:
             print(f"Error updating last match: {e}")
             return False
     
+    def get_store_stats(self) -> Dict[str, int]:
+        """
+        Get binding registry statistics
+        Returns: dict with player count, status transitions, heartbeats, flushes and pending writes
+        """
+        return self.registry.get_stats()
+    
+    def backup_store(self) -> bool:
+        """
+        Flush pending status updates and snapshot the database to its backup file
+        The backup is what a corrupted database is restored from at startup
+        Returns: bool indicating success
+        """
+        try:
+            self.registry.flush()
+            return self.store.backup()
+        except Exception as e:
+            print(f"Error backing up player store: {e}")
+            return False
+    
+    def compact_status_log(self) -> int:
+        """
+        Fold the status event log into the snapshot loaded at startup
+        Returns: number of events folded
+        """
+        try:
+            status_log = self.registry.status_log
+            return status_log.compact() if status_log else 0
+        except Exception as e:
+            print(f"Error compacting status log: {e}")
+            return 0
+    
+    def next_status_expiry(self) -> Optional[datetime]:
+        """
+        Get the oldest last_check among players still shown online or in game
+        Returns: datetime, or None when nobody is online
+        """
+        try:
+            last_check = self.registry.next_expiry()
+            return datetime.fromisoformat(last_check) if last_check else None
+        except Exception as e:
+            print(f"Error getting next status expiry: {e}")
+            return None
+    
+    def mark_stale_players_offline(self, cutoff: datetime) -> int:
+        """
+        Mark players whose status was last checked before cutoff as offline
+        Only expired entries are popped from the registry's deadline heap
+        Args:
+            cutoff: Status checks older than this are considered stale
+        Returns: number of players updated
+        """
+        try:
+            return self.registry.mark_stale_offline(cutoff.isoformat(), datetime.now().isoformat())
+        except Exception as e:
+            print(f"Error marking stale players: {e}")
+            return 0
+    
+    def _ensure_index(self, bot_client: discord.Client):
+        """Build the presence index from the bot's member cache on first use"""
+        if not self.index.ready:
+            self.index.rebuild(bot_client, [binding["discord_id"] for binding in self.registry.all()])
+    
+    def _presence_info(self, entry: Dict[str, Any], riot_id: str) -> Dict[str, Any]:
+        presence_info = dict(entry)
+        presence_info["riot_id"] = riot_id
+        return presence_info
+    
     def check_discord_presence(self, riot_id: str, bot_client: discord.Client) -> Optional[Dict[str, Any]]:
         """
-        Check Discord presence status for a Riot ID
+        Check Discord presence status for a Riot ID (index lookup, no guild scan)
         Args:
             riot_id: Riot ID to check
             bot_client: Discord bot client
@@ -195,64 +249,31 @@ class PresenceManager:
             if not binding:
                 return None
             
-            discord_id = int(binding["discord_id"])
-            
-            # Search through all guilds for the user
-            for guild in bot_client.guilds:
-                member = guild.get_member(discord_id)
-                if member:
-                    # Check if user is online and in voice
-                    is_online = member.status in [discord.Status.online, discord.Status.idle]
-                    in_voice = member.voice is not None
-                    
-                    presence_info = {
-                        "discord_id": str(discord_id),
-                        "riot_id": riot_id,
-                        "is_online": is_online,
-                        "in_voice": in_voice,
-                        "voice_channel": member.voice.channel.name if member.voice else None,
-                        "voice_channel_id": member.voice.channel.id if member.voice else None,
-                        "guild_name": guild.name,
-                        "guild_id": guild.id,
-                        "member": member
-                    }
-                    
-                    return presence_info
-            
-            # User not found in any guild
-            return {
-                "discord_id": str(discord_id),
-                "riot_id": riot_id,
-                "is_online": False,
-                "in_voice": False,
-                "voice_channel": None,
-                "voice_channel_id": None,
-                "guild_name": None,
-                "guild_id": None,
-                "member": None
-            }
+            self._ensure_index(bot_client)
+            return self._presence_info(self.index.get(binding["discord_id"]), riot_id)
             
         except Exception as e:
             print(f"Error checking Discord presence: {e}")
             return None
     
+    def _indexed_players(self, entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        players = []
+        for entry in entries:
+            binding = self.registry.get_by_discord(entry["discord_id"])
+            if binding:
+                players.append(self._presence_info(entry, binding["riot_id"]))
+        return players
+    
     def get_online_players(self, bot_client: discord.Client) -> List[Dict[str, Any]]:
         """
         Get all online players with their presence status
         Args:
             bot_client: Discord bot client
-        Returns: list of presence info for all bound players
+        Returns: list of presence info for all online bound players
         """
         try:
-            bindings = self.get_all_active_bindings()
-            online_players = []
-            
-            for binding in bindings:
-                presence = self.check_discord_presence(binding["riot_id"], bot_client)
-                if presence and presence["is_online"]:
-                    online_players.append(presence)
-            
-            return online_players
+            self._ensure_index(bot_client)
+            return self._indexed_players(self.index.online())
             
         except Exception as e:
             print(f"Error getting online players: {e}")
@@ -266,15 +287,8 @@ class PresenceManager:
         Returns: list of presence info for players in voice
         """
         try:
-            bindings = self.get_all_active_bindings()
-            voice_players = []
-            
-            for binding in bindings:
-                presence = self.check_discord_presence(binding["riot_id"], bot_client)
-                if presence and presence["in_voice"]:
-                    voice_players.append(presence)
-            
-            return voice_players
+            self._ensure_index(bot_client)
+            return self._indexed_players(self.index.in_voice())
             
         except Exception as e:
             print(f"Error getting voice players: {e}")
@@ -282,7 +296,8 @@ class PresenceManager:
     
     def update_user_status(self, riot_id: str, is_in_voice: bool, is_in_game: bool, active_match: Optional[str] = None, last_check: Optional[str] = None) -> bool:
         """
-        Update user's real-time status in player_links.json
+        Update user's real-time status
+        Only real changes are written back (in batches); last_check-only heartbeats stay in memory
         Args:
             riot_id: Riot ID to update
             is_in_voice: Whether user is in voice channel
@@ -292,25 +307,18 @@ class PresenceManager:
         Returns: bool indicating success
         """
         try:
-            data = self.load_bindings()
+            fields = {
+                "is_in_voice": is_in_voice,
+                "is_in_game": is_in_game,
+                "active_match": active_match,
+                "last_check": last_check or datetime.now().isoformat(),
+            }
+            # Update last_match_id if we have an active match
+            if active_match:
+                fields["last_match_id"] = active_match
             
-            # Find the user and update their status
-            for player in data["players"]:
-                if player["riot_id"] == riot_id:
-                    # Update status fields
-                    player["is_in_voice"] = is_in_voice
-                    player["is_in_game"] = is_in_game
-                    player["active_match"] = active_match
-                    if last_check:
-                        player["last_check"] = last_check
-                    else:
-                        player["last_check"] = datetime.now().isoformat()
-                    
-                    # Update last_match_id if we have an active match
-                    if active_match:
-                        player["last_match_id"] = active_match
-                    
-                    return self.save_bindings(data)
+            if self.registry.update(riot_id, **fields):
+                return True
             
             # User not found
             print(f"WARNING: User {riot_id} not found for status update")
@@ -318,4 +326,8 @@ class PresenceManager:
             
         except Exception as e:
             print(f"ERROR: Failed to update user status: {e}")
-            return False
\ No newline at end of file
+            return False
+
+
+# Shared facade - all cogs and monitors use the same registry
+presence_manager = PresenceManager()
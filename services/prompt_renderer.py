@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+紧凑提示词渲染
+- 比赛数据序列化为紧凑、稳定（键排序）的 JSON，而不是 Python dict 的 repr
+- 系统角色作为固定前缀放在 system 消息中，同一风格的请求前缀完全相同，可以命中服务端的提示词缓存；
+  风格模板在 user 消息中填入字段（与原来的 format_prompt 一致），{match_data} 为紧凑JSON
+- 发送前统计 token 数（安装了 tiktoken 时精确计算，否则估算），超过 PROMPT_MAX_TOKENS 的提示词不发送
+- 输出上限由目标语音时长换算，而不是固定 500
+"""
+
+import json
+import math
+import re
+from typing import Any, Dict, Optional
+
+from services.config import Config
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+_CJK_PATTERN = re.compile(r"[\u3000-\u303f\u4e00-\u9fff\uff00-\uffef]")
+_encodings: Dict[str, Any] = {}
+
+
+def lol_template_fields(match_data: Dict[str, Any]) -> Dict[str, str]:
+    """LOL模板字段（与 PromptManager.format_prompt 一致）"""
+    return {
+        "player_result": match_data['player_info']['result'],
+        "mvp_username": match_data['team_mvp']['name'].split('#')[0],
+        "mvp_champion": match_data['team_mvp']['champion_chinese'],
+        "lvp_username": match_data['team_lvp']['name'].split('#')[0],
+        "lvp_champion": match_data['team_lvp']['champion_chinese'],
+    }
+
+
+def valorant_template_fields(match_data: Dict[str, Any]) -> Dict[str, str]:
+    """Valorant模板字段（strongest_player 为MVP，weakest_player 为LVP）"""
+    strongest = match_data.get('strongest_player', {})
+    weakest = match_data.get('weakest_player', {})
+    return {
+        "player_result": match_data.get('result', 'Unknown'),
+        "mvp_username": strongest.get('name', 'Unknown'),
+        "mvp_champion": strongest.get('character', 'Unknown'),
+        "lvp_username": weakest.get('name', 'Unknown'),
+        "lvp_champion": weakest.get('character', 'Unknown'),
+    }
+
+
+def template_fields(match_data: Dict[str, Any]) -> Dict[str, str]:
+    """根据数据结构选择LOL或Valorant的模板字段"""
+    if 'player_info' in match_data:
+        return lol_template_fields(match_data)
+    return valorant_template_fields(match_data)
+
+
+def compact_match_facts(match_data: Dict[str, Any]) -> str:
+    """
+    将比赛数据序列化为紧凑、稳定的 JSON
+
+    只保留模板字段和少量对点评有用的数据，去掉比赛ID、PUUID、时间戳等冗余信息
+
+    Args:
+        match_data: LOL分析结果或Valorant比赛信息
+
+    Returns:
+        键排序、无空白的 JSON 字符串
+    """
+    facts: Dict[str, Any] = dict(template_fields(match_data))
+
+    if 'player_info' in match_data:
+        player = match_data['player_info']
+        facts.update({
+            "player": f"{player['name'].split('#')[0]}/{player['champion_chinese']}/{player['kda']}",
+            "player_cs": player.get('cs'),
+            "player_damage": player.get('damage_dealt'),
+            "mvp_kda": match_data['team_mvp'].get('kda'),
+            "lvp_kda": match_data['team_lvp'].get('kda'),
+            "minutes": round(match_data.get('game_duration', 0) / 60),
+        })
+    elif match_data.get('map'):
+        facts["map"] = match_data['map']
+
+    return json.dumps(facts, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+
+
+def count_tokens(text: str, model: str = "gpt-4o-mini") -> int:
+    """
+    统计 token 数
+
+    安装了 tiktoken 时使用模型对应的编码，否则按中文字符约1个token、
+    其他字符约4个字符1个token估算
+    """
+    if tiktoken is not None:
+        encoding = _encodings.get(model)
+        if encoding is None:
+            try:
+                encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                encoding = tiktoken.get_encoding("o200k_base")
+            _encodings[model] = encoding
+        return len(encoding.encode(text))
+
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+def max_tokens_for_duration(seconds: Optional[float] = None) -> int:
+    """
+    根据目标语音时长计算输出 token 上限
+
+    Args:
+        seconds: 目标语音时长（秒），None 使用 Config.TARGET_SPEECH_SECONDS
+
+    Returns:
+        输出 token 上限（留20%余量，不超过 Config.OPENAI_MAX_OUTPUT_TOKENS）
+    """
+    if not seconds:
+        seconds = Config.TARGET_SPEECH_SECONDS
+    chars = seconds * Config.SPEECH_CHARS_PER_SECOND
+    tokens = math.ceil(chars * Config.TOKENS_PER_CHAR * 1.2)
+    return max(64, min(tokens, Config.OPENAI_MAX_OUTPUT_TOKENS))
+
+
+class _KeepMissing(dict):
+    """模板中不认识的 {占位符} 原样保留"""
+
+    def __missing__(self, key: str) -> str:
+        return "{" + key + "}"
+
+
+def fill_template(template: str, match_data: Dict[str, Any]) -> str:
+    """用比赛数据填充风格模板中的 {字段}，{match_data} 为紧凑JSON"""
+    fields = _KeepMissing(template_fields(match_data), match_data=compact_match_facts(match_data))
+    try:
+        return template.format_map(fields)
+    except (ValueError, IndexError) as e:
+        # 模板中有不成对的花括号等：不填充，原样发送
+        print(f"WARNING: 提示词模板格式错误，未填充字段: {e}")
+        return template
+
+
+class RenderedPrompt:
+    """渲染后的提示词"""
+
+    def __init__(self, system: str, user: str, max_tokens: int, prompt_tokens: int):
+        self.system = system
+        self.user = user
+        self.max_tokens = max_tokens
+        self.prompt_tokens = prompt_tokens
+
+
+def render_prompt(system_role: str, template: str, match_data: Dict[str, Any],
+                  target_seconds: Optional[float] = None, model: str = "gpt-4o-mini",
+                  max_prompt_tokens: Optional[int] = None) -> Optional[RenderedPrompt]:
+    """
+    渲染提示词
+
+    Args:
+        system_role: 系统角色（固定前缀）
+        template: 风格模板（{字段} 用比赛数据填充）
+        match_data: 比赛数据（每次不同）
+        target_seconds: 目标语音时长
+        model: 模型名称（用于统计 token）
+        max_prompt_tokens: 提示词 token 上限，None 使用 Config.PROMPT_MAX_TOKENS，<=0 表示不限制
+
+    Returns:
+        RenderedPrompt: system 为系统角色，user 为填充后的模板；超过上限时返回None
+    """
+    if max_prompt_tokens is None:
+        max_prompt_tokens = Config.PROMPT_MAX_TOKENS
+    system = system_role
+    user = fill_template(template, match_data).strip()
+    prompt_tokens = count_tokens(system, model) + count_tokens(user, model)
+    if 0 < max_prompt_tokens < prompt_tokens:
+        print(f"[ERROR] 提示词约 {prompt_tokens} tokens，超过上限 {max_prompt_tokens}，不发送")
+        return None
+    return RenderedPrompt(system, user, max_tokens_for_duration(target_seconds), prompt_tokens)
@@ -9,6 +9,8 @@ import json
 from typing import Dict, Any, Optional
 from pathlib import Path
 
+from services.prompt_renderer import compact_match_facts
+
 class PromptManager:
     """Prompt管理器 - 负责加载和管理所有prompt配置"""
     
@@ -58,7 +60,8 @@ class PromptManager:
             style_name (str): 风格名称
             
         Returns:
-            Dict[str, str]: 包含prompt, system_role和voice_id的配置字典
+            Dict[str, str]: 包含prompt, system_role, voice_id, target_seconds（目标语音时长，可选）
+                和models（有序模型列表，可选）的配置字典
         """
         config = self._load_config()
         styles = config.get("styles", {})
@@ -79,7 +82,9 @@ class PromptManager:
         return {
             "prompt": prompt_content,
             "system_role": style_config.get("system_role", ""),
-            "voice_id": style_config.get("voice_id", "")
+            "voice_id": style_config.get("voice_id", ""),
+            "target_seconds": style_config.get("target_seconds"),
+            "models": style_config.get("models")
         }
     
     def get_available_styles(self) -> list:
@@ -113,7 +118,7 @@ class PromptManager:
         lvp_champion = match_data['team_lvp']['champion_chinese']
         
         return prompt_template.format(
-            match_data=match_data,
+            match_data=compact_match_facts(match_data),
             mvp_username=mvp_username,
             lvp_username=lvp_username,
             player_result=player_result,
@@ -13,7 +13,10 @@ from urllib.parse import quote
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from services.utils import ensure_directory, get_analysis_filename, save_json_file
+from services.utils import get_analysis_filename, save_json_file
+from services.artifact_store import artifact_store
+from services.tracing import tracer
+from services.deadline import get_timeout
 
 # 英雄名字映射表（英文到中文）
 CHAMPION_NAME_MAPPING = {
@@ -226,8 +229,12 @@ def get_chinese_champion_name(english_name):
     return CHAMPION_NAME_MAPPING.get(english_name, english_name)
 
 
-def get_summoner_info(game_name=None, tag_line=None):
-    """获取召唤师信息"""
+def get_summoner_info(game_name=None, tag_line=None, deadline=None):
+    """获取召唤师信息
+    
+    Args:
+        deadline (Deadline, optional): 工作流程截止时间，请求超时不超过剩余时间
+    """
     try:
         # 使用传入的参数或环境变量
         target_game_name = game_name or GAME_NAME
@@ -241,14 +248,18 @@ def get_summoner_info(game_name=None, tag_line=None):
         encoded_game_name = quote(target_game_name, safe='')
         encoded_tag_line = quote(target_tag_line, safe='')
         account_url = f"{ACCOUNT_BASE}/accounts/by-riot-id/{encoded_game_name}/{encoded_tag_line}"
-        account_response = requests.get(account_url, headers=HEADERS, timeout=10)
-        account_response.raise_for_status()
+        with tracer.span("riot.account") as span:
+            account_response = requests.get(account_url, headers=HEADERS, timeout=get_timeout(deadline, 10))
+            span.set(status=account_response.status_code, response_bytes=len(account_response.content))
+            account_response.raise_for_status()
         account_data = account_response.json()
         
         # 获取召唤师信息
         summoner_url = f"{SUMMONER_BASE}/summoners/by-puuid/{account_data['puuid']}"
-        summoner_response = requests.get(summoner_url, headers=HEADERS, timeout=10)
-        summoner_response.raise_for_status()
+        with tracer.span("riot.summoner") as span:
+            summoner_response = requests.get(summoner_url, headers=HEADERS, timeout=get_timeout(deadline, 10))
+            span.set(status=summoner_response.status_code, response_bytes=len(summoner_response.content))
+            summoner_response.raise_for_status()
         summoner_data = summoner_response.json()
         
         return {
@@ -276,12 +287,14 @@ def get_summoner_info(game_name=None, tag_line=None):
         return None
 
 
-def get_recent_matches(puuid, count=1):
+def get_recent_matches(puuid, count=1, deadline=None):
     """获取最近的比赛ID"""
     try:
         matches_url = f"{MATCH_BASE}/matches/by-puuid/{puuid}/ids?start=0&count={count}"
-        matches_response = requests.get(matches_url, headers=HEADERS, timeout=10)
-        matches_response.raise_for_status()
+        with tracer.span("riot.match_ids") as span:
+            matches_response = requests.get(matches_url, headers=HEADERS, timeout=get_timeout(deadline, 10))
+            span.set(status=matches_response.status_code, response_bytes=len(matches_response.content))
+            matches_response.raise_for_status()
         return matches_response.json()
         
     except requests.exceptions.RequestException as e:
@@ -289,12 +302,14 @@ def get_recent_matches(puuid, count=1):
         return []
 
 
-def get_match_details(match_id):
+def get_match_details(match_id, deadline=None):
     """获取比赛详细信息"""
     try:
         match_url = f"{MATCH_BASE}/matches/{match_id}"
-        match_response = requests.get(match_url, headers=HEADERS, timeout=10)
-        match_response.raise_for_status()
+        with tracer.span("riot.match_details", match_id=match_id) as span:
+            match_response = requests.get(match_url, headers=HEADERS, timeout=get_timeout(deadline, 10))
+            span.set(status=match_response.status_code, response_bytes=len(match_response.content))
+            match_response.raise_for_status()
         return match_response.json()
         
     except requests.exceptions.RequestException as e:
@@ -382,6 +397,7 @@ def analyze_match_data(match_data, summoner_info):
         # 构建分析结果
         analysis = {
             'match_id': match_data['metadata']['matchId'],
+            'puuid': player_puuid,
             'game_creation': match_data['info']['gameCreation'],
             'game_duration': match_data['info']['gameDuration'],
             'game_mode': match_data['info']['gameMode'],
@@ -429,8 +445,14 @@ def analyze_match_data(match_data, summoner_info):
         return None
 
 
-def get_match_data_for_user(game_name, tag_line):
-    """为指定用户获取游戏数据"""
+def get_match_data_for_user(game_name, tag_line, deadline=None):
+    """为指定用户获取游戏数据
+    
+    Args:
+        game_name (str): 游戏用户名
+        tag_line (str): 用户标签
+        deadline (Deadline, optional): 工作流程截止时间
+    """
     print("英雄联盟游戏数据获取器（动态用户）")
     print("=" * 50)
     
@@ -447,7 +469,7 @@ def get_match_data_for_user(game_name, tag_line):
         print(f"正在获取玩家信息: {game_name}#{tag_line}")
         
         # 获取召唤师信息
-        summoner_info = get_summoner_info(game_name, tag_line)
+        summoner_info = get_summoner_info(game_name, tag_line, deadline=deadline)
         if not summoner_info:
             print("获取召唤师信息失败")
             return False
@@ -456,17 +478,18 @@ def get_match_data_for_user(game_name, tag_line):
         
         # 获取最近的比赛
         print("正在获取最近的比赛...")
-        recent_matches = get_recent_matches(summoner_info['puuid'], 1)
+        recent_matches = get_recent_matches(summoner_info['puuid'], 1, deadline=deadline)
         if not recent_matches:
             print("未找到最近的比赛")
             return False
         
         match_id = recent_matches[0]
         print(f"找到最近比赛: {match_id}")
+        tracer.annotate(match_id=match_id)
         
         # 获取比赛详情
         print("正在获取比赛详情...")
-        match_data = get_match_details(match_id)
+        match_data = get_match_details(match_id, deadline=deadline)
         if not match_data:
             print("获取比赛详情失败")
             return False
@@ -482,17 +505,11 @@ def get_match_data_for_user(game_name, tag_line):
         
         print("比赛数据分析完成")
         
-        # 保存分析结果
-        # 确保保存到根目录的analysis文件夹
-        import os
-        root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        analysis_dir = os.path.join(root_dir, "analysis")
-        ensure_directory(analysis_dir)
-        
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        output_file = os.path.join(analysis_dir, f"match_analysis_{timestamp}.json")
+        # 保存分析结果到产物根目录，并登记到清单
+        output_file = artifact_store.new_path("lol_match")
         
         if save_json_file(analysis, output_file):
+            artifact_store.add(output_file, "lol_match", match_id=match_id, player=f"{game_name}#{tag_line}")
             print(f"分析结果已保存: {output_file}")
             return True
         else:
@@ -559,17 +576,11 @@ def main():
         
         print("比赛数据分析完成")
         
-        # 保存分析结果
-        # 确保保存到根目录的analysis文件夹
-        import os
-        root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        analysis_dir = os.path.join(root_dir, "analysis")
-        ensure_directory(analysis_dir)
-        
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        output_file = os.path.join(analysis_dir, f"match_analysis_{timestamp}.json")
+        # 保存分析结果到产物根目录，并登记到清单
+        output_file = artifact_store.new_path("lol_match")
         
         if save_json_file(analysis, output_file):
+            artifact_store.add(output_file, "lol_match", match_id=match_id, player=f"{GAME_NAME}#{TAG_LINE}")
             print(f"分析结果已保存: {output_file}")
             return True
         else:
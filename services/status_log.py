@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+玩家状态事件日志（只追加）
+- 每次状态变化（进出语音、开始/结束游戏、对局ID变化）追加一行 JSON，保留完整历史
+- 追加只写入操作系统缓冲，fsync 按间隔批量执行
+- 压缩把日志折叠成快照（每个玩家的最新状态 + 已折叠到的偏移），启动时只需读取快照和之后的日志
+- 折叠后日志轮转为 <名称>.<时间>.jsonl 历史分段，当前日志只保留上次压缩之后的事件
+"""
+
+import json
+import os
+import re
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# 事件日志记录的状态字段
+STATUS_FIELDS = ("is_in_voice", "is_in_game", "active_match", "last_match_id", "last_check")
+
+# (字段, 新值是否为真) -> 事件名
+_EVENT_NAMES = {
+    ("is_in_voice", True): "voice_join",
+    ("is_in_voice", False): "voice_leave",
+    ("is_in_game", True): "game_start",
+    ("is_in_game", False): "game_end",
+    ("active_match", True): "match_start",
+    ("active_match", False): "match_end",
+}
+
+
+def transition_events(changes: Dict[str, Any]) -> List[str]:
+    """把变化的字段转换成事件名，例如 {"is_in_voice": True} -> ["voice_join"]"""
+    return [
+        _EVENT_NAMES[(name, bool(value))]
+        for name, value in changes.items() if (name, bool(value)) in _EVENT_NAMES
+    ]
+
+
+class StatusEventLog:
+    """按行追加的状态事件日志，带快照压缩（线程安全）"""
+
+    def __init__(self, log_path: str, snapshot_path: Optional[str] = None, fsync_interval: float = 1.0,
+                 keep_rotated: int = 30):
+        """
+        Args:
+            log_path: 事件日志路径（JSON Lines）
+            snapshot_path: 快照路径，默认为日志同目录下的 <名称>.snapshot.json
+            fsync_interval: 批量 fsync 的间隔（秒），<=0 表示每次追加都 fsync
+            keep_rotated: 保留的历史分段数，<=0 表示压缩后直接丢弃已折叠的日志
+        """
+        self.log_path = log_path
+        self.snapshot_path = snapshot_path or os.path.splitext(log_path)[0] + ".snapshot.json"
+        self.fsync_interval = fsync_interval
+        self.keep_rotated = keep_rotated
+        self.appended = 0
+        self.syncs = 0
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+        self._file = None
+
+        directory = os.path.dirname(log_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    # ---------- 追加 ----------
+
+    def append(self, riot_id: str, discord_id: str, changes: Dict[str, Any], ts: Optional[str] = None) -> bool:
+        """
+        追加一条状态变化
+
+        Args:
+            riot_id: 玩家 Riot ID
+            discord_id: 玩家 Discord ID
+            changes: 变化的状态字段（其他字段会被忽略）
+            ts: 事件时间，默认取 changes 中的 last_check 或当前时间
+
+        Returns:
+            是否写入
+        """
+        status = {name: value for name, value in changes.items() if name in STATUS_FIELDS}
+        if not status:
+            return False
+        record = {
+            "ts": ts or status.get("last_check") or datetime.now().isoformat(),
+            "riot_id": riot_id,
+            "discord_id": discord_id,
+            "events": transition_events(status),
+            "changes": status,
+        }
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+
+        try:
+            with self._lock:
+                if self._file is None:
+                    self._file = open(self.log_path, "a", encoding="utf-8")
+                self._file.write(line)
+                self._file.flush()
+                self.appended += 1
+                self._schedule_sync()
+            return True
+        except OSError as e:
+            print(f"ERROR: 写入状态事件日志失败: {e}")
+            return False
+
+    def _schedule_sync(self):
+        if self.fsync_interval <= 0:
+            self._sync_locked()
+        elif self._timer is None:
+            # 第一次追加时开始计时，计时期间的追加共用一次 fsync
+            self._timer = threading.Timer(self.fsync_interval, self.sync)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _sync_locked(self):
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self.syncs += 1
+
+    def sync(self):
+        """立即把已追加的事件 fsync 到磁盘"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            try:
+                self._sync_locked()
+            except OSError as e:
+                print(f"ERROR: fsync 状态事件日志失败: {e}")
+
+    def close(self):
+        self.sync()
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    # ---------- 读取 ----------
+
+    def read_events(self, offset: int = 0) -> Iterator[Tuple[Dict[str, Any], int]]:
+        """
+        从 offset 开始逐条读取事件
+
+        Yields:
+            (事件, 该行结束处的偏移)。进程崩溃留下的半行会被忽略
+        """
+        if not os.path.exists(self.log_path):
+            return
+        with open(self.log_path, "rb") as f:
+            f.seek(offset)
+            position = offset
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break  # 未写完的最后一行
+                position += len(raw)
+                try:
+                    yield json.loads(raw), position
+                except ValueError:
+                    print(f"WARNING: 跳过损坏的状态事件（偏移 {position - len(raw)}）")
+
+    def load_snapshot(self) -> Dict[str, Any]:
+        """读取快照，不存在或损坏时返回空快照"""
+        try:
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+            if isinstance(snapshot.get("players"), dict) and isinstance(snapshot.get("offset"), int):
+                return snapshot
+            print(f"WARNING: 状态快照格式错误，从头重放日志: {self.snapshot_path}")
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            print(f"WARNING: 无法读取状态快照，从头重放日志: {e}")
+        return {"offset": 0, "players": {}}
+
+    def _fold(self, snapshot: Dict[str, Any]) -> Tuple[Dict[str, Dict[str, Any]], int, int]:
+        """把快照之后的事件应用到快照上，返回 (状态, 偏移, 事件数)"""
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+        return self._apply_log(snapshot)
+
+    def _apply_log(self, snapshot: Dict[str, Any]) -> Tuple[Dict[str, Dict[str, Any]], int, int]:
+        players = snapshot["players"]
+        offset = snapshot["offset"]
+        size = os.path.getsize(self.log_path) if os.path.exists(self.log_path) else 0
+        if offset > size:
+            # 日志被删除或截断过，快照之后的新日志从头开始
+            offset = 0
+        count = 0
+        for event, offset in self.read_events(offset):
+            state = players.setdefault(event["riot_id"], {})
+            state.update(event.get("changes", {}))
+            state["ts"] = event["ts"]
+            count += 1
+        return players, offset, count
+
+    def replay(self) -> Dict[str, Dict[str, Any]]:
+        """
+        快照 + 之后的日志 = 每个玩家的最新状态
+
+        Returns:
+            {riot_id: {状态字段..., "ts": 最后事件时间}}
+        """
+        return self._fold(self.load_snapshot())[0]
+
+    # ---------- 压缩 ----------
+
+    def compact(self) -> int:
+        """
+        把日志折叠进快照（临时文件 + fsync + 原子替换），再把已折叠的日志轮转为历史分段
+
+        压缩期间持有追加锁，快照恰好覆盖整个当前日志，因此快照偏移记为0：
+        轮转前崩溃时从头重放的仍是快照已包含的事件（按字段后写覆盖，结果不变）
+
+        Returns:
+            本次折叠的事件数
+        """
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+            players, _, count = self._apply_log(self.load_snapshot())
+            if not count:
+                return 0
+
+            snapshot = {"offset": 0, "compacted_at": datetime.now().isoformat(), "players": players}
+            temp_path = self.snapshot_path + ".tmp"
+            try:
+                with open(temp_path, "w", encoding="utf-8") as f:
+                    json.dump(snapshot, f, ensure_ascii=False)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(temp_path, self.snapshot_path)
+            except OSError as e:
+                print(f"ERROR: 写入状态快照失败: {e}")
+                return 0
+            self._rotate_locked()
+        self._prune_rotated()
+        return count
+
+    def _rotate_locked(self):
+        """关闭当前日志并改名为历史分段，下次追加时创建新日志"""
+        try:
+            if self._file is not None:
+                self._sync_locked()
+                self._file.close()
+                self._file = None
+            if self.keep_rotated > 0:
+                base, ext = os.path.splitext(self.log_path)
+                os.replace(self.log_path, f"{base}.{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}{ext}")
+            else:
+                os.remove(self.log_path)
+        except OSError as e:
+            # 日志保留原样，下次压缩会再次从头折叠
+            print(f"ERROR: 轮转状态事件日志失败: {e}")
+
+    def rotated_paths(self) -> List[str]:
+        """历史分段路径，按时间从旧到新"""
+        directory = os.path.dirname(self.log_path) or "."
+        base, ext = os.path.splitext(os.path.basename(self.log_path))
+        pattern = re.compile(rf"{re.escape(base)}\.\d{{8}}-\d{{6}}-\d{{6}}{re.escape(ext)}")
+        return sorted(
+            os.path.join(directory, name) for name in os.listdir(directory) if pattern.fullmatch(name)
+        )
+
+    def _prune_rotated(self):
+        """只保留最近 keep_rotated 个历史分段"""
+        paths = self.rotated_paths()
+        for path in paths[:max(0, len(paths) - self.keep_rotated)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def get_stats(self) -> Dict[str, int]:
+        """本进程追加的事件数、fsync 次数、日志大小和未压缩的字节数"""
+        size = os.path.getsize(self.log_path) if os.path.exists(self.log_path) else 0
+        return {
+            "appended": self.appended,
+            "syncs": self.syncs,
+            "log_bytes": size,
+            "pending_bytes": max(0, size - self.load_snapshot()["offset"]),
+        }
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+本地模板点评引擎
+LLM 超时或出错时的兜底：根据提示词使用的同一组字段
+（player_result / team_mvp / team_lvp）在本地即时生成点评，
+同一场比赛的输出是确定的
+"""
+
+import asyncio
+import hashlib
+from typing import Any, Awaitable, Dict, Optional, Tuple
+
+from services.config import Config
+from services.deadline import get_timeout
+from services.prompt_renderer import template_fields
+from services.prompts import prompt_manager
+
+LLM_PATH = "llm"
+TEMPLATE_PATH = "template"  # LLM超时，对冲的本地模板胜出
+FALLBACK_PATH = "fallback"  # LLM出错（鉴权、限流、所有模型都失败），改用本地模板
+
+# 嘲讽风格
+ROAST_TEMPLATES = {
+    "win": [
+        "赢了赢了，这把全队都挺像样，{mvp_username}的{mvp_champion}是真带飞。{lvp_username}，你那个{lvp_champion}能赢纯属躺着蹭分，下把自己也动一动。",
+        "这把稳稳拿下，{mvp_username}玩{mvp_champion}打得漂亮。至于{lvp_username}的{lvp_champion}，赢是赢了，你自己心里清楚是谁在背你。",
+    ],
+    "lose": [
+        "输了，你们到底在干嘛？{mvp_username}的{mvp_champion}打得是不错，可也没救回来。{lvp_username}，你这把{lvp_champion}玩成这样，真的不打算解释一下？",
+        "这把输得明明白白。{mvp_username}拿{mvp_champion}尽力了，{lvp_username}的{lvp_champion}从头送到尾，下把能不能别让人带不动？",
+    ],
+}
+
+# 温柔风格（卡芙卡等）
+GENTLE_TEMPLATES = {
+    "win": [
+        "这场的节奏真好听。{mvp_username}的{mvp_champion}干净利落，让人安心。{lvp_username}，你的{lvp_champion}也有自己的味道，我记住你了。",
+        "赢下来了呢。{mvp_username}用{mvp_champion}打得很漂亮。可我更在意你，{lvp_username}，{lvp_champion}在你手里，有点意思。",
+    ],
+    "lose": [
+        "输了也没关系，亲爱的。{mvp_username}的{mvp_champion}已经很努力了。{lvp_username}，你的{lvp_champion}还在挣扎的样子，我很喜欢，下次别眨眼。",
+        "这一局的旋律乱了些。{mvp_username}的{mvp_champion}很冷静。{lvp_username}，别难过，你的{lvp_champion}，我会一直看着。",
+    ],
+}
+
+GENTLE_STYLES = ("kfk", "azi", "lol_loveu")
+
+
+def _is_win(result: str) -> bool:
+    return result in ("胜利", "Win", "win", "Victory")
+
+
+def _select(options, key: str) -> str:
+    """按比赛数据的哈希确定性地选择模板"""
+    digest = hashlib.sha1(key.encode("utf-8")).digest()
+    return options[digest[0] % len(options)]
+
+
+def generate_template_analysis(match_data: Dict[str, Any], style: str = "default") -> str:
+    """
+    使用本地模板生成点评
+
+    Args:
+        match_data: LOL分析结果或Valorant比赛信息
+        style: 风格名称，卡芙卡等温柔风格使用温柔模板，其他使用嘲讽模板
+
+    Returns:
+        点评文字
+    """
+    fields = template_fields(match_data)
+    gentle = any(name in style for name in GENTLE_STYLES)
+    templates = GENTLE_TEMPLATES if gentle else ROAST_TEMPLATES
+    options = templates["win" if _is_win(fields["player_result"]) else "lose"]
+
+    key = "|".join(fields[name] for name in sorted(fields))
+    return _select(options, key).format(**fields)
+
+
+async def hedge_with_template(llm_call: Awaitable, match_data: Dict[str, Any], style: str = "default",
+                              deadline=None, timeout: Optional[float] = None) -> Tuple[Tuple[Optional[str], Optional[str]], str]:
+    """
+    让LLM与超时赛跑，超时或出错时使用本地模板（两种情况返回不同的路径）
+
+    Args:
+        llm_call: convert_to_chinese_mature_tone(...) 协程
+        match_data: 比赛数据
+        style: 风格名称
+        deadline: 工作流程截止时间
+        timeout: 等待LLM的最长时间，None 使用 Config.LLM_HEDGE_SECONDS（<=0 表示不对冲）
+
+    Returns:
+        ((分析文字, voice_id), 胜出路径 "llm" / "template"（超时）/ "fallback"（出错）)
+    """
+    if timeout is None:
+        timeout = Config.LLM_HEDGE_SECONDS
+    if timeout <= 0:
+        return await llm_call, LLM_PATH
+
+    task = asyncio.ensure_future(llm_call)
+    path = FALLBACK_PATH
+    try:
+        result = await asyncio.wait_for(asyncio.shield(task), timeout=get_timeout(deadline, timeout))
+        if result and result[0]:
+            return result, LLM_PATH
+        print("⚠️ LLM生成失败，使用本地模板")
+    except asyncio.TimeoutError:
+        print(f"⏱️ LLM超过 {timeout:.0f} 秒未返回，使用本地模板")
+        path = TEMPLATE_PATH
+    except Exception as e:
+        print(f"⚠️ LLM调用异常，使用本地模板: {e}")
+    finally:
+        if not task.done():
+            task.cancel()
+
+    try:
+        voice_id = prompt_manager.get_style_config(style).get("voice_id")
+        text = generate_template_analysis(match_data, style)
+    except Exception as e:
+        print(f"[ERROR] 本地模板生成失败: {e}")
+        return (None, None), path
+    return (text, voice_id), path
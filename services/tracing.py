@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+工作流程延迟追踪模块
+为每个工作流程步骤和上游调用（Riot / OpenAI / VoicV / 语音连接）记录耗时，
+保存在进程内的滚动直方图中，并可导出为 JSON Lines
+"""
+
+import json
+import math
+import os
+import time
+import functools
+import asyncio
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from services.config import Config
+
+
+class Span:
+    """一次被追踪的调用"""
+
+    def __init__(self, name: str, attrs: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.attrs = dict(attrs or {})
+        self.start = time.perf_counter()
+        self.duration_ms = 0.0
+        self.error = None
+
+    def set(self, **attrs):
+        """补充属性，例如响应大小"""
+        self.attrs.update(attrs)
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {"name": self.name, "duration_ms": round(self.duration_ms, 2)}
+        if self.attrs:
+            data["attrs"] = self.attrs
+        if self.error:
+            data["error"] = self.error
+        return data
+
+
+class Run:
+    """一次完整的工作流程运行，包含其中所有的span"""
+
+    def __init__(self, name: str, attrs: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.attrs = dict(attrs or {})
+        self.started_at = datetime.now().isoformat()
+        self.start = time.perf_counter()
+        self.duration_ms = 0.0
+        self.spans: List[Span] = []
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "run": self.name,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration_ms, 2),
+            "attrs": self.attrs,
+            "spans": [span.to_dict() for span in self.spans],
+        }
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """最近秩法计算百分位数"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, math.ceil(pct / 100.0 * len(ordered)) - 1)
+    return ordered[min(index, len(ordered) - 1)]
+
+
+class Tracer:
+    """进程内追踪器 - 每个span名称保留最近 history_size 个耗时样本"""
+
+    def __init__(self, history_size: int = 200, export_path: Optional[str] = None):
+        self.history_size = history_size
+        self.export_path = export_path
+        self._histograms: Dict[str, deque] = {}
+        self._runs: deque = deque(maxlen=history_size)
+        self._current_run: ContextVar[Optional[Run]] = ContextVar("current_run", default=None)
+
+    def _record(self, name: str, duration_ms: float):
+        if name not in self._histograms:
+            self._histograms[name] = deque(maxlen=self.history_size)
+        self._histograms[name].append(duration_ms)
+
+    @contextmanager
+    def span(self, name: str, **attrs):
+        """
+        追踪一段代码的耗时
+
+        用法:
+            with tracer.span("riot.match_details", match_id=match_id) as span:
+                response = requests.get(...)
+                span.set(response_bytes=len(response.content))
+        """
+        span = Span(name, attrs)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = type(e).__name__
+            raise
+        finally:
+            span.duration_ms = (time.perf_counter() - span.start) * 1000
+            self._record(name, span.duration_ms)
+            run = self._current_run.get()
+            if run is not None:
+                run.spans.append(span)
+
+    @contextmanager
+    def run(self, name: str, **attrs):
+        """追踪一次完整的工作流程运行"""
+        run = Run(name, attrs)
+        token = self._current_run.set(run)
+        try:
+            yield run
+        finally:
+            self._current_run.reset(token)
+            run.duration_ms = (time.perf_counter() - run.start) * 1000
+            self._record(name, run.duration_ms)
+            self._runs.append(run)
+            if self.export_path:
+                self._append_jsonl(self.export_path, [run])
+
+    def annotate(self, **attrs):
+        """为当前运行补充属性（比赛ID、风格等）"""
+        run = self._current_run.get()
+        if run is not None:
+            run.attrs.update({k: v for k, v in attrs.items() if v is not None})
+
+    def traced(self, name: str, run: bool = False):
+        """
+        装饰器 - 追踪函数调用耗时，支持同步和异步函数
+
+        Args:
+            name: span名称
+            run: 为True时作为一次完整运行记录
+        """
+        context = self.run if run else self.span
+
+        def decorator(func):
+            if asyncio.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    with context(name) as span:
+                        result = await func(*args, **kwargs)
+                        if result is False and isinstance(span, Span):
+                            span.error = "failed"
+                        return result
+                return async_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with context(name):
+                    return func(*args, **kwargs)
+            return wrapper
+
+        return decorator
+
+    def get_stats(self, last_n: Optional[int] = None) -> Dict[str, Dict[str, float]]:
+        """
+        获取每个span名称的耗时统计
+
+        Args:
+            last_n: 只统计最近N次运行中的span（一次运行可能包含同名span的多个样本），
+                None表示全部保留的样本
+
+        Returns:
+            {span名称: {"count", "p50", "p95", "p99"}}，单位毫秒
+        """
+        if last_n is not None and last_n > 0:
+            # 按运行取样本，各步骤覆盖相同的时间窗口
+            samples_by_name: Dict[str, List[float]] = {}
+            for run in list(self._runs)[-last_n:]:
+                samples_by_name.setdefault(run.name, []).append(run.duration_ms)
+                for span in run.spans:
+                    samples_by_name.setdefault(span.name, []).append(span.duration_ms)
+        else:
+            samples_by_name = {name: list(samples) for name, samples in self._histograms.items()}
+
+        stats = {}
+        for name, values in samples_by_name.items():
+            if not values:
+                continue
+            stats[name] = {
+                "count": len(values),
+                "p50": percentile(values, 50),
+                "p95": percentile(values, 95),
+                "p99": percentile(values, 99),
+            }
+        return stats
+
+    def get_recent_runs(self, last_n: Optional[int] = None) -> List[Dict[str, Any]]:
+        """获取最近的运行记录"""
+        runs = list(self._runs)
+        if last_n:
+            runs = runs[-last_n:]
+        return [run.to_dict() for run in runs]
+
+    def export_jsonl(self, file_path: str, last_n: Optional[int] = None) -> int:
+        """
+        将最近的运行记录导出为 JSON Lines
+
+        Returns:
+            导出的运行数量
+        """
+        runs = list(self._runs)
+        if last_n:
+            runs = runs[-last_n:]
+        self._append_jsonl(file_path, runs)
+        return len(runs)
+
+    def _append_jsonl(self, file_path: str, runs: List[Run]):
+        try:
+            directory = os.path.dirname(file_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(file_path, "a", encoding="utf-8") as f:
+                for run in runs:
+                    f.write(json.dumps(run.to_dict(), ensure_ascii=False) + "\n")
+        except Exception as e:
+            print(f"[ERROR] 导出追踪数据失败: {e}")
+
+
+# 全局追踪器实例
+tracer = Tracer(history_size=Config.TRACE_HISTORY_SIZE, export_path=Config.TRACE_EXPORT_PATH)
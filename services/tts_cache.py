@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+TTS 音频内容寻址缓存
+按 hash(voice_id, 规范化文本, 格式) 保存合成结果，
+重播、相同的模板兜底文字、多个服务器播放同一分析时直接复用，
+按总字节数做 LRU 淘汰，写入使用临时文件 + 原子替换
+"""
+
+import hashlib
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from services.config import Config
+
+
+def normalize_text(text: str) -> str:
+    """规范化文本：Unicode NFC、去掉首尾空白、合并连续空白"""
+    text = unicodedata.normalize("NFC", text or "")
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def make_tts_key(voice_id: str, text: str, audio_format: str = "mp3") -> str:
+    """缓存键 = sha256(voice_id, 规范化文本, 格式)"""
+    digest = hashlib.sha256()
+    for part in (voice_id or "", normalize_text(text), audio_format):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class TTSCache:
+    """线程安全的 TTS 磁盘缓存（TTS 在工作线程中调用）"""
+
+    def __init__(self, cache_dir: str = "audio/tts_cache", max_bytes: int = 200 * 1024 * 1024,
+                 audio_format: str = "mp3"):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.audio_format = audio_format
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, int]" = OrderedDict()  # key -> 字节数（含 .opus），按最近使用排序
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.{self.audio_format}")
+
+    def _sibling_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.opus")
+
+    def _load(self):
+        """首次使用时扫描缓存目录，按修改时间恢复 LRU 顺序"""
+        if self._loaded:
+            return
+        self._loaded = True
+        if not os.path.isdir(self.cache_dir):
+            return
+
+        suffix = f".{self.audio_format}"
+        files = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(suffix):
+                path = os.path.join(self.cache_dir, name)
+                key = name[:-len(suffix)]
+                stat = os.stat(path)
+                size = stat.st_size
+                sibling = self._sibling_path(key)
+                if os.path.exists(sibling):
+                    size += os.path.getsize(sibling)
+                files.append((stat.st_mtime, key, size))
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+            self._total_bytes += size
+
+    def get(self, key: str) -> Optional[str]:
+        """返回缓存的音频路径，未命中返回None"""
+        with self._lock:
+            self._load()
+            path = self._path(key)
+            if key not in self._entries or not os.path.exists(path):
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            # 更新修改时间，重启后仍保持 LRU 顺序
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+            return path
+
+    def peek(self, key: str) -> Optional[str]:
+        """查询缓存但不更新 LRU 顺序和命中统计"""
+        with self._lock:
+            self._load()
+            path = self._path(key)
+            if key in self._entries and os.path.exists(path):
+                return path
+            return None
+
+    def temp_path(self, key: str) -> str:
+        """流式下载使用的临时文件路径，写完后调用 commit"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        return f"{self._path(key)}.{threading.get_ident()}.tmp"
+
+    def commit(self, key: str, temp_path: str) -> str:
+        """
+        将写完的临时文件原子替换为缓存文件
+
+        Returns:
+            缓存文件路径
+        """
+        with self._lock:
+            self._load()
+            path = self._path(key)
+            size = os.path.getsize(temp_path)
+            os.replace(temp_path, path)
+
+            if key in self._entries:
+                self._total_bytes -= self._entries[key]
+                # 旧的转码结果已过期，删除后由下次播放重新生成
+                try:
+                    os.remove(self._sibling_path(key))
+                except OSError:
+                    pass
+            self._entries[key] = size
+            self._entries.move_to_end(key)
+            self._total_bytes += size
+            self._evict()
+            return path
+
+    def put(self, key: str, data: bytes) -> str:
+        """
+        原子写入音频数据
+
+        Returns:
+            缓存文件路径
+        """
+        temp_path = self.temp_path(key)
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        return self.commit(key, temp_path)
+
+    def track_sibling(self, audio_file: str, sibling_file: str) -> bool:
+        """
+        将缓存音频旁生成的转码文件（.opus）计入字节预算
+
+        Args:
+            audio_file: 原始音频路径
+            sibling_file: 转码生成的文件路径
+
+        Returns:
+            是否属于缓存条目并已计入
+        """
+        with self._lock:
+            self._load()
+            if os.path.dirname(os.path.abspath(audio_file)) != os.path.abspath(self.cache_dir):
+                return False
+            key = os.path.splitext(os.path.basename(audio_file))[0]
+            if key not in self._entries or not os.path.exists(sibling_file):
+                return False
+            self._entries[key] += os.path.getsize(sibling_file)
+            self._total_bytes += os.path.getsize(sibling_file)
+            self._evict()
+            return True
+
+    def _evict(self):
+        """超过字节预算时删除最久未使用的音频（以及转码生成的 .opus）"""
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            path = self._path(key)
+            for victim in (path, self._sibling_path(key)):
+                try:
+                    os.remove(victim)
+                except OSError:
+                    pass
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            self._load()
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+# 全局TTS缓存
+tts_cache = TTSCache(cache_dir=Config.TTS_CACHE_DIR, max_bytes=Config.TTS_CACHE_MAX_BYTES)
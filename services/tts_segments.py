@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+分句TTS辅助函数
+- 按句子边界切分分析文字，过长的句子再按逗号切分，过短的句子并入前一句
+- 去掉每段MP3的ID3标签和Xing/Info头帧，按原顺序拼接成一条无缝的MP3流
+"""
+
+import re
+from typing import List, Optional
+
+# 句末标点（保留在句子末尾）
+_SENTENCE_PATTERN = re.compile(r"[^。！？!?；;\n]+[。！？!?；;]*")
+# 句内停顿，过长的句子在这里切开
+_CLAUSE_PATTERN = re.compile(r"[^，,、]+[，,、]*")
+
+# Layer III 比特率表（kbps），按 MPEG 版本区分
+_BITRATES_V1 = [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320]
+_BITRATES_V2 = [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160]
+# 采样率表，键为版本位：3=MPEG1, 2=MPEG2, 0=MPEG2.5
+_SAMPLE_RATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+
+
+def _split_long(sentence: str, max_chars: int) -> List[str]:
+    """按逗号把过长的句子切成不超过 max_chars 的片段"""
+    parts: List[str] = []
+    current = ""
+    for clause in _CLAUSE_PATTERN.findall(sentence):
+        if current and len(current) + len(clause) > max_chars:
+            parts.append(current)
+            current = ""
+        current += clause
+    if current:
+        parts.append(current)
+    return parts
+
+
+def split_sentences(text: str, max_chars: int = 80, min_chars: int = 6) -> List[str]:
+    """
+    按句子边界切分文字
+
+    Args:
+        text: 分析文字
+        max_chars: 单段最大字数，超过时按逗号继续切分
+        min_chars: 短于该字数的句子并入前一段，减少请求数
+
+    Returns:
+        按原顺序排列的文字片段
+    """
+    segments: List[str] = []
+    for sentence in _SENTENCE_PATTERN.findall(text or ""):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        if segments and len(sentence) < min_chars:
+            segments[-1] += sentence
+            continue
+        if len(sentence) > max_chars:
+            segments.extend(_split_long(sentence, max_chars))
+        else:
+            segments.append(sentence)
+    return segments
+
+
+def strip_id3(data: bytes) -> bytes:
+    """去掉开头的ID3v2标签和末尾的ID3v1标签"""
+    if data[:3] == b"ID3" and len(data) >= 10:
+        # 标签大小为4个7位的syncsafe整数，不含10字节头部
+        size = 0
+        for byte in data[6:10]:
+            size = (size << 7) | (byte & 0x7F)
+        footer = 10 if data[5] & 0x10 else 0
+        data = data[10 + size + footer:]
+    if len(data) >= 128 and data[-128:-125] == b"TAG":
+        data = data[:-128]
+    return data
+
+
+def mp3_frame_length(header: bytes) -> Optional[int]:
+    """
+    根据MP3帧头计算帧长度（字节）
+
+    Returns:
+        帧长度，不是有效的 Layer III 帧头时返回None
+    """
+    if len(header) < 4 or header[0] != 0xFF or (header[1] & 0xE0) != 0xE0:
+        return None
+    version = (header[1] >> 3) & 0x03
+    layer = (header[1] >> 1) & 0x03
+    bitrate_index = header[2] >> 4
+    rate_index = (header[2] >> 2) & 0x03
+    padding = (header[2] >> 1) & 0x01
+    if version == 1 or layer != 1 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+
+    bitrates = _BITRATES_V1 if version == 3 else _BITRATES_V2
+    bitrate = bitrates[bitrate_index] * 1000
+    sample_rate = _SAMPLE_RATES[version][rate_index]
+    coefficient = 144 if version == 3 else 72
+    return coefficient * bitrate // sample_rate + padding
+
+
+def strip_mp3_metadata(data: bytes) -> bytes:
+    """
+    去掉ID3标签和Xing/Info/VBRI头帧，只保留音频帧
+
+    头帧记录的是单段的帧数和编码延迟，拼接后不再准确，
+    留在中间还会被当作一帧静音播放出来
+    """
+    data = strip_id3(data)
+    length = mp3_frame_length(data[:4])
+    if length and any(tag in data[:length] for tag in (b"Xing", b"Info", b"VBRI")):
+        data = data[length:]
+    return data
+
+
+def concat_mp3(parts: List[bytes]) -> bytes:
+    """按顺序拼接多段MP3"""
+    return b"".join(strip_mp3_metadata(part) for part in parts)
@@ -3,35 +3,30 @@
 公共工具函数
 """
 
+import asyncio
 import os
 import json
-import glob
+import tempfile
 from datetime import datetime
 from typing import Optional, Dict, Any, List
 
+from services.artifact_store import artifact_store
+from services.config import Config
 
-def find_latest_json_file(analysis_dir: str = "analysis") -> Optional[str]:
+
+def find_latest_json_file(analysis_dir: str = None, player: str = None, kind: str = "lol_match") -> Optional[str]:
     """
-    找到最新的match_analysis_*.json文件
+    找到最新的比赛数据文件（查询产物清单，不扫描目录）
     
     Args:
-        analysis_dir: 分析文件目录
+        analysis_dir: 已废弃，产物统一保存在 Config.ARTIFACT_ROOT
+        player: Riot ID，指定时只查找该玩家的文件
+        kind: 产物类型，默认LOL比赛数据
         
     Returns:
         最新文件的完整路径，如果没找到返回None
     """
-    if not os.path.exists(analysis_dir):
-        return None
-    
-    json_files = [f for f in os.listdir(analysis_dir) 
-                  if f.startswith('match_analysis_') and f.endswith('.json')]
-    
-    if not json_files:
-        return None
-    
-    # 获取最新的文件
-    latest_file = max(json_files, key=lambda x: os.path.getctime(os.path.join(analysis_dir, x)))
-    return os.path.join(analysis_dir, latest_file)
+    return artifact_store.latest(kind, player)
 
 
 def load_json_file(file_path: str) -> Optional[Dict[Any, Any]]:
@@ -52,27 +47,52 @@ def load_json_file(file_path: str) -> Optional[Dict[Any, Any]]:
         return None
 
 
-def save_json_file(data: Dict[Any, Any], file_path: str) -> bool:
+def save_json_file(data: Dict[Any, Any], file_path: str, pretty: bool = None, fsync: bool = None) -> bool:
     """
-    保存JSON文件
+    原子保存JSON文件：先写同目录的临时文件，再 os.replace 替换
+    写到一半崩溃只会留下临时文件，目标文件要么是旧内容要么是完整的新内容
     
     Args:
         data: 要保存的数据
         file_path: 保存路径
+        pretty: 是否缩进排版，None 时使用 Config.JSON_PRETTY（默认紧凑）
+        fsync: 替换前是否fsync，None 时使用 Config.JSON_FSYNC
         
     Returns:
         保存成功返回True，失败返回False
     """
+    pretty = Config.JSON_PRETTY if pretty is None else pretty
+    fsync = Config.JSON_FSYNC if fsync is None else fsync
+    directory = os.path.dirname(os.path.abspath(file_path))
+    temp_path = None
     try:
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        # 先序列化，数据不能序列化时不会创建任何文件
+        if pretty:
+            payload = json.dumps(data, ensure_ascii=False, indent=2)
+        else:
+            payload = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+        
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(prefix=f".{os.path.basename(file_path)}.", suffix=".tmp", dir=directory)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(payload)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(temp_path, file_path)
         return True
     except Exception as e:
         print(f"[ERROR] 保存JSON文件失败: {e}")
+        if temp_path and os.path.exists(temp_path):
+            os.remove(temp_path)
         return False
 
 
+async def save_json_file_async(data: Dict[Any, Any], file_path: str, pretty: bool = None, fsync: bool = None) -> bool:
+    """在线程中执行 save_json_file，序列化和磁盘I/O不阻塞事件循环"""
+    return await asyncio.to_thread(save_json_file, data, file_path, pretty, fsync)
+
+
 def generate_timestamp() -> str:
     """
     生成时间戳字符串
@@ -126,87 +146,41 @@ def get_analysis_filename(timestamp: str = None) -> str:
         timestamp: 时间戳，如果为None则自动生成
         
     Returns:
-        分析文件路径
+        分析文件路径（产物根目录下）
     """
     if not timestamp:
         timestamp = generate_timestamp()
     
-    ensure_directory("analysis")
-    return f"analysis/match_analysis_{timestamp}.json"
+    ensure_directory(artifact_store.root)
+    return os.path.join(artifact_store.root, f"match_analysis_{timestamp}.json")
 
 
 def cleanup_old_files(keep_count: int = 5) -> Dict[str, int]:
     """
-    清理旧文件，只保留最近的指定数量
+    清理旧文件，每种分析产物只保留最近的指定数量，并遵守字节预算
+    语音文件由TTS缓存按LRU管理，这里不再处理
     
     Args:
         keep_count: 保留的文件数量，默认5个
         
     Returns:
-        清理统计信息 {'analysis': 删除数量, 'audio': 删除数量}
+        清理统计信息 {'analysis': 删除数量}
     """
-    cleanup_stats = {'analysis': 0, 'audio': 0}
-    
-    # 清理analysis目录
-    analysis_files = glob.glob("analysis/match_analysis_*.json")
-    if len(analysis_files) > keep_count:
-        # 按修改时间排序，保留最新的
-        analysis_files.sort(key=os.path.getmtime, reverse=True)
-        files_to_delete = analysis_files[keep_count:]
-        
-        for file_path in files_to_delete:
-            try:
-                os.remove(file_path)
-                cleanup_stats['analysis'] += 1
-                print(f"🗑️ 删除旧分析文件: {file_path}")
-            except Exception as e:
-                print(f"❌ 删除文件失败 {file_path}: {e}")
-    
-    # 清理audio目录
-    audio_files = glob.glob("audio/match_analysis_*.mp3")
-    if len(audio_files) > keep_count:
-        # 按修改时间排序，保留最新的
-        audio_files.sort(key=os.path.getmtime, reverse=True)
-        files_to_delete = audio_files[keep_count:]
-        
-        for file_path in files_to_delete:
-            try:
-                os.remove(file_path)
-                cleanup_stats['audio'] += 1
-                print(f"🗑️ 删除旧音频文件: {file_path}")
-            except Exception as e:
-                print(f"❌ 删除文件失败 {file_path}: {e}")
-    
-    # 清理中文分析文件
-    chinese_files = glob.glob("analysis/chinese_analysis_*.txt")
-    if len(chinese_files) > keep_count:
-        chinese_files.sort(key=os.path.getmtime, reverse=True)
-        files_to_delete = chinese_files[keep_count:]
-        
-        for file_path in files_to_delete:
-            try:
-                os.remove(file_path)
-                cleanup_stats['analysis'] += 1
-                print(f"🗑️ 删除旧中文分析文件: {file_path}")
-            except Exception as e:
-                print(f"❌ 删除文件失败 {file_path}: {e}")
-    
-    return cleanup_stats
+    removed = artifact_store.evict(keep_per_kind=keep_count)
+    if any(removed.values()):
+        print(f"🗑️ 删除旧分析产物: {removed}")
+    return {'analysis': sum(removed.values())}
 
 
 def get_file_count_info() -> Dict[str, int]:
     """
-    获取各目录文件数量信息
+    获取各类分析产物的数量（来自产物清单）
     
     Returns:
-        文件数量统计 {'analysis': 数量, 'audio': 数量, 'chinese_analysis': 数量}
+        文件数量统计 {'analysis': 比赛数据数量, 'chinese_analysis': 中文分析数量}
     """
-    analysis_count = len(glob.glob("analysis/match_analysis_*.json"))
-    audio_count = len(glob.glob("audio/match_analysis_*.mp3"))
-    chinese_count = len(glob.glob("analysis/chinese_analysis_*.txt"))
-    
+    stats = artifact_store.get_stats()
     return {
-        'analysis': analysis_count,
-        'audio': audio_count,
-        'chinese_analysis': chinese_count
+        'analysis': stats['lol_match'] + stats['va_match'],
+        'chinese_analysis': stats['lol_text'] + stats['va_text']
     }
@@ -7,18 +7,24 @@ Valorant 比赛数据分析器
 import json
 import os
 import sys
-from openai import OpenAI
+import asyncio
 from dotenv import load_dotenv
 
 # 添加项目根目录到路径
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from services.prompts import prompt_manager
+from services.artifact_store import artifact_store
+from services.config import Config
+from services.llm_client import llm_client
+from services.model_router import model_router
+from services.prompt_renderer import render_prompt
 
 # Load environment variables
 load_dotenv()
 
-# Initialize OpenAI client
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# 分析使用的默认模型列表（按优先级，风格可在配置中覆盖），实际使用的模型列表是分析结果缓存键的一部分
+MODELS = Config.VA_LLM_MODELS
+MODEL = MODELS[0]
 
 def load_json_file(filename):
     """Load and parse JSON file"""
@@ -32,7 +38,7 @@ def load_json_file(filename):
         print(f"❌ JSON解析错误: {filename}")
         return None
 
-def convert_to_chinese_mature_tone(match_data, prompt=None, system_role=None, style="default"):
+async def convert_to_chinese_mature_tone(match_data, prompt=None, system_role=None, style="default", deadline=None):
     """Convert Valorant match data to Chinese paragraph with specified style
     
     Args:
@@ -40,6 +46,7 @@ def convert_to_chinese_mature_tone(match_data, prompt=None, system_role=None, st
         prompt (str, optional): Custom prompt for the AI. If None, uses style-based prompt
         system_role (str, optional): Custom system role for the AI. If None, uses style-based system role
         style (str, optional): Style name (default, professional, humorous). Defaults to "default"
+        deadline (Deadline, optional): Workflow deadline; the request timeout never exceeds the remaining time
     
     Returns:
         tuple: (Generated Chinese analysis text, voice_id) or (None, None) if failed
@@ -53,36 +60,40 @@ def convert_to_chinese_mature_tone(match_data, prompt=None, system_role=None, st
         if system_role is None:
             system_role = style_config["system_role"]
         
-        # Get voice_id from style config
+        # Get voice_id and target speech duration from style config
         voice_id = style_config.get("voice_id")
+        target_seconds = style_config.get("target_seconds")
+        models = style_config.get("models") or MODELS
     else:
         voice_id = None
+        target_seconds = None
+        models = MODELS
     
-    
-    # For Valorant, use custom prompt formatting
-    if prompt is None:
-        # Use the custom Valorant prompt
-        formatted_prompt = create_valorant_prompt(match_data)
-    else:
-        # Use the provided custom prompt with Valorant formatting
-        formatted_prompt = format_valorant_prompt(prompt, match_data)
+    # 固定的系统角色作为前缀，模板（或 create_valorant_prompt 生成的提示词）填入比赛字段
+    rendered = render_prompt(system_role, prompt, match_data, target_seconds, MODEL)
+    if rendered is None:
+        return None, None
+    print(f"📏 提示词约 {rendered.prompt_tokens} tokens，输出上限 {rendered.max_tokens} tokens")
 
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": system_role},
-                {"role": "user", "content": formatted_prompt}
-            ],
-            max_tokens=500,
-            temperature=0.7
-        )
-        
-        return response.choices[0].message.content.strip(), voice_id
-    
-    except Exception as e:
-        print(f"❌ OpenAI API错误: {e}")
+    # 共享异步客户端：不阻塞事件循环，并发受全局信号量限制
+    # 模型路由：出错/超时切换备用模型，主模型过慢时对冲下一个模型
+    analysis, model = await model_router.complete(
+        models,
+        lambda model: llm_client.chat(
+            rendered.system,
+            rendered.user,
+            model=model,
+            max_tokens=rendered.max_tokens,
+            temperature=0.7,
+            deadline=deadline,
+            style=style,
+            prompt_tokens_est=rendered.prompt_tokens,
+        ),
+    )
+    if not analysis:
         return None, None
+    print(f"🤖 分析模型: {model}")
+    return analysis, voice_id
 
 def create_valorant_prompt(match_data):
     """Create a specialized prompt for Valorant match analysis"""
@@ -103,39 +114,6 @@ def create_valorant_system_role():
     """Create a specialized system role for Valorant analysis"""
     return """你是一位成熟的御姐型游戏分析师，专门分析Valorant比赛。你的语言风格优雅、专业，带有一定的威严感。你会用成熟女性的视角来分析游戏数据，给出专业的评价和建议。"""
 
-def format_valorant_prompt(prompt_template, match_data):
-    """
-    格式化Valorant提示词模板
-    
-    Args:
-        prompt_template (str): 提示词模板
-        match_data (dict): Valorant比赛数据
-    
-    Returns:
-        str: 格式化后的提示词
-    """
-    # 提取Valorant数据字段
-    # 注意：strongest_player 实际上是MVP，weakest_player 实际上是LVP
-    mvp_username = match_data.get('strongest_player', {}).get('name', 'Unknown')
-    lvp_username = match_data.get('weakest_player', {}).get('name', 'Unknown')
-    player_result = match_data.get('result', 'Unknown')
-    mvp_champion = match_data.get('strongest_player', {}).get('character', 'Unknown')
-    lvp_champion = match_data.get('weakest_player', {}).get('character', 'Unknown')
-    
-    # 调试输出：显示映射到提示词的数据
-    print(f"  MVP (最强玩家): {mvp_username} - 角色: {mvp_champion}")
-    print(f"  LVP (最弱玩家): {lvp_username} - 角色: {lvp_champion}")
-    print(f"  比赛结果: {player_result}")
-    
-    return prompt_template.format(
-        match_data=match_data,
-        mvp_username=mvp_username,
-        lvp_username=lvp_username,
-        player_result=player_result,
-        mvp_champion=mvp_champion,
-        lvp_champion=lvp_champion
-    )
-
 def main(json_filename=None):
     """Main function - 支持自动文件名"""
     print("🔫 Valorant比赛数据分析器 - 御姐版")
@@ -145,50 +123,27 @@ def main(json_filename=None):
     if not json_filename:
         json_filename = input("请输入JSON文件名 (或按回车使用默认文件): ").strip()
         if not json_filename:
-            # 查找最新的valorant分析文件
-            root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-            analysis_dir = os.path.join(root_dir, "analysis")
-            if os.path.exists(analysis_dir):
-                valorant_files = [f for f in os.listdir(analysis_dir) if f.startswith('valorant_last_match_') and f.endswith('.json')]
-                if valorant_files:
-                    latest_file = max(valorant_files, key=lambda x: os.path.getctime(os.path.join(analysis_dir, x)))
-                    json_filename = os.path.join(analysis_dir, latest_file)
-                    print(f"🔄 自动选择最新Valorant文件: {json_filename}")
-                else:
-                    print("❌ 未找到Valorant分析文件")
-                    return None
-            else:
-                print("❌ analysis目录不存在")
+            # 从产物清单取最新的Valorant比赛数据
+            json_filename = artifact_store.latest("va_match")
+            if not json_filename:
+                print("❌ 未找到Valorant分析文件")
                 return None
+            print(f"🔄 自动选择最新Valorant文件: {json_filename}")
     
-    # 检查文件是否在analysis文件夹中
-    root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    analysis_dir = os.path.join(root_dir, "analysis")
+    # 检查文件是否在产物根目录中
+    analysis_dir = artifact_store.root
     if not json_filename.startswith(analysis_dir + os.sep):
-        # 如果文件路径不包含analysis目录，尝试在analysis目录中查找
+        # 如果文件路径不包含产物根目录，尝试在根目录中查找
         if os.path.exists(os.path.join(analysis_dir, json_filename)):
             json_filename = os.path.join(analysis_dir, json_filename)
         elif not os.path.exists(json_filename):
-            # 如果根目录也没有，尝试在analysis目录中查找
-            if os.path.exists(analysis_dir):
-                valorant_files = [f for f in os.listdir(analysis_dir) if f.startswith('valorant_') and f.endswith('.json')]
-                if valorant_files:
-                    print(f"📁 在analysis目录中找到 {len(valorant_files)} 个Valorant文件:")
-                    for i, file in enumerate(valorant_files[:5], 1):
-                        print(f"   {i}. {file}")
-                    if len(valorant_files) > 5:
-                        print(f"   ... 还有 {len(valorant_files) - 5} 个文件")
-                    
-                    # 使用最新的文件
-                    latest_file = max(valorant_files, key=lambda x: os.path.getctime(os.path.join(analysis_dir, x)))
-                    json_filename = os.path.join(analysis_dir, latest_file)
-                    print(f"🔄 自动选择最新文件: {json_filename}")
-                else:
-                    print(f"❌ analysis目录中没有Valorant文件")
-                    return None
-            else:
-                print(f"❌ analysis目录不存在")
+            # 都没有时使用清单中最新的Valorant比赛数据
+            latest_file = artifact_store.latest("va_match")
+            if not latest_file:
+                print(f"❌ {analysis_dir} 中没有Valorant文件")
                 return None
+            json_filename = latest_file
+            print(f"🔄 自动选择最新文件: {json_filename}")
     
     # Check if OpenAI API key is set
     if not os.getenv("OPENAI_API_KEY"):
@@ -211,7 +166,7 @@ def main(json_filename=None):
     custom_system_role = create_valorant_system_role()
     
     # Convert to Chinese mature tone
-    result = convert_to_chinese_mature_tone(match_data, prompt=custom_prompt, system_role=custom_system_role)
+    result = asyncio.run(convert_to_chinese_mature_tone(match_data, prompt=custom_prompt, system_role=custom_system_role))
     if result and result[0]:
         chinese_analysis = result[0]
     else:
@@ -224,18 +179,11 @@ def main(json_filename=None):
         print(chinese_analysis)
         print("=" * 50)
         
-        # Save to file in analysis directory
-        root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        analysis_dir = os.path.join(root_dir, "analysis")
-        os.makedirs(analysis_dir, exist_ok=True)
-        
-        # 获取文件名（不包含路径）
-        base_filename = os.path.basename(json_filename)
-        output_filename = f"valorant_chinese_analysis_{base_filename.replace('.json', '')}.txt"
-        output_path = os.path.join(analysis_dir, output_filename)
-        
+        # Save to the artifact root and register it in the manifest
+        output_path = artifact_store.new_path("va_text")
         with open(output_path, 'w', encoding='utf-8') as f:
             f.write(chinese_analysis)
+        artifact_store.add(output_path, "va_text", match_id=match_data.get("match_id"))
         print(f"💾 分析结果已保存到: {output_path}")
         return chinese_analysis
     else:
@@ -7,14 +7,16 @@ Valorant API 数据获取模块
 import os
 import json
 import requests
-from datetime import datetime
 from dotenv import load_dotenv
 from urllib.parse import quote
 import sys
 
 # 添加项目根目录到路径
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from services.utils import ensure_directory, save_json_file
+from services.utils import save_json_file
+from services.artifact_store import artifact_store
+from services.tracing import tracer
+from services.deadline import get_timeout
 
 # 加载环境变量
 load_dotenv()
@@ -43,7 +45,7 @@ def get_region_code(region_name):
     return region_mapping.get(region_name.lower(), "na")
 
 
-def get_last_match_henrik_api(game_name, tag_line, region="na"):
+def get_last_match_henrik_api(game_name, tag_line, region="na", deadline=None):
     """使用Henrik API获取最后一场比赛信息"""
     try:
         
@@ -54,7 +56,9 @@ def get_last_match_henrik_api(game_name, tag_line, region="na"):
         # 构建API URL
         url = f"{HENRIK_API_BASE}/matches/{region}/{encoded_game_name}/{encoded_tag_line}"
         
-        response = requests.get(url, headers=HEADERS, timeout=10)
+        with tracer.span("henrik.matches", region=region) as span:
+            response = requests.get(url, headers=HEADERS, timeout=get_timeout(deadline, 10))
+            span.set(status=response.status_code, response_bytes=len(response.content))
         
         if response.status_code == 401:
             print("[ERROR] Henrik API需要认证，请检查VAL_API_KEY")
@@ -136,6 +140,8 @@ def get_last_match_henrik_api(game_name, tag_line, region="na"):
         
         # 构建简化的比赛信息
         match_info = {
+            "match_id": meta.get("matchid"),
+            "puuid": player_info.get("puuid"),
             "map": meta.get("map", "Unknown"),
             "result": match_result,
             "strongest_player": {
@@ -158,8 +164,14 @@ def get_last_match_henrik_api(game_name, tag_line, region="na"):
         return None
 
 
-def get_last_valorant_match(game_name=None, tag_line=None):
-    """获取最后一场Valorant比赛信息"""
+def get_last_valorant_match(game_name=None, tag_line=None, deadline=None):
+    """获取最后一场Valorant比赛信息
+    
+    Args:
+        game_name (str, optional): 游戏用户名
+        tag_line (str, optional): 用户标签
+        deadline (Deadline, optional): 工作流程截止时间
+    """
     print("Valorant 最后比赛信息获取器")
     print("=" * 50)
     
@@ -174,7 +186,7 @@ def get_last_valorant_match(game_name=None, tag_line=None):
     try:
         # 使用Henrik API获取数据
         region_code = get_region_code(REGION)
-        match_info = get_last_match_henrik_api(target_game_name, target_tag_line, region_code)
+        match_info = get_last_match_henrik_api(target_game_name, target_tag_line, region_code, deadline=deadline)
         
         if not match_info:
             print("[ERROR] 无法获取比赛信息")
@@ -182,18 +194,13 @@ def get_last_valorant_match(game_name=None, tag_line=None):
         
         # 显示简化的比赛信息
         
-        # 保存结果到analysis目录，并管理最多5个文件
-        root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        analysis_dir = os.path.join(root_dir, "analysis")
-        ensure_directory(analysis_dir)
-        
-        # 管理Valorant比赛文件，保持最多5个
-        manage_valorant_match_files(analysis_dir)
-        
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        output_file = os.path.join(analysis_dir, f"valorant_last_match_{timestamp}.json")
+        # 保存结果到产物根目录并登记，Valorant比赛文件最多保留5个
+        manage_valorant_match_files()
+        output_file = artifact_store.new_path("va_match")
         
         if save_json_file(match_info, output_file):
+            artifact_store.add(output_file, "va_match", match_id=match_info.get("match_id"),
+                               player=f"{target_game_name}#{target_tag_line}")
             match_info['output_file'] = output_file
         
         return match_info
@@ -203,34 +210,16 @@ def get_last_valorant_match(game_name=None, tag_line=None):
         return None
 
 
-def manage_valorant_match_files(analysis_dir, max_files=5):
+def manage_valorant_match_files(analysis_dir=None, max_files=5):
     """
-    管理Valorant比赛文件，保持最多指定数量的文件
+    管理Valorant比赛文件，保持最多指定数量的文件（按产物清单淘汰最旧的，不扫描目录）
     
     Args:
-        analysis_dir (str): analysis目录路径
-        max_files (int): 最大文件数量，默认5个
+        analysis_dir (str): 已废弃，产物统一保存在 Config.ARTIFACT_ROOT
+        max_files (int): 最大文件数量，默认5个（为即将保存的新文件预留一个位置）
     """
     try:
-        import glob
-        import os
-        
-        # 查找所有valorant_last_match_*.json文件
-        pattern = os.path.join(analysis_dir, "valorant_last_match_*.json")
-        valorant_files = glob.glob(pattern)
-        
-        # 按修改时间排序（最新的在前）
-        valorant_files.sort(key=os.path.getmtime, reverse=True)
-        
-        # 如果文件数量超过限制，删除最旧的文件
-        if len(valorant_files) >= max_files:
-            files_to_delete = valorant_files[max_files-1:]  # 保留最新的max_files-1个，删除其余的
-            for file_path in files_to_delete:
-                try:
-                    os.remove(file_path)
-                except Exception as e:
-                    print(f"[WARNING] 删除文件失败 {file_path}: {e}")
-        
+        artifact_store.evict(keep_per_kind=max_files - 1, kinds=["va_match"])
     except Exception as e:
         print(f"[ERROR] 管理Valorant比赛文件时发生错误: {e}")
 
@@ -1,59 +1,443 @@
 #!/usr/bin/env python3
 """
 VoicV TTS 服务模块
+TTS后端可插拔：VoicV（云端克隆音色）和本地 espeak-ng（离线兜底 / 压测）
 """
 
+import contextvars
 import os
+import shutil
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import requests
-from datetime import datetime
+from requests.adapters import HTTPAdapter
+from typing import Callable, List, Optional
+import ffmpeg
 from dotenv import load_dotenv
+from services.config import Config
+from services.tracing import tracer
+from services.deadline import DeadlineExceeded, get_timeout
+from services.circuit_breaker import CircuitBreaker
+from services.tts_cache import make_tts_key, tts_cache
+from services.tts_segments import split_sentences, strip_mp3_metadata
 
 # Load environment variables
 load_dotenv()
 
 VOICV_BASE = "https://api.voicv.com"
+DEFAULT_VOICE_ID = "cdf5f2a7604849e2a5ccd07ccf628ee6"
+AUDIO_FORMAT = "mp3"
 
+# VoicV熔断器 - 连续失败或超时后暂停调用，文字分析即为完整结果
+tts_breaker = CircuitBreaker(
+    "VoicV TTS",
+    failure_threshold=Config.TTS_BREAKER_FAILURES,
+    reset_timeout=Config.TTS_BREAKER_RESET_SECONDS,
+)
 
-def generate_tts_audio(text: str, output_path: str = None, voice_id: str = None) -> str:
+
+
+class TTSLocalError(Exception):
+    """本地原因导致的TTS失败（缺少API Key、工作流程截止时间已到），不计入熔断"""
+    pass
+
+
+# 进行中的TTS请求数
+_in_flight = 0
+_in_flight_lock = threading.Lock()
+
+# 分句合成时每个voice_id的并发上限
+_voice_semaphores = {}
+_voice_semaphores_lock = threading.Lock()
+
+# 共享的HTTP会话 - TTS请求和音频下载复用连接池
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+# 流式下载时接收音频数据块的回调（例如写入播放管道）
+ChunkSink = Callable[[bytes], None]
+
+
+def get_http_session() -> requests.Session:
+    """获取共享的HTTP会话（连接池大小与TTS并发上限一致）"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            pool_size = max(Config.TTS_MAX_CONCURRENCY, 1) * 2
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
+
+def get_tts_unavailable_reason() -> Optional[str]:
+    """
+    检查TTS是否可用
+
+    Returns:
+        不可用的原因（熔断中 / 繁忙），可用时返回None
+    """
+    if tts_breaker.is_open and not _local_fallback_available():
+        return "语音服务暂时不可用"
+    if _in_flight >= Config.TTS_MAX_CONCURRENCY:
+        return "语音服务繁忙"
+    return None
+
+
+def _resolve_voice_id(voice_id: Optional[str]) -> str:
+    """使用传入的voice_id，否则使用环境变量VOICV_VOICE_ID或默认语音ID"""
+    if voice_id:
+        return voice_id
+    return os.getenv("VOICV_VOICE_ID") or DEFAULT_VOICE_ID
+
+
+def get_cached_tts_audio(text: str, voice_id: str = None) -> Optional[str]:
+    """查询TTS缓存（不计入命中统计），命中返回缓存文件路径"""
+    key = make_tts_key(_resolve_voice_id(voice_id), text, AUDIO_FORMAT)
+    return tts_cache.peek(key)
+
+
+def _deliver(cached_path: str, output_path: Optional[str]) -> str:
+    """未指定输出路径时直接使用缓存文件，否则原子复制到输出路径"""
+    if not output_path:
+        return cached_path
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    temp_path = f"{output_path}.tmp"
+    shutil.copyfile(cached_path, temp_path)
+    os.replace(temp_path, output_path)
+    return output_path
+
+
+def _feed_file(path: str, sink: ChunkSink):
+    """将已有音频文件按块送入 sink"""
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(Config.TTS_DOWNLOAD_CHUNK_BYTES), b""):
+            sink(chunk)
+
+
+class TTSBackend:
+    """TTS后端接口"""
+    
+    name = "base"
+    audio_format = AUDIO_FORMAT
+    
+    def is_available(self) -> bool:
+        """当前是否可以发起合成"""
+        raise NotImplementedError
+    
+    def cache_voice(self, voice_id: str) -> str:
+        """缓存键中的语音部分，不同后端的同一文字不会互相命中"""
+        return f"{self.name}:{voice_id}"
+    
+    def synthesize(self, text: str, voice_id: str, deadline, temp_path: str,
+                   sink: ChunkSink = None) -> Optional[str]:
+        """
+        合成音频并写入临时文件
+        
+        Returns:
+            临时文件路径，失败返回None
+        """
+        raise NotImplementedError
+
+
+class VoicVBackend(TTSBackend):
+    """VoicV 云端TTS（受熔断器保护）"""
+    
+    name = "voicv"
+    
+    def is_available(self) -> bool:
+        return tts_breaker.allow_request()
+    
+    def cache_voice(self, voice_id: str) -> str:
+        # 保持与之前的缓存键一致
+        return voice_id
+    
+    def synthesize(self, text, voice_id, deadline, temp_path, sink=None):
+        try:
+            result = _request_tts_audio(text, voice_id, deadline, temp_path, sink)
+        except TTSLocalError as e:
+            # 不是VoicV的问题，熔断计数保持不变
+            print(f"[ERROR] TTS未完成（不计入熔断）: {e}")
+            tts_breaker.release()
+            return None
+        if result:
+            tts_breaker.record_success()
+        else:
+            tts_breaker.record_failure()
+        return result
+
+
+class LocalTTSBackend(TTSBackend):
+    """
+    本地离线TTS（espeak-ng，生成WAV后用ffmpeg转为MP3）
+    
+    每次合成都在独立的子进程中运行，并发数由信号量限制；
+    音色固定，不使用 voice_id
+    """
+    
+    name = "local"
+    
+    def __init__(self, voice: str = "cmn", max_workers: int = 2):
+        self.voice = voice
+        self._semaphore = threading.BoundedSemaphore(max_workers)
+    
+    def executable(self) -> Optional[str]:
+        return shutil.which("espeak-ng") or shutil.which("espeak")
+    
+    def is_available(self) -> bool:
+        return bool(self.executable() and shutil.which("ffmpeg"))
+    
+    def cache_voice(self, voice_id: str) -> str:
+        return f"{self.name}:{self.voice}"
+    
+    def synthesize(self, text, voice_id, deadline, temp_path, sink=None):
+        wav_path = f"{temp_path}.wav"
+        try:
+            with self._semaphore, tracer.span("local_tts.synthesize", text_chars=len(text)):
+                # 文本通过标准输入传入，以 "-" 开头的点评不会被当作命令行选项
+                subprocess.run(
+                    [self.executable(), "-v", self.voice, "-w", wav_path, "--stdin"],
+                    input=text.encode("utf-8"), check=True, capture_output=True,
+                    timeout=get_timeout(deadline, 30),
+                )
+                (
+                    ffmpeg
+                    .input(wav_path)
+                    .output(temp_path, format=AUDIO_FORMAT, acodec="libmp3lame", audio_bitrate="64k")
+                    .overwrite_output()
+                    .run(quiet=True)
+                )
+            if sink:
+                _feed_file(temp_path, sink)
+            return temp_path
+        except Exception as e:
+            print(f"[ERROR] 本地TTS失败: {e}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return None
+        finally:
+            if os.path.exists(wav_path):
+                os.remove(wav_path)
+
+
+voicv_backend = VoicVBackend()
+local_backend = LocalTTSBackend(voice=Config.TTS_LOCAL_VOICE, max_workers=Config.TTS_LOCAL_MAX_WORKERS)
+
+
+def _local_fallback_available() -> bool:
+    return Config.TTS_LOCAL_FALLBACK and local_backend.is_available()
+
+
+def select_backends(text: str, voice_id: str, deadline=None) -> List[TTSBackend]:
+    """
+    按截止时间和熔断状态选择TTS后端顺序
+    
+    - TTS_BACKEND=local 时只使用本地后端（压测不产生费用）
+    - VoicV已有缓存时优先VoicV
+    - VoicV熔断中或剩余时间不足 TTS_LOCAL_MIN_SECONDS 时优先本地后端
+    - 否则VoicV优先，失败后回退本地后端
+    
+    Returns:
+        按优先级排列的后端列表
+    """
+    if Config.TTS_BACKEND == local_backend.name:
+        return [local_backend]
+    if not _local_fallback_available():
+        return [voicv_backend]
+    
+    if tts_cache.peek(make_tts_key(voicv_backend.cache_voice(voice_id), text, AUDIO_FORMAT)):
+        return [voicv_backend, local_backend]
+    short_on_time = deadline is not None and deadline.remaining() < Config.TTS_LOCAL_MIN_SECONDS
+    if tts_breaker.is_open or short_on_time:
+        return [local_backend, voicv_backend]
+    return [voicv_backend, local_backend]
+
+
+def _synthesize(text: str, voice_id: str, deadline, sink: ChunkSink = None,
+                backend: TTSBackend = None) -> Optional[str]:
+    """使用指定后端合成一段文字，返回TTS缓存中的文件路径，失败返回None"""
+    backend = backend or voicv_backend
+    key = make_tts_key(backend.cache_voice(voice_id), text, backend.audio_format)
+    cached_path = tts_cache.get(key)
+    if cached_path:
+        print(f"⚡ 使用缓存的TTS音频: {cached_path}")
+        if sink:
+            _feed_file(cached_path, sink)
+        return cached_path
+    
+    if not backend.is_available():
+        print(f"[ERROR] {backend.name} 后端不可用，跳过TTS")
+        return None
+    
+    temp_path = backend.synthesize(text, voice_id, deadline, tts_cache.temp_path(key), sink)
+    if not temp_path:
+        return None
+    return tts_cache.commit(key, temp_path)
+
+
+def _voice_semaphore(voice_id: str) -> threading.BoundedSemaphore:
+    """每个voice_id一个并发上限，所有分句请求共享"""
+    with _voice_semaphores_lock:
+        if voice_id not in _voice_semaphores:
+            _voice_semaphores[voice_id] = threading.BoundedSemaphore(Config.TTS_SEGMENT_CONCURRENCY)
+        return _voice_semaphores[voice_id]
+
+
+def _synthesize_segment(segment: str, voice_id: str, deadline) -> Optional[str]:
+    """合成单个分句，失败时只重试这一句"""
+    for attempt in range(Config.TTS_SEGMENT_RETRIES + 1):
+        if attempt:
+            if deadline and deadline.expired:
+                break
+            print(f"🔁 重试分句 ({attempt}/{Config.TTS_SEGMENT_RETRIES}): {segment[:20]}")
+        with _voice_semaphore(voice_id):
+            path = _synthesize(segment, voice_id, deadline)
+        if path:
+            return path
+    return None
+
+
+def _synthesize_segmented(text: str, voice_id: str, deadline, sink: ChunkSink = None) -> Optional[str]:
+    """
+    分句并发合成后按原顺序无缝拼接
+
+    每句单独缓存，拼接结果按整段文字缓存；
+    提供 sink 时按顺序在每句完成后立即送出
+    """
+    key = make_tts_key(voice_id, text, AUDIO_FORMAT)
+    cached_path = tts_cache.get(key)
+    if cached_path:
+        print(f"⚡ 使用缓存的TTS音频: {cached_path}")
+        if sink:
+            _feed_file(cached_path, sink)
+        return cached_path
+    
+    segments = split_sentences(text, Config.TTS_SEGMENT_MAX_CHARS)
+    if len(segments) <= 1:
+        return _synthesize(text, voice_id, deadline, sink)
+    
+    print(f"✂️ 分句合成: {len(segments)} 段")
+    parts = []
+    with tracer.span("voicv.segmented", segments=len(segments)):
+        with ThreadPoolExecutor(max_workers=min(len(segments), Config.TTS_SEGMENT_CONCURRENCY)) as pool:
+            # 每个线程使用独立的上下文副本，分句请求仍记录在当前追踪中
+            futures = [
+                pool.submit(contextvars.copy_context().run, _synthesize_segment, segment, voice_id, deadline)
+                for segment in segments
+            ]
+            for index, future in enumerate(futures):
+                path = future.result()
+                if not path:
+                    print(f"[ERROR] 第 {index + 1} 段合成失败")
+                    for pending in futures:
+                        pending.cancel()
+                    return None
+                with open(path, "rb") as f:
+                    data = strip_mp3_metadata(f.read())
+                parts.append(data)
+                if sink:
+                    sink(data)
+    
+    return tts_cache.put(key, b"".join(parts))
+
+
+def generate_tts_audio(text: str, output_path: str = None, voice_id: str = None, deadline=None,
+                       sink: ChunkSink = None, segmented: bool = None) -> str:
     """
-    使用VoicV TTS API生成音频文件
+    使用VoicV TTS API生成音频文件，VoicV不可用或时间不足时使用本地后端
+    
+    相同 voice_id + 文本的结果从TTS缓存中直接复用，不再调用API（熔断中也可用）；
+    音频按块流式下载到磁盘，内存占用不随音频长度增长
     
     Args:
         text: 要转换的文本
-        output_path: 输出文件路径，如果为None则自动生成
+        output_path: 输出文件路径，如果为None则直接返回缓存文件路径
         voice_id: 语音ID，如果为None则使用环境变量中的VOICV_VOICE_ID
+        deadline: 工作流程截止时间，请求超时不超过剩余时间
+        sink: 可选，每收到一块音频数据就调用一次（边下载边播放）；
+              已有数据送入 sink 后后端失败时不再切换后端，避免把另一段完整音频拼接到同一个流中
+        segmented: 是否分句并发合成，为None时使用 Config.TTS_SEGMENTED
         
     Returns:
         生成的音频文件路径，失败返回None
     """
+    global _in_flight
+    
+    voice_id = _resolve_voice_id(voice_id)
+    if segmented is None:
+        segmented = Config.TTS_SEGMENTED
+    
+    sent = [0]  # 已送入 sink 的字节数
+    
+    def counting_sink(chunk: bytes):
+        sent[0] += len(chunk)
+        sink(chunk)
+    
+    with _in_flight_lock:
+        _in_flight += 1
+    try:
+        cached_path = None
+        backends = select_backends(text, voice_id, deadline)
+        for index, backend in enumerate(backends):
+            if index:
+                if sent[0]:
+                    print(f"[ERROR] 已有 {sent[0]} 字节音频送入播放器，不能切换到 {backend.name} 语音后端")
+                    break
+                print(f"🔁 切换到 {backend.name} 语音后端")
+            stream = counting_sink if sink else None
+            # 分句合成只用于VoicV，本地后端整段合成已经足够快
+            if segmented and backend is voicv_backend:
+                cached_path = _synthesize_segmented(text, voice_id, deadline, stream)
+            else:
+                cached_path = _synthesize(text, voice_id, deadline, stream, backend)
+            if cached_path:
+                break
+        if not cached_path:
+            return None
+        result = _deliver(cached_path, output_path)
+    except OSError as e:
+        print(f"[ERROR] 保存音频文件失败: {e}")
+        return None
+    finally:
+        with _in_flight_lock:
+            _in_flight -= 1
+    
+    print(f"🎉 音频文件已保存: {result}")
+    return result
+
+
+def _request_tts_audio(text: str, voice_id: str, deadline, temp_path: str,
+                       sink: ChunkSink = None) -> Optional[str]:
+    """
+    调用VoicV API生成音频并流式下载到临时文件
+
+    Returns:
+        临时文件路径，上游失败返回None
+
+    Raises:
+        TTSLocalError: 缺少API Key或截止时间已到（不是上游故障）
+    """
     # 检查环境变量
     voicv_api_key = os.getenv("VOICV_API_KEY")
     if not voicv_api_key:
-        print("[ERROR] 缺少环境变量 VOICV_API_KEY")
-        return None
-    
-    # 使用传入的voice_id或默认的VOICV_VOICE_ID
-    if voice_id is None:
-        voice_id = os.getenv("VOICV_VOICE_ID")
-        if not voice_id:
-            # 使用默认语音ID
-            voice_id = "cdf5f2a7604849e2a5ccd07ccf628ee6"
-    
-    # 生成输出路径
-    if not output_path:
-        # 确保audio目录存在
-        os.makedirs("audio", exist_ok=True)
-        # 生成时间戳
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        output_path = f"audio/match_analysis_{timestamp}.mp3"
+        raise TTSLocalError("缺少环境变量 VOICV_API_KEY")
     
     headers = {"x-api-key": voicv_api_key, "Content-Type": "application/json"}
-    payload = {"voiceId": voice_id, "text": text, "format": "mp3"}
+    payload = {"voiceId": voice_id, "text": text, "format": AUDIO_FORMAT}
+    session = get_http_session()
+    response = None
     
     try:
         print("-> 调用 voicV TTS API...")
-        response = requests.post(f"{VOICV_BASE}/v1/tts", headers=headers, json=payload, timeout=120)
-        response.raise_for_status()
+        with tracer.span("voicv.tts", voice_id=voice_id, text_chars=len(text)) as span:
+            response = session.post(f"{VOICV_BASE}/v1/tts", headers=headers, json=payload, timeout=get_timeout(deadline, 120))
+            span.set(status=response.status_code)
+            response.raise_for_status()
         
         data = response.json().get("data", {})
         audio_url = data.get("audioUrl")
@@ -65,28 +449,48 @@ def generate_tts_audio(text: str, output_path: str = None, voice_id: str = None)
         print(f"🔗 音频地址: {audio_url}")
         print("-> 下载音频文件...")
         
-        # 下载音频文件
-        mp3_response = requests.get(audio_url, timeout=120)
-        mp3_response.raise_for_status()
+        # 按块下载到临时文件，同时送入 sink
+        with tracer.span("voicv.download") as span:
+            with session.get(audio_url, stream=True, timeout=get_timeout(deadline, 120)) as mp3_response:
+                span.set(status=mp3_response.status_code)
+                mp3_response.raise_for_status()
+                total = 0
+                with open(temp_path, "wb") as f:
+                    for chunk in mp3_response.iter_content(chunk_size=Config.TTS_DOWNLOAD_CHUNK_BYTES):
+                        if not chunk:
+                            continue
+                        f.write(chunk)
+                        total += len(chunk)
+                        if sink:
+                            sink(chunk)
+                span.set(response_bytes=total)
         
-        # 确保目录存在
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
-        
-        # 保存文件
-        with open(output_path, "wb") as f:
-            f.write(mp3_response.content)
-        
-        print(f"🎉 音频文件已保存: {output_path}")
-        return output_path
+        return temp_path
         
     except requests.HTTPError as e:
         print(f"[ERROR] TTS API错误: {e}")
         print(f"请求: {payload}")
-        print(f"响应: {response.text}")
-        return None
+        if response is not None:
+            print(f"响应: {response.text}")
+        local_error = None
+    except DeadlineExceeded as e:
+        local_error = TTSLocalError(str(e))
     except Exception as e:
-        print(f"[ERROR] TTS调用失败: {e}")
-        return None
+        # 超时由截止时间截短导致时属于本地原因，否则是上游慢或连接失败
+        if deadline is not None and deadline.expired:
+            local_error = TTSLocalError(f"截止时间已到: {e}")
+        else:
+            print(f"[ERROR] TTS调用失败: {e}")
+            local_error = None
+    
+    # 失败时删除未写完的临时文件
+    try:
+        os.remove(temp_path)
+    except OSError:
+        pass
+    if local_error:
+        raise local_error
+    return None
 
 
 def main():
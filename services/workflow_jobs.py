@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+工作流程任务管理
+- 相同玩家 + 相同风格的进行中请求会加入已有任务，而不是重新运行
+- 请求者发起新请求或离开语音频道时取消其旧任务
+"""
+
+import asyncio
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Optional, Set, Tuple
+
+JobKey = Tuple[str, str, str]
+
+
+def make_job_key(game: str, riot_id: str, style: str) -> JobKey:
+    """生成任务键（游戏类型, Riot ID, 风格），Riot ID 不区分大小写"""
+    return (game.upper(), riot_id.strip().lower(), style)
+
+
+class WorkflowJob:
+    """一个正在运行的工作流程任务，可被多个请求者共享"""
+
+    def __init__(self, key: JobKey, task: asyncio.Task):
+        self.key = key
+        self.task = task
+        self.requester_ids: Set[int] = set()
+        self.started_at = datetime.now()
+
+    async def wait(self):
+        """
+        等待任务完成
+
+        使用 shield 保护共享任务：某个请求者的命令被取消时不会取消任务本身
+        """
+        return await asyncio.shield(self.task)
+
+
+class JobRegistry:
+    """进行中的工作流程任务注册表"""
+
+    def __init__(self):
+        self._jobs: Dict[JobKey, WorkflowJob] = {}
+        self._by_requester: Dict[int, JobKey] = {}
+
+    def submit(self, key: JobKey, requester_id: int,
+               factory: Callable[[], Awaitable]) -> Tuple[WorkflowJob, bool]:
+        """
+        提交工作流程
+
+        Args:
+            key: 任务键
+            requester_id: 请求者Discord ID
+            factory: 创建工作流程协程的函数，只有需要新任务时才会调用
+
+        Returns:
+            (任务, 是否加入了已有任务)
+        """
+        # 同一请求者发起了不同的新请求，取消其旧请求
+        previous_key = self._by_requester.get(requester_id)
+        if previous_key is not None and previous_key != key:
+            self.cancel_for_requester(requester_id)
+
+        job = self._jobs.get(key)
+        if job and not job.task.done():
+            job.requester_ids.add(requester_id)
+            self._by_requester[requester_id] = key
+            print(f"🔗 加入进行中的任务: {key}")
+            return job, True
+
+        task = asyncio.create_task(factory())
+        job = WorkflowJob(key, task)
+        job.requester_ids.add(requester_id)
+        self._jobs[key] = job
+        self._by_requester[requester_id] = key
+        task.add_done_callback(lambda _: self._remove(job))
+        return job, False
+
+    def cancel_for_requester(self, requester_id: int, reason: str = "") -> bool:
+        """
+        请求者不再需要结果（离开语音频道或发起新请求）
+
+        任务没有其他请求者时会被取消
+
+        Returns:
+            是否取消了任务
+        """
+        key = self._by_requester.pop(requester_id, None)
+        if key is None:
+            return False
+
+        job = self._jobs.get(key)
+        if not job:
+            return False
+
+        job.requester_ids.discard(requester_id)
+        if job.requester_ids or job.task.done():
+            return False
+
+        print(f"🛑 取消工作流程任务: {key} {reason}".rstrip())
+        job.task.cancel()
+        return True
+
+    def get_job(self, key: JobKey) -> Optional[WorkflowJob]:
+        job = self._jobs.get(key)
+        if job and not job.task.done():
+            return job
+        return None
+
+    def active_count(self) -> int:
+        return sum(1 for job in self._jobs.values() if not job.task.done())
+
+    def _remove(self, job: WorkflowJob):
+        if self._jobs.get(job.key) is job:
+            del self._jobs[job.key]
+        for requester_id in list(job.requester_ids):
+            if self._by_requester.get(requester_id) == job.key:
+                del self._by_requester[requester_id]
+
+
+# 全局任务注册表
+job_registry = JobRegistry()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+测试带清单索引的分析产物存储
+"""
+
+import sys
+import os
+import json
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.artifact_store import ArtifactStore
+
+
+def write_artifact(store, kind, payload, **tags):
+    """写入一个产物文件并登记"""
+    path = store.new_path(kind)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(payload)
+    assert store.add(path, kind, **tags)
+    return path
+
+
+def test_latest_per_player():
+    """测试按玩家和比赛ID查找最新产物"""
+    print("测试最新产物查询")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ArtifactStore(tmp)
+        a1 = write_artifact(store, "lol_match", "{}", player="A#NA1", match_id="NA1_1")
+        b1 = write_artifact(store, "lol_match", "{}", player="B#NA1", match_id="NA1_2")
+        a2 = write_artifact(store, "lol_match", "{}", player="A#NA1", match_id="NA1_3")
+        assert len({a1, b1, a2}) == 3  # 同一秒内的文件名不冲突
+
+        assert store.latest("lol_match") == a2
+        assert store.latest("lol_match", "B#NA1") == b1
+        assert store.latest("va_match") is None
+        assert store.find("lol_match", "NA1_1") == a1
+
+        # 文件被手动删除时回退到上一个
+        os.remove(a2)
+        assert store.latest("lol_match", "A#NA1") == a1
+
+        # 重启后从清单和日志恢复索引，不需要扫描目录
+        reopened = ArtifactStore(tmp)
+        assert reopened.latest("lol_match", "B#NA1") == b1
+        assert reopened.count("lol_match") == 2
+        with open(reopened.manifest_path, encoding="utf-8") as f:
+            assert json.load(f)["artifacts"] == []  # 登记只追加日志，没有重写清单
+    print("✓ 最新产物、按比赛ID查找和清单恢复")
+
+
+def test_manifest_journal_compaction():
+    """测试登记只追加日志，日志变长后压缩成清单"""
+    print("测试清单日志")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ArtifactStore(tmp)
+        for index in range(70):
+            write_artifact(store, "lol_text", "y", match_id=f"NA1_{index}")
+        # 日志达到64行后（第65次登记）重写清单并清空日志
+        with open(store.manifest_path, encoding="utf-8") as f:
+            assert len(json.load(f)["artifacts"]) == 65
+        with open(store.journal_path, encoding="utf-8") as f:
+            assert len(f.readlines()) == 5
+
+        # 崩溃留下的半行被忽略
+        with open(store.journal_path, "a", encoding="utf-8") as f:
+            f.write('{"op": "remove", "na')
+        reopened = ArtifactStore(tmp)
+        assert reopened.count("lol_text") == 70
+        assert reopened.find("lol_text", "NA1_69")
+    print("✓ 日志重放与压缩")
+
+
+def test_eviction():
+    """测试按数量和字节预算淘汰最旧的产物"""
+    print("测试淘汰")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ArtifactStore(tmp, max_bytes=250)
+        paths = [write_artifact(store, "va_match", "x" * 100) for _ in range(3)]
+        # 300 字节超出预算，最旧的被删除
+        assert not os.path.exists(paths[0]) and store.get_stats()["bytes"] == 200
+
+        texts = [write_artifact(store, "lol_text", "y") for _ in range(4)]
+        removed = store.evict(keep_per_kind=2)
+        assert removed["lol_text"] == 2 and removed["va_match"] == 0
+        assert [os.path.exists(path) for path in texts] == [False, False, True, True]
+        assert store.count("lol_text") == 2 and store.count() == 4
+    print("✓ 超出预算或数量时删除最旧的产物")
+
+
+def test_bootstrap_from_existing_files():
+    """测试没有清单时扫描一次已有文件"""
+    print("测试从已有文件建立清单")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in ("match_analysis_20250101_000000.json", "valorant_chinese_analysis_x.txt", "notes.txt"):
+            with open(os.path.join(tmp, name), "w") as f:
+                f.write("{}")
+        store = ArtifactStore(tmp)
+        stats = store.get_stats()
+        assert stats["lol_match"] == 1 and stats["va_text"] == 1 and stats["lol_text"] == 0
+        assert os.path.exists(store.manifest_path)
+    print("✓ 已有产物被登记，其他文件被忽略")
+
+
+if __name__ == "__main__":
+    test_latest_per_player()
+    test_manifest_journal_compaction()
+    test_eviction()
+    test_bootstrap_from_existing_files()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+测试多风格批量生成
+"""
+
+import sys
+import os
+import asyncio
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import batch_generator
+from services.config import Config
+from services.generation_cache import GenerationCache
+from services.template_engine import FALLBACK_PATH, LLM_PATH, TEMPLATE_PATH
+
+MATCH = {"match_id": "NA1_1", "puuid": "puuid-1"}
+
+
+def test_styles_run_concurrently_and_are_cached():
+    """测试各风格并发生成，第二次请求全部命中缓存"""
+    print("测试多风格批量生成")
+    print("=" * 50)
+
+    cache = GenerationCache()
+    original_cache = batch_generator.generation_cache
+    original_key = batch_generator.make_generation_key
+    batch_generator.generation_cache = cache
+    # 不读取 prompts 目录，直接用风格名作为缓存键
+    batch_generator.make_generation_key = lambda match_data, style, model: (match_data["match_id"], style, model)
+
+    calls = []
+    active = {"now": 0, "max": 0}
+
+    async def fake_convert(match_data, prompt, system_role, style, deadline):
+        calls.append(style)
+        active["now"] += 1
+        active["max"] = max(active["max"], active["now"])
+        await asyncio.sleep(0.01)
+        active["now"] -= 1
+        if style == "broken":
+            return None, None
+        if style == "slow":
+            await asyncio.sleep(5)
+        return f"{style}的点评", f"voice-{style}"
+
+    original_hedge = Config.LLM_HEDGE_SECONDS
+    Config.LLM_HEDGE_SECONDS = 0.2
+    try:
+        styles = ["kfk", "azi", "broken", "slow"]
+        results, paths = asyncio.run(batch_generator.generate_styles(MATCH, styles, fake_convert, "gpt-4.1-mini"))
+        assert list(results) == styles
+        assert results["azi"].voice_id == "voice-azi"
+        assert active["max"] == 4
+        # 出错和超时的风格使用本地模板，路径分别记录
+        assert paths == {"kfk": LLM_PATH, "azi": LLM_PATH, "broken": FALLBACK_PATH, "slow": TEMPLATE_PATH}
+        assert results["slow"].text != "slow的点评"
+
+        # 只缓存LLM结果，模板风格再次请求LLM
+        calls.clear()
+        results, paths = asyncio.run(batch_generator.generate_styles(MATCH, ["azi", "kfk", "broken"], fake_convert,
+                                                                     "gpt-4.1-mini"))
+        assert calls == ["broken"]
+        assert list(results) == ["azi", "kfk", "broken"] and paths["azi"] == LLM_PATH
+    finally:
+        Config.LLM_HEDGE_SECONDS = original_hedge
+        batch_generator.generation_cache = original_cache
+        batch_generator.make_generation_key = original_key
+    print(f"✓ 最大并发 {active['max']}，慢/失败的风格用模板兜底，LLM结果命中缓存")
+
+
+if __name__ == "__main__":
+    test_styles_run_concurrently_and_are_cached()
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+测试共享绑定注册表的内存索引和批量写回
+"""
+
+import sys
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.binding_registry import BindingRegistry
+from services.data_maintenance import DataMaintenance
+from services.player_store import PlayerStore
+
+
+class CountingStore(PlayerStore):
+    """统计读取和批量写入次数的存储"""
+
+    def __init__(self, db_path):
+        super().__init__(db_path)
+        self.reads = 0
+        self.batches = []
+
+    def get_by_discord(self, discord_id):
+        self.reads += 1
+        return super().get_by_discord(discord_id)
+
+    def update_many(self, rows, newer_only=False):
+        self.batches.append(sorted(rows))
+        return super().update_many(rows, newer_only)
+
+
+def test_lookups_stay_in_memory():
+    """测试查询不访问存储，返回的是副本"""
+    print("测试内存查询")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = CountingStore(os.path.join(tmp, "players.db"))
+        registry = BindingRegistry(store, flush_delay=60)
+        assert registry.register({"discord_id": "1", "riot_id": "A#NA1", "game": "LOL"})
+        assert not registry.register({"discord_id": "2", "riot_id": "A#NA1"})
+        assert registry.get_by_discord("1")["game"] == "LOL"
+
+        store.reads = 0
+        for _ in range(100):
+            assert registry.get_by_discord("1")["riot_id"] == "A#NA1"
+        registry.get_by_riot("A#NA1")["riot_id"] = "changed"
+        assert registry.get_by_riot("A#NA1")["riot_id"] == "A#NA1"
+        assert store.reads == 0
+        store.close()
+    print("✓ 100次查询没有访问数据库")
+
+
+def test_debounced_batch_flush():
+    """测试去抖期间的状态更新合并为一次写回"""
+    print("测试批量写回")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = CountingStore(os.path.join(tmp, "players.db"))
+        registry = BindingRegistry(store, flush_delay=0.1)
+        registry.register({"discord_id": "1", "riot_id": "A#NA1"})
+        registry.register({"discord_id": "2", "riot_id": "B#NA1"})
+
+        for index in range(10):
+            registry.update("A#NA1", is_in_voice=True, last_check=f"t{index}")
+            registry.update("B#NA1", is_in_game=index % 2 == 0)
+        assert registry.dirty_count() == 2
+        assert store.batches == []
+
+        time.sleep(0.3)
+        assert store.batches == [["A#NA1", "B#NA1"]]
+        assert store.get_by_riot("A#NA1")["last_check"] == "t9"
+        assert store.get_by_riot("B#NA1")["is_in_game"] is False
+        assert registry.dirty_count() == 0
+        store.close()
+    print("✓ 20次状态更新合并为1次事务写回")
+
+
+def test_heartbeats_stay_in_memory():
+    """测试只有时间戳变化的心跳不写入，只有状态变化才写回"""
+    print("测试心跳与状态变化")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = CountingStore(os.path.join(tmp, "players.db"))
+        registry = BindingRegistry(store, flush_delay=60)
+        registry.register({"discord_id": "1", "riot_id": "A#NA1"})
+        registry.update("A#NA1", is_in_voice=False, is_in_game=False, last_check="t0")
+        registry.flush()
+        store.batches.clear()
+
+        # 100次轮询，状态不变
+        for index in range(1, 101):
+            registry.update("A#NA1", is_in_voice=False, is_in_game=False, last_check=f"t{index:03d}")
+        assert registry.dirty_count() == 0
+        assert registry.flush() == 0 and store.batches == []
+        assert registry.get_by_riot("A#NA1")["last_check"] == "t100"
+        assert store.get_by_riot("A#NA1")["last_check"] == "t0"
+
+        # 真正的状态变化连同最新的 last_check 一起写回
+        registry.update("A#NA1", is_in_voice=True, is_in_game=False, last_check="t101")
+        assert registry.flush() == 1
+        row = store.get_by_riot("A#NA1")
+        assert row["is_in_voice"] is True and row["last_check"] == "t101"
+
+        stats = registry.get_stats()
+        assert stats["heartbeats"] == 100 and stats["transitions"] == 2
+        store.close()
+    print("✓ 100次心跳0次写入，状态变化1次写入")
+
+
+def test_expiry_heap_sweep():
+    """测试过期清理只处理堆顶已过期的在线玩家"""
+    print("测试过期堆")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = CountingStore(os.path.join(tmp, "players.db"))
+        registry = BindingRegistry(store, flush_delay=60)
+        for index in range(200):
+            riot_id = f"P{index}#NA1"
+            registry.register({"discord_id": str(index), "riot_id": riot_id})
+            registry.update(riot_id, is_in_voice=True, last_check=f"2025-01-01T10:{index % 60:02d}:00")
+        # 心跳让旧条目作废；离线玩家不参与清理
+        registry.update("P0#NA1", last_check="2025-01-01T11:00:00")
+        registry.update("P1#NA1", is_in_voice=False, last_check="2025-01-01T10:01:30")
+        assert registry.next_expiry() == "2025-01-01T10:00:00"
+
+        # 只有 P60、P120、P180 在 10:00:30 之前
+        assert registry.mark_stale_offline("2025-01-01T10:00:30", "now") == 3
+        assert registry.get_by_riot("P60#NA1")["is_in_voice"] is False
+        assert registry.get_by_riot("P0#NA1")["is_in_voice"] is True
+        assert registry.mark_stale_offline("2025-01-01T10:00:30", "now") == 0
+        assert registry.next_expiry() == "2025-01-01T10:01:00"
+        assert len(registry._expiry) <= 4 * registry.count() + 64
+        store.close()
+    print("✓ 只有过期条目被弹出，心跳和离线玩家被跳过")
+
+
+def test_restart_does_not_expire_online_players():
+    """测试重启后在线玩家不会因为未写入的心跳立刻被标记为离线"""
+    print("测试重启后的过期清理")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "players.db")
+        store = PlayerStore(db_path)
+        registry = BindingRegistry(store, flush_delay=0)
+        registry.register({"discord_id": "1", "riot_id": "A#NA1"})
+        started = datetime.now() - timedelta(hours=1)
+        registry.update("A#NA1", is_in_voice=True, last_check=started.isoformat())
+        # 之后的心跳只在内存中
+        registry.update("A#NA1", last_check=datetime.now().isoformat())
+        store.close()
+
+        store = PlayerStore(db_path)
+        restarted = BindingRegistry(store, flush_delay=0)
+        cutoff = (datetime.now() - timedelta(minutes=10)).isoformat()
+        assert restarted.mark_stale_offline(cutoff, datetime.now().isoformat()) == 0
+        assert restarted.get_by_riot("A#NA1")["is_in_voice"] is True
+        assert store.get_by_riot("A#NA1")["last_check"] == started.isoformat()
+        store.close()
+    print("✓ 在线玩家获得一个过期周期的重新确认时间")
+
+
+def test_overlapping_flushes_commit_in_order():
+    """测试两次写回重叠时，后取的快照最后提交"""
+    print("测试写回顺序")
+    print("=" * 50)
+
+    class SlowStore(PlayerStore):
+        slow = True
+
+        def update_many(self, rows, newer_only=False):
+            if self.slow:
+                self.slow = False
+                time.sleep(0.2)  # 第一次写回在写数据库时被拖慢
+            return super().update_many(rows, newer_only)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SlowStore(os.path.join(tmp, "players.db"))
+        registry = BindingRegistry(store, flush_delay=60)
+        registry.register({"discord_id": "1", "riot_id": "A#NA1"})
+        registry.update("A#NA1", is_in_game=True, last_check="t1")
+        first = threading.Thread(target=registry.flush)
+        first.start()
+        time.sleep(0.05)
+        registry.update("A#NA1", is_in_game=False)
+        registry.flush()
+        first.join()
+        assert store.get_by_riot("A#NA1")["is_in_game"] is False
+        store.close()
+    print("✓ 旧快照不会覆盖新快照")
+
+
+def test_sees_other_process_writes():
+    """测试另一个进程（另一个数据库连接）的注册和状态更新可见，写回不覆盖更新的状态"""
+    print("测试多进程共享数据库")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "players.db")
+        store, other_store = PlayerStore(db_path), PlayerStore(db_path)
+        registry = BindingRegistry(store, flush_delay=60)
+        other = BindingRegistry(other_store, flush_delay=0)
+        registry.register({"discord_id": "1", "riot_id": "A#NA1"})
+        registry.update("A#NA1", is_in_voice=True, last_check="2025-01-01T10:00:00")
+
+        # 另一个进程注册新玩家，并写入 A 更新的状态
+        other.register({"discord_id": "2", "riot_id": "B#NA1"})
+        assert other.get_by_riot("A#NA1") is not None
+        other.update("A#NA1", is_in_voice=False, is_in_game=True, last_check="2025-01-01T10:05:00")
+        assert registry.get_by_discord("2")["riot_id"] == "B#NA1"
+        player = registry.get_by_riot("A#NA1")
+        assert player["is_in_game"] is True and player["is_in_voice"] is False
+
+        # 本进程较旧的待写回状态不覆盖数据库中更新的状态
+        registry._by_riot["A#NA1"]["last_check"] = "2025-01-01T10:01:00"
+        registry._by_riot["A#NA1"]["is_in_game"] = False
+        registry._dirty["1"] = {"is_in_game"}
+        registry.flush()
+        assert store.get_by_riot("A#NA1")["is_in_game"] is True
+        assert registry.get_by_riot("A#NA1")["is_in_game"] is True
+        store.close()
+        other_store.close()
+    print("✓ 其他进程的修改被重新加载，写回带 last_check 条件")
+
+
+def test_maintenance_sleeps_until_deadline():
+    """测试维护任务睡到下一个真实的过期时间"""
+    print("测试维护睡眠时间")
+    print("=" * 50)
+
+    class FakePresence:
+        oldest = None
+
+        def next_status_expiry(self):
+            return self.oldest
+
+    maintenance = DataMaintenance()
+    maintenance.presence_manager = FakePresence()
+    maintenance.last_compaction = datetime.now()
+    assert 299 <= maintenance._seconds_until_next_run() <= 300
+
+    maintenance.presence_manager.oldest = datetime.now() - timedelta(minutes=9)
+    assert 59 <= maintenance._seconds_until_next_run() <= 60
+
+    maintenance.presence_manager.oldest = datetime.now() - timedelta(hours=1)
+    assert maintenance._seconds_until_next_run() == maintenance.min_sleep
+    print("✓ 睡眠时间由最早的过期时间决定")
+
+
+if __name__ == "__main__":
+    test_lookups_stay_in_memory()
+    test_debounced_batch_flush()
+    test_heartbeats_stay_in_memory()
+    test_expiry_heap_sweep()
+    test_restart_does_not_expire_online_players()
+    test_overlapping_flushes_commit_in_order()
+    test_sees_other_process_writes()
+    test_maintenance_sleeps_until_deadline()
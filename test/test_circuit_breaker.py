@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+测试VoicV熔断器
+"""
+
+import sys
+import os
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.circuit_breaker import CircuitBreaker, CLOSED, OPEN, HALF_OPEN
+
+
+def test_breaker_opens_and_recovers():
+    """测试连续失败后熔断，冷却后放行一次试探请求"""
+    print("测试熔断器")
+    print("=" * 50)
+
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=0.05)
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert breaker.is_open
+    assert not breaker.allow_request()
+
+    time.sleep(0.06)
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow_request()
+    # 试探请求进行中，其他请求仍被拒绝
+    assert not breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    print("✓ 熔断与恢复正确")
+
+
+def test_failed_trial_reopens():
+    """测试试探请求失败后重新熔断"""
+    breaker = CircuitBreaker("test", failure_threshold=5, reset_timeout=0.01)
+    for _ in range(5):
+        breaker.record_failure()
+    time.sleep(0.02)
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+
+
+def test_tts_unavailable_when_breaker_open():
+    """测试VoicV熔断时文字分析即为完整结果"""
+    from services import voicv_tts
+
+    original = voicv_tts.tts_breaker
+    voicv_tts.tts_breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=60)
+    try:
+        assert voicv_tts.get_tts_unavailable_reason() is None
+        voicv_tts.tts_breaker.record_failure()
+        assert voicv_tts.get_tts_unavailable_reason() == "语音服务暂时不可用"
+        # 熔断中直接返回None，不发起请求
+        assert voicv_tts.generate_tts_audio("测试") is None
+    finally:
+        voicv_tts.tts_breaker = original
+    print("✓ 熔断时跳过TTS")
+
+
+if __name__ == "__main__":
+    test_breaker_opens_and_recovers()
+    test_failed_trial_reopens()
+    test_tts_unavailable_when_breaker_open()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+测试分析结果缓存（LRU + TTL）
+"""
+
+import sys
+import os
+import time
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import generation_cache
+from services.generation_cache import GenerationCache, make_generation_key
+
+MATCH = {"match_id": "NA1_1", "puuid": "puuid-1"}
+
+
+def test_key_depends_on_template_and_model():
+    """测试缓存键包含模板哈希和模型"""
+    key = make_generation_key(MATCH, "kfk", "gpt-4.1-mini", prompt="模板A", system_role="角色")
+    assert key == make_generation_key(MATCH, "kfk", "gpt-4.1-mini", prompt="模板A", system_role="角色")
+    assert key != make_generation_key(MATCH, "kfk", "gpt-4.1-mini", prompt="模板B", system_role="角色")
+    assert key != make_generation_key(MATCH, "kfk", "gpt-4o-mini", prompt="模板A", system_role="角色")
+    # 缺少比赛ID时不缓存
+    assert make_generation_key({"puuid": "p"}, "kfk", "gpt-4.1-mini", prompt="A", system_role="B") is None
+    print("✓ 缓存键正确")
+
+
+def test_key_uses_style_models():
+    """测试风格配置的模型列表覆盖默认模型列表"""
+    styles = {
+        "fast": {"prompt": "P", "system_role": "R", "models": ["gpt-4o-mini"]},
+        "plain": {"prompt": "P", "system_role": "R"},
+    }
+    original = generation_cache.prompt_manager.get_style_config
+    generation_cache.prompt_manager.get_style_config = lambda style: styles[style]
+    try:
+        defaults = ["gpt-4.1-mini", "gpt-4o-mini"]
+        assert make_generation_key(MATCH, "fast", defaults)[-1] == "gpt-4o-mini"
+        assert make_generation_key(MATCH, "plain", defaults)[-1] == "gpt-4.1-mini,gpt-4o-mini"
+        # 自定义提示词和角色时使用默认模型列表
+        assert make_generation_key(MATCH, "fast", defaults, prompt="X", system_role="Y")[-1] == "gpt-4.1-mini,gpt-4o-mini"
+    finally:
+        generation_cache.prompt_manager.get_style_config = original
+    print("✓ 缓存键使用风格实际使用的模型列表")
+
+
+def test_lru_and_ttl_eviction():
+    """测试LRU淘汰和过期"""
+    print("测试分析结果缓存")
+    print("=" * 50)
+
+    cache = GenerationCache(max_entries=2, ttl_seconds=60)
+    cache.put(("a",), "文字A")
+    cache.put(("b",), "文字B")
+    assert cache.get(("a",)).text == "文字A"  # a 变为最近使用
+    cache.put(("c",), "文字C")
+    assert cache.get(("b",)) is None
+    assert cache.get(("a",)) is not None and cache.get(("c",)) is not None
+
+    expiring = GenerationCache(max_entries=2, ttl_seconds=0.01)
+    expiring.put(("a",), "文字A")
+    time.sleep(0.02)
+    assert expiring.get(("a",)) is None
+    assert len(expiring) == 0
+    print(f"✓ 命中 {cache.hits} 次，未命中 {cache.misses} 次")
+
+
+def test_audio_is_reused_only_if_file_exists():
+    """测试缓存的音频文件被清理后不再复用"""
+    cache = GenerationCache()
+    with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as f:
+        audio_file = f.name
+    cache.put(("a",), "文字A", voice_id="v1")
+    cache.set_audio(("a",), audio_file)
+    assert cache.get(("a",)).has_audio()
+    os.remove(audio_file)
+    assert not cache.get(("a",)).has_audio()
+
+
+if __name__ == "__main__":
+    test_key_depends_on_template_and_model()
+    test_key_uses_style_models()
+    test_lru_and_ttl_eviction()
+    test_audio_is_reused_only_if_file_exists()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+测试原子、异步的JSON保存
+"""
+
+import sys
+import os
+import asyncio
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.utils import load_json_file, save_json_file, save_json_file_async
+
+
+def test_compact_and_pretty():
+    """测试默认紧凑写入，调试模式缩进排版"""
+    print("测试序列化格式")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "match.json")
+        data = {"match_id": "NA1_1", "players": [{"name": "阿狸", "kills": 3}]}
+
+        assert save_json_file(data, path, pretty=False)
+        with open(path, encoding="utf-8") as f:
+            compact = f.read()
+        assert "\n" not in compact and "阿狸" in compact
+
+        assert save_json_file(data, path, pretty=True, fsync=False)
+        with open(path, encoding="utf-8") as f:
+            assert len(f.read()) > len(compact)
+        assert load_json_file(path) == data
+    print("✓ 紧凑/缩进两种格式都能读回")
+
+
+def test_failed_write_keeps_old_file():
+    """测试序列化失败时旧文件保持完整，不留下临时文件"""
+    print("测试原子替换")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "match.json")
+        assert save_json_file({"match_id": "NA1_1"}, path)
+        assert not save_json_file({"bad": object()}, path)
+        assert load_json_file(path) == {"match_id": "NA1_1"}
+        assert os.listdir(tmp) == ["match.json"]
+    print("✓ 写入失败不会截断已有文件")
+
+
+def test_async_save():
+    """测试异步保存（在线程中执行）"""
+    print("测试异步保存")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "nested", "va.json")
+        assert asyncio.run(save_json_file_async({"match_id": "VA_1"}, path))
+        assert load_json_file(path) == {"match_id": "VA_1"}
+    print("✓ 异步保存并自动创建目录")
+
+
+if __name__ == "__main__":
+    test_compact_and_pretty()
+    test_failed_write_keeps_old_file()
+    test_async_save()
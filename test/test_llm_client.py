@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+测试共享异步OpenAI客户端的并发限制和统计
+"""
+
+import sys
+import os
+import asyncio
+from types import SimpleNamespace
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.llm_client import LLMClient
+
+
+class FakeCompletions:
+    def __init__(self):
+        self.active = 0
+        self.max_active = 0
+
+    async def create(self, **kwargs):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        await asyncio.sleep(0.02)
+        self.active -= 1
+        return SimpleNamespace(
+            usage=SimpleNamespace(prompt_tokens=10, completion_tokens=5),
+            choices=[SimpleNamespace(message=SimpleNamespace(content=" 分析结果 "))],
+        )
+
+
+def test_concurrency_limit_and_stats():
+    """测试并发请求排队，且统计token和请求数"""
+    print("测试共享OpenAI客户端")
+    print("=" * 50)
+
+    client = LLMClient(max_concurrency=2, timeout=5)
+    completions = FakeCompletions()
+    client._client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+
+    async def burst():
+        return await asyncio.gather(*[client.chat("system", "prompt") for _ in range(5)])
+
+    results = asyncio.run(burst())
+    assert results == ["分析结果"] * 5
+    assert completions.max_active == 2
+
+    stats = client.get_stats()
+    assert stats["requests"] == 5
+    assert stats["queued"] >= 1
+    assert stats["prompt_tokens"] == 50
+    assert stats["completion_tokens"] == 25
+    print(f"✓ 最大并发 {completions.max_active}，排队 {stats['queued']} 次")
+
+
+if __name__ == "__main__":
+    test_concurrency_limit_and_stats()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+测试压缩的长期比赛归档
+"""
+
+import sys
+import os
+import gzip
+import json
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.artifact_store import ArtifactStore
+from services.match_archive import MatchArchive
+
+
+def match_bytes(match_id, player):
+    """一份重复字段较多的比赛数据"""
+    data = {"match_id": match_id, "players": [{"riot_id": player, "champion": "Ahri", "kills": i} for i in range(10)]}
+    return json.dumps(data, indent=2).encode("utf-8")
+
+
+def test_add_and_read():
+    """测试按比赛ID读取、按玩家流式遍历和去重"""
+    print("测试归档读写")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        archive = MatchArchive(tmp)
+        assert archive.add(match_bytes("NA1_1", "A#NA1"), "lol_match", match_id="NA1_1", player="A#NA1",
+                           created="2025-01-31T23:00:00")
+        assert archive.add(match_bytes("NA1_2", "A#NA1"), "lol_match", match_id="NA1_2", player="A#NA1",
+                           created="2025-02-01T01:00:00")
+        assert archive.add("模板文本".encode("utf-8"), "lol_text", match_id="NA1_2", player="A#NA1", style="roast",
+                           path="template")
+        # 同一玩家同一比赛的数据、内容相同的分析不重复写入
+        assert archive.add(match_bytes("NA1_1", "A#NA1"), "lol_match", match_id="NA1_1", player="A#NA1")
+        assert archive.add("模板文本".encode("utf-8"), "lol_text", match_id="NA1_2", player="A#NA1", style="roast")
+        assert archive.get_stats()["records"] == 3
+        # 同一场比赛的另一个玩家、同一风格的新文本（LLM替代模板）都会归档
+        assert archive.add(match_bytes("NA1_1", "B#NA1"), "lol_match", match_id="NA1_1", player="B#NA1")
+        assert archive.add("分析文本".encode("utf-8"), "lol_text", match_id="NA1_2", player="A#NA1", style="roast",
+                           path="llm")
+
+        assert archive.get("NA1_1")["players"][0]["riot_id"] == "B#NA1"
+        assert archive.get("NA1_1", player="A#NA1")["players"][0]["riot_id"] == "A#NA1"
+        assert archive.get("NA1_2", kind="lol_text") == "分析文本"
+        assert archive.get("NA1_9") is None
+
+        # 按月分段
+        assert os.path.exists(os.path.join(tmp, "2025-01.seg")) and os.path.exists(os.path.join(tmp, "2025-02.seg"))
+        # 分段文件本身是合法的 gzip 流
+        with gzip.open(os.path.join(tmp, "2025-01.seg")) as f:
+            assert json.loads(f.read())["match_id"] == "NA1_1"
+
+        kinds = [record["kind"] for record, _ in archive.iter_player("A#NA1")]
+        assert kinds == ["lol_match", "lol_match", "lol_text", "lol_text"]
+        assert [content["match_id"] for _, content in archive.iter_player("A#NA1", kind="lol_match")] == ["NA1_1", "NA1_2"]
+
+        stats = archive.get_stats()
+        assert stats["records"] == 5 and stats["stored_bytes"] < stats["raw_bytes"]
+    print("✓ 随机读取、流式遍历、去重和压缩")
+
+
+def test_torn_index_line():
+    """测试崩溃留下的半行索引被忽略"""
+    print("测试索引半行")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        archive = MatchArchive(tmp)
+        archive.add(match_bytes("NA1_1", "A#NA1"), "lol_match", match_id="NA1_1")
+        with open(archive.index_path, "a", encoding="utf-8") as f:
+            f.write('{"segment": "2025-')
+
+        reopened = MatchArchive(tmp)
+        assert reopened.get_stats()["records"] == 1
+        assert reopened.get("NA1_1")["match_id"] == "NA1_1"
+    print("✓ 半行被跳过，已有记录可读")
+
+
+def test_eviction_archives():
+    """测试工作目录淘汰的产物进入归档"""
+    print("测试淘汰归档")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        archive = MatchArchive(os.path.join(tmp, "archive"))
+        store = ArtifactStore(tmp, archive=archive)
+        paths = []
+        for i in range(3):
+            path = store.new_path("lol_match")
+            with open(path, "wb") as f:
+                f.write(match_bytes(f"NA1_{i}", "A#NA1"))
+            store.add(path, "lol_match", player="A#NA1")
+            paths.append(path)
+
+        assert store.evict(keep_per_kind=1)["lol_match"] == 2
+        assert not os.path.exists(paths[0]) and os.path.exists(paths[2])
+        # 没有登记比赛ID时从内容读取
+        assert archive.get("NA1_0")["match_id"] == "NA1_0"
+        assert [record["name"] for record, _ in archive.iter_player("A#NA1")] == [
+            os.path.basename(paths[0]), os.path.basename(paths[1])]
+    print("✓ 被淘汰的产物压缩归档后才从工作目录删除")
+
+
+def test_eviction_keeps_file_when_archive_fails():
+    """测试归档失败时产物保留在工作目录和清单中"""
+    print("测试归档失败")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        archive = MatchArchive(os.path.join(tmp, "archive"))
+        archive.add_file = lambda path, kind, **tags: False  # 模拟磁盘已满
+        store = ArtifactStore(tmp, max_bytes=1, archive=archive)
+        paths = []
+        for i in range(2):
+            path = store.new_path("va_match")
+            with open(path, "wb") as f:
+                f.write(match_bytes(f"VA_{i}", "A#NA1"))
+            store.add(path, "va_match")
+            paths.append(path)
+
+        assert all(os.path.exists(path) for path in paths)
+        assert store.evict(keep_per_kind=0)["va_match"] == 0
+        assert store.count("va_match") == 2
+    print("✓ 归档失败时不删除文件，淘汰循环不会卡住")
+
+
+if __name__ == "__main__":
+    test_add_and_read()
+    test_torn_index_line()
+    test_eviction_archives()
+    test_eviction_keeps_file_when_archive_fails()
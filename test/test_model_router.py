@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+测试LLM模型路由：故障切换、对冲请求和降级
+"""
+
+import sys
+import os
+import asyncio
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.model_router import ModelRouter
+
+
+def test_failover_to_next_model():
+    """测试主模型失败时切换到备用模型"""
+    print("测试模型路由")
+    print("=" * 50)
+
+    router = ModelRouter(hedge_percentile=0, failure_threshold=2, cooldown_seconds=60)
+
+    async def call(model):
+        if model == "broken":
+            raise RuntimeError("boom")
+        return f"{model}的点评"
+
+    for _ in range(2):
+        text, model = asyncio.run(router.complete(["broken", "backup"], call))
+        assert (text, model) == ("backup的点评", "backup")
+
+    # 连续失败达到阈值后，故障模型排到最后
+    assert router.order(["broken", "backup"]) == ["backup", "broken"]
+    assert router.get_stats()["broken"]["errors"] == 2
+    print("✓ 故障切换与降级正确")
+
+
+def test_hedged_request_wins_when_primary_is_slow():
+    """测试主模型超过历史延迟百分位时对冲请求胜出"""
+    router = ModelRouter(hedge_percentile=95, min_samples=3)
+    for _ in range(3):
+        router.stats_for("primary").record(True, 10)  # 历史 p95 = 10ms
+
+    async def call(model):
+        if model == "primary":
+            await asyncio.sleep(1)
+        return f"{model}的点评"
+
+    text, model = asyncio.run(router.complete(["primary", "secondary"], call))
+    assert model == "secondary"
+    assert router.get_stats()["primary"]["hedges"] == 1
+    print("✓ 对冲请求胜出")
+
+
+def test_all_models_fail():
+    """测试所有模型都失败时返回None"""
+    router = ModelRouter(hedge_percentile=0)
+
+    async def call(model):
+        return None
+
+    assert asyncio.run(router.complete(["a", "b"], call)) == (None, None)
+
+
+if __name__ == "__main__":
+    test_failover_to_next_model()
+    test_hedged_request_wins_when_primary_is_slow()
+    test_all_models_fail()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+测试SQLite玩家存储
+"""
+
+import sys
+import os
+import json
+import tempfile
+import threading
+from datetime import datetime, timedelta
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.player_store import PlayerStore
+from services.presence_manager import PresenceManager
+
+LEGACY = {
+    "players": [
+        {
+            "discord_id": "1",
+            "riot_id": "Alice#NA1",
+            "game": "LOL",
+            "registered_at": "2025-10-21T15:54:52",
+            "last_match_id": None,
+            "is_in_voice": True,
+            "is_in_game": False,
+            "active_match": None,
+            "last_check": "2025-10-21T19:07:35",
+        },
+        {"discord_id": "2", "riot_id": "Bob#NA1", "game": "VALORANT", "registered_at": "2025-10-21T15:56:19"},
+    ]
+}
+
+
+def test_migrates_json_once():
+    """测试首次启动从JSON迁移，之后不再重复导入"""
+    print("测试JSON迁移")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, "player_links.json")
+        db_path = os.path.join(tmp, "players.db")
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(LEGACY, f)
+
+        store = PlayerStore(db_path, legacy_json_path=json_path)
+        alice = store.get_by_riot("Alice#NA1")
+        assert alice["discord_id"] == "1" and alice["is_in_voice"] is True and alice["is_in_game"] is False
+        assert store.get_by_discord("2")["game"] == "VALORANT"
+
+        store.delete_by_discord("2")
+        store.close()
+
+        # 再次启动不会把已删除的玩家重新导入
+        store = PlayerStore(db_path, legacy_json_path=json_path)
+        assert store.count() == 1
+        mode = store._conn.execute("PRAGMA journal_mode").fetchone()[0]
+        assert mode == "wal"
+        store.close()
+    print("✓ 迁移只执行一次，数据库为WAL模式")
+
+
+def test_presence_manager_row_updates():
+    """测试PresenceManager的注册、唯一性和单行状态更新"""
+    print("测试PresenceManager委托")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        manager = PresenceManager(data_path=os.path.join(tmp, "missing.json"), db_path=os.path.join(tmp, "players.db"),
+                                  status_log_path=os.path.join(tmp, "status_events.jsonl"))
+        assert manager.register_binding("10", "Carol#NA1")
+        assert not manager.register_binding("10", "Other#NA1")
+        assert not manager.register_binding("11", "Carol#NA1")
+
+        assert manager.update_user_status("Carol#NA1", True, True, active_match="NA1_9")
+        binding = manager.get_binding_by_discord("10")
+        assert binding["is_in_game"] is True and binding["last_match_id"] == "NA1_9"
+        assert not manager.update_user_status("Nobody#NA1", False, False)
+
+        # 过期的在线状态被标记为离线
+        manager.update_user_status("Carol#NA1", True, True, last_check=(datetime.now() - timedelta(hours=1)).isoformat())
+        assert manager.mark_stale_players_offline(datetime.now() - timedelta(minutes=10)) == 1
+        assert manager.get_binding_by_riot("Carol#NA1")["is_in_voice"] is False
+
+        assert manager.unregister_binding("10")
+        assert manager.get_all_active_bindings() == []
+        manager.flush()
+        manager.store.close()
+    print("✓ 注册、查询、状态更新均为单行操作")
+
+
+def test_concurrent_writers():
+    """测试两个连接并发写入同一数据库"""
+    print("测试并发写入")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "players.db")
+        stores = [PlayerStore(db_path), PlayerStore(db_path)]
+        for index in range(20):
+            stores[0].insert({"discord_id": str(index), "riot_id": f"P{index}#NA1"})
+
+        def writer(store, flag):
+            for index in range(20):
+                store.update_by_riot(f"P{index}#NA1", is_in_game=flag, last_check=datetime.now().isoformat())
+
+        threads = [threading.Thread(target=writer, args=(store, i == 0)) for i, store in enumerate(stores)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert stores[0].count() == 20
+        assert all(player["last_check"] for player in stores[1].all())
+        for store in stores:
+            store.close()
+    print("✓ 并发写入没有错误，数据完整")
+
+
+def test_recovers_from_corruption():
+    """测试损坏的数据库被移到一边并从最近的备份恢复"""
+    print("测试损坏恢复")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "players.db")
+        store = PlayerStore(db_path)
+        store.insert({"discord_id": "1", "riot_id": "Alice#NA1"})
+        assert store.backup() and store.check_integrity()
+        store.insert({"discord_id": "2", "riot_id": "Bob#NA1"})
+        store.close()
+
+        for ext in ("-wal", "-shm"):
+            if os.path.exists(db_path + ext):
+                os.remove(db_path + ext)
+        with open(db_path, "wb") as f:
+            f.write(b"not a database" * 100)
+
+        # 两个进程同时启动：只有一个执行恢复
+        stores = []
+        threads = [threading.Thread(target=lambda: stores.append(PlayerStore(db_path))) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(stores) == 2
+        assert all([p["riot_id"] for p in store.all()] == ["Alice#NA1"] for store in stores)
+        quarantined = [name for name in os.listdir(tmp)
+                       if name.startswith("players.db.corrupt-") and not name.endswith(("-wal", "-shm"))]
+        assert len(quarantined) == 1
+        for store in stores:
+            store.close()
+    print("✓ 数据库从最近一次完好的备份恢复，损坏文件保留")
+
+
+def test_corruption_without_backup_remigrates():
+    """测试没有备份时重新创建数据库并重新从JSON迁移"""
+    print("测试无备份恢复")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, "player_links.json")
+        db_path = os.path.join(tmp, "players.db")
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(LEGACY, f)
+        PlayerStore(db_path, legacy_json_path=json_path).close()
+        with open(db_path, "r+b") as f:
+            f.write(b"\0" * 100)
+
+        store = PlayerStore(db_path, legacy_json_path=json_path)
+        assert store.count() == 2
+        store.close()
+    print("✓ 绑定没有被清空")
+
+
+if __name__ == "__main__":
+    test_migrates_json_once()
+    test_presence_manager_row_updates()
+    test_concurrent_writers()
+    test_recovers_from_corruption()
+    test_corruption_without_backup_remigrates()
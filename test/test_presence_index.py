@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+测试由网关事件维护的在线/语音索引
+"""
+
+import sys
+import os
+import tempfile
+from types import SimpleNamespace
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import discord
+
+from services.presence_index import PresenceIndex
+from services.presence_manager import PresenceManager
+
+
+class FakeGuild:
+    """只统计 get_member 调用次数的服务器"""
+
+    def __init__(self, guild_id, name):
+        self.id = guild_id
+        self.name = name
+        self.members = {}
+        self.lookups = 0
+
+    def get_member(self, member_id):
+        self.lookups += 1
+        return self.members.get(member_id)
+
+    def add(self, member_id, status=discord.Status.online, channel=None):
+        voice = SimpleNamespace(channel=SimpleNamespace(name=channel, id=hash(channel))) if channel else None
+        member = SimpleNamespace(id=member_id, status=status, voice=voice, guild=self)
+        self.members[member_id] = member
+        return member
+
+
+def test_index_follows_events():
+    """测试语音和在线状态事件更新索引"""
+    print("测试事件更新索引")
+    print("=" * 50)
+
+    home, other = FakeGuild(1, "Home"), FakeGuild(2, "Other")
+    index = PresenceIndex()
+    index.rebuild(SimpleNamespace(guilds=[home, other]), [])
+
+    index.update_member(home.add(10, channel="Lobby"))
+    index.update_member(other.add(10))  # 另一个服务器里的同一用户，不覆盖语音状态
+    assert [p["voice_channel"] for p in index.in_voice()] == ["Lobby"]
+    assert index.get("10")["guild_name"] == "Home"
+
+    index.update_member(home.add(10, status=discord.Status.dnd))  # 离开语音，勿扰
+    assert index.in_voice() == [] and index.online() == []
+
+    index.update_member(home.add(11, status=discord.Status.idle))
+    assert [p["discord_id"] for p in index.online()] == ["11"]
+    index.remove("11")
+    assert index.online() == [] and index.get("11")["is_online"] is False
+    print("✓ 进出语音、状态变化和解绑都反映在索引中")
+
+
+def test_presence_manager_queries_index():
+    """测试查询只在第一次重建时访问服务器"""
+    print("测试PresenceManager查询")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        guilds = [FakeGuild(index, f"G{index}") for index in range(20)]
+        manager = PresenceManager(data_path=os.path.join(tmp, "missing.json"), db_path=os.path.join(tmp, "players.db"),
+                                  status_log_path="", index=PresenceIndex())
+        for player in range(50):
+            manager.register_binding(str(player), f"P{player}#NA1")
+            guilds[player % 20].add(player, status=discord.Status.offline)
+        guilds[3].add(3, channel="Duo")
+        guilds[7].add(7)
+        bot = SimpleNamespace(guilds=guilds)
+
+        assert [p["riot_id"] for p in manager.get_voice_players(bot)] == ["P3#NA1"]
+        lookups = sum(guild.lookups for guild in guilds)
+
+        for _ in range(10):
+            online = manager.get_online_players(bot)
+            assert sorted(p["riot_id"] for p in online) == ["P3#NA1", "P7#NA1"]
+            assert manager.check_discord_presence("P3#NA1", bot)["voice_channel"] == "Duo"
+        assert sum(guild.lookups for guild in guilds) == lookups
+        assert manager.check_discord_presence("Nobody#NA1", bot) is None
+        manager.flush()
+        manager.store.close()
+    print("✓ 重建后查询不再遍历服务器")
+
+
+if __name__ == "__main__":
+    test_index_follows_events()
+    test_presence_manager_queries_index()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+测试进度汇报器的消息合并功能
+"""
+
+import sys
+import os
+import asyncio
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bots.progress_reporter import DiscordProgressReporter, ProgressReporter, create_progress_reporter
+
+
+class FakeMessage:
+    def __init__(self, content):
+        self.content = content
+        self.edits = 0
+
+    async def edit(self, content):
+        self.content = content
+        self.edits += 1
+
+
+class FakeContext:
+    def __init__(self):
+        self.sent = []
+
+    async def reply(self, content):
+        message = FakeMessage(content)
+        self.sent.append(message)
+        return message
+
+    async def send(self, content):
+        return await self.reply(content)
+
+
+async def _run_reporter():
+    ctx = FakeContext()
+    reporter = DiscordProgressReporter(ctx, min_interval=0.05)
+
+    await reporter.start("开始分析")
+    await reporter.update("step1", "步骤1: 获取数据...")
+    await reporter.update("step1", "步骤1完成")
+    await reporter.update("step2", "步骤2: 生成分析...")
+    await reporter.update("step2", "步骤2完成")
+    await reporter.finish("分析完成")
+    return ctx
+
+
+def test_progress_reporter_coalesces_updates():
+    """测试多次更新只发送一条消息，并且合并编辑次数"""
+    print("测试进度汇报器")
+    print("=" * 50)
+
+    ctx = asyncio.run(_run_reporter())
+
+    assert len(ctx.sent) == 1
+    message = ctx.sent[0]
+    assert message.content == "开始分析\n步骤1完成\n步骤2完成\n分析完成"
+    # 4次步骤更新在节流间隔内被合并
+    assert message.edits < 4
+    print(f"✓ 只发送1条消息，编辑 {message.edits} 次")
+
+
+def test_create_progress_reporter_without_ctx():
+    """测试没有Discord上下文时使用静默汇报器"""
+    reporter = create_progress_reporter(None)
+    assert type(reporter) is ProgressReporter
+    asyncio.run(reporter.update("step1", "ignored"))
+
+
+if __name__ == "__main__":
+    test_progress_reporter_coalesces_updates()
+    test_create_progress_reporter_without_ctx()
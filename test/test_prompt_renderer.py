@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+测试紧凑提示词渲染
+"""
+
+import sys
+import os
+import json
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.prompt_renderer import compact_match_facts, count_tokens, max_tokens_for_duration, render_prompt
+
+LOL_MATCH = {
+    "match_id": "NA1_1",
+    "puuid": "x" * 78,
+    "game_creation": 1700000000000,
+    "game_duration": 1830,
+    "player_info": {"name": "Faker#KR1", "champion_chinese": "阿狸", "kda": "10/2/8",
+                    "cs": 250, "damage_dealt": 30000, "result": "胜利"},
+    "team_mvp": {"name": "Faker#KR1", "champion_chinese": "阿狸", "kda": "10/2/8"},
+    "team_lvp": {"name": "Keria#KR1", "champion_chinese": "锤石", "kda": "0/9/3"},
+}
+
+VA_MATCH = {
+    "map": "Ascent",
+    "result": "失败",
+    "strongest_player": {"name": "TenZ", "character": "Jett"},
+    "weakest_player": {"name": "Shroud", "character": "Sage"},
+}
+
+
+def test_compact_facts_are_stable_and_small():
+    """测试比赛数据序列化紧凑、稳定，且不包含冗余字段"""
+    print("测试紧凑提示词渲染")
+    print("=" * 50)
+
+    facts = compact_match_facts(LOL_MATCH)
+    reordered = dict(reversed(list(LOL_MATCH.items())))
+    assert facts == compact_match_facts(reordered)
+    assert "puuid" not in facts and "NA1_1" not in facts
+    assert json.loads(facts)["lvp_username"] == "Keria"
+    assert len(facts) < len(repr(LOL_MATCH))
+
+    va_facts = json.loads(compact_match_facts(VA_MATCH))
+    assert va_facts["mvp_champion"] == "Jett" and va_facts["map"] == "Ascent"
+    print(f"✓ 紧凑数据 {len(facts)} 字符（repr {len(repr(LOL_MATCH))} 字符）")
+
+
+def test_system_prefix_is_stable():
+    """测试同一风格不同比赛的 system 前缀完全相同，模板字段被填充"""
+    first = render_prompt("角色", "模板 {mvp_username}", LOL_MATCH)
+    second = render_prompt("角色", "模板 {mvp_username}", dict(LOL_MATCH, team_mvp=LOL_MATCH["team_lvp"]))
+    assert first.system == second.system == "角色"
+    assert first.user == "模板 Faker" and second.user == "模板 Keria"
+    assert first.prompt_tokens > 0
+
+    va = render_prompt("角色", "{mvp_username}用{mvp_champion}，{unknown} {match_data}", VA_MATCH)
+    assert va.user.startswith("TenZ用Jett，{unknown} {")
+    assert json.loads(va.user.split(" ", 1)[1])["map"] == "Ascent"
+
+
+def test_prompt_budget():
+    """测试超过提示词token上限时不发送"""
+    assert render_prompt("角色", "模板" * 50, LOL_MATCH, max_prompt_tokens=10) is None
+    assert render_prompt("角色", "模板" * 50, LOL_MATCH, max_prompt_tokens=0) is not None
+
+
+def test_token_budget():
+    """测试token统计和按语音时长计算的输出上限"""
+    assert count_tokens("你好") >= 1
+    assert max_tokens_for_duration(10) < max_tokens_for_duration(40)
+    assert max_tokens_for_duration(1) == 64
+    assert max_tokens_for_duration(10000) <= 500
+
+
+if __name__ == "__main__":
+    test_compact_facts_are_stable_and_small()
+    test_system_prefix_is_stable()
+    test_prompt_budget()
+    test_token_budget()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+测试状态事件日志的追加、压缩和启动恢复
+"""
+
+import sys
+import os
+import json
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.binding_registry import BindingRegistry
+from services.player_store import PlayerStore
+from services.status_log import StatusEventLog, transition_events
+
+
+def test_transition_events():
+    """测试字段变化转换成事件名"""
+    print("测试事件名")
+    print("=" * 50)
+
+    assert transition_events({"is_in_voice": True, "last_check": "t"}) == ["voice_join"]
+    assert transition_events({"is_in_game": False, "active_match": None}) == ["game_end", "match_end"]
+    assert transition_events({"active_match": "NA1_1"}) == ["match_start"]
+    print("✓ 进出语音、开始/结束游戏、对局变化")
+
+
+def test_append_and_compact():
+    """测试追加、半行忽略和压缩后的重放"""
+    print("测试追加与压缩")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        log = StatusEventLog(os.path.join(tmp, "status_events.jsonl"), fsync_interval=60)
+        log.append("A#NA1", "1", {"is_in_voice": True, "last_check": "t1"})
+        log.append("A#NA1", "1", {"is_in_game": True, "active_match": "NA1_1", "last_check": "t2"})
+        log.append("B#NA1", "2", {"is_in_voice": True, "last_check": "t3"})
+        assert log.syncs == 0
+        log.sync()
+        assert log.syncs == 1
+
+        players = log.replay()
+        assert players["A#NA1"]["active_match"] == "NA1_1" and players["A#NA1"]["ts"] == "t2"
+
+        assert log.compact() == 3
+        assert log.compact() == 0
+        # 已折叠的事件轮转为历史分段，当前日志从空开始
+        assert not os.path.exists(log.log_path) and len(log.rotated_paths()) == 1
+        with open(log.snapshot_path, encoding="utf-8") as f:
+            assert json.load(f)["offset"] == 0
+
+        # 压缩之后的事件和崩溃留下的半行
+        log.append("A#NA1", "1", {"is_in_game": False, "active_match": None, "last_check": "t4"})
+        log.close()
+        with open(log.log_path, "a", encoding="utf-8") as f:
+            f.write('{"ts": "t5", "riot_id": "B#NA1", "cha')
+
+        players = StatusEventLog(log.log_path).replay()
+        assert players["A#NA1"]["is_in_game"] is False and players["A#NA1"]["is_in_voice"] is True
+        assert players["B#NA1"]["ts"] == "t3"
+
+        # 历史保留在分段和当前日志中
+        events = []
+        for path in log.rotated_paths() + [log.log_path]:
+            with open(path, encoding="utf-8") as f:
+                events += [json.loads(line)["events"] for line in f if line.endswith("\n")]
+        assert events == [["voice_join"], ["game_start", "match_start"], ["voice_join"], ["game_end", "match_end"]]
+    print("✓ 快照 + 日志尾部重放得到最新状态，历史完整保留")
+
+
+def test_rotation_keeps_recent_segments():
+    """测试压缩后日志不再增长，只保留最近的历史分段"""
+    print("测试日志轮转")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        log = StatusEventLog(os.path.join(tmp, "status_events.jsonl"), fsync_interval=0, keep_rotated=2)
+        for i in range(4):
+            log.append("A#NA1", "1", {"is_in_voice": i % 2 == 0, "last_check": f"t{i}"})
+            assert log.compact() == 1
+            assert not os.path.exists(log.log_path)
+
+        assert len(log.rotated_paths()) == 2
+        assert log.replay()["A#NA1"]["is_in_voice"] is False
+
+        # 轮转前崩溃：快照偏移为0，重放已折叠的日志结果不变
+        log.append("A#NA1", "1", {"is_in_voice": True, "last_check": "t4"})
+        log.close()
+        players, _, _ = log._fold(log.load_snapshot())
+        with open(log.snapshot_path, "w", encoding="utf-8") as f:
+            json.dump({"offset": 0, "players": players}, f)
+        assert StatusEventLog(log.log_path).replay()["A#NA1"] == players["A#NA1"]
+
+        # 不保留历史时直接丢弃已折叠的日志和旧分段
+        log = StatusEventLog(log.log_path, keep_rotated=0)
+        assert log.compact() == 1
+        assert not os.path.exists(log.log_path) and log.rotated_paths() == []
+    print("✓ 日志在压缩后轮转，历史分段数量有上限")
+
+
+def test_registry_restores_unflushed_status():
+    """测试写回前退出时，重启后从日志恢复状态；心跳不写日志"""
+    print("测试启动恢复")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "players.db")
+        log_path = os.path.join(tmp, "status_events.jsonl")
+
+        store = PlayerStore(db_path)
+        log = StatusEventLog(log_path, fsync_interval=0)
+        registry = BindingRegistry(store, flush_delay=60, status_log=log)
+        registry.register({"discord_id": "1", "riot_id": "A#NA1"})
+        registry.update("A#NA1", is_in_voice=True, is_in_game=True, active_match="NA1_7", last_check="2025-01-01T10:00:00")
+        for minute in range(1, 10):
+            registry.update("A#NA1", last_check=f"2025-01-01T10:0{minute}:00")
+        assert log.appended == 1
+        # 模拟进程在去抖写回之前退出
+        registry._timer.cancel()
+        log.close()
+        store.close()
+
+        store = PlayerStore(db_path)
+        assert store.get_by_riot("A#NA1")["is_in_game"] is None
+        registry = BindingRegistry(store, flush_delay=60, status_log=StatusEventLog(log_path))
+        player = registry.get_by_riot("A#NA1")
+        assert player["is_in_game"] is True and player["active_match"] == "NA1_7"
+        assert registry.flush() == 1
+        assert store.get_by_riot("A#NA1")["active_match"] == "NA1_7"
+        store.close()
+    print("✓ 未写回的状态从事件日志恢复")
+
+
+if __name__ == "__main__":
+    test_transition_events()
+    test_append_and_compact()
+    test_rotation_keeps_recent_segments()
+    test_registry_restores_unflushed_status()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+测试本地模板点评与LLM对冲
+"""
+
+import sys
+import os
+import asyncio
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.template_engine import generate_template_analysis, hedge_with_template, LLM_PATH, TEMPLATE_PATH, FALLBACK_PATH
+
+LOL_MATCH = {
+    "player_info": {"name": "Faker#KR1", "champion_chinese": "阿狸", "kda": "10/2/8", "result": "失败"},
+    "team_mvp": {"name": "Faker#KR1", "champion_chinese": "阿狸", "kda": "10/2/8"},
+    "team_lvp": {"name": "Keria#KR1", "champion_chinese": "锤石", "kda": "0/9/3"},
+}
+
+
+def test_template_is_deterministic():
+    """测试同一场比赛的模板输出确定，并包含玩家和英雄"""
+    print("测试本地模板点评")
+    print("=" * 50)
+
+    text = generate_template_analysis(LOL_MATCH, "default")
+    assert text == generate_template_analysis(LOL_MATCH, "default")
+    for name in ("Faker", "阿狸", "Keria", "锤石"):
+        assert name in text
+    assert "#" not in text
+    assert generate_template_analysis(LOL_MATCH, "kfk") != text
+    print(f"✓ {text}")
+
+
+def test_hedge_picks_template_on_timeout():
+    """测试LLM超时时使用模板，及时返回时使用LLM"""
+    async def slow_llm():
+        await asyncio.sleep(1)
+        return "LLM点评", "voice"
+
+    async def fast_llm():
+        return "LLM点评", "voice"
+
+    async def failing_llm():
+        return None, None
+
+    (text, _), path = asyncio.run(hedge_with_template(slow_llm(), LOL_MATCH, "no_such_style", timeout=0.05))
+    assert path == TEMPLATE_PATH and "Keria" in text
+
+    (text, voice_id), path = asyncio.run(hedge_with_template(fast_llm(), LOL_MATCH, timeout=1))
+    assert path == LLM_PATH and text == "LLM点评" and voice_id == "voice"
+
+    (text, _), path = asyncio.run(hedge_with_template(failing_llm(), LOL_MATCH, "no_such_style", timeout=1))
+    assert path == FALLBACK_PATH and text
+    print("✓ 对冲路径选择正确（超时和出错分别报告）")
+
+
+if __name__ == "__main__":
+    test_template_is_deterministic()
+    test_hedge_picks_template_on_timeout()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+测试工作流程延迟追踪功能
+"""
+
+import sys
+import os
+import json
+import asyncio
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.tracing import Tracer, percentile
+
+
+def test_percentile():
+    """测试百分位数计算"""
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 95) == 95
+    assert percentile(values, 99) == 99
+    assert percentile([], 50) == 0.0
+    print("✓ 百分位数计算正确")
+
+
+def test_run_collects_spans_and_exports_jsonl():
+    """测试运行记录包含各个span，并可导出为JSON Lines"""
+    print("测试延迟追踪")
+    print("=" * 50)
+
+    tracer = Tracer(history_size=10)
+
+    @tracer.traced("workflow.step1_match_data")
+    async def step1():
+        with tracer.span("riot.match_details", match_id="NA1_1") as span:
+            span.set(response_bytes=1024)
+        return True
+
+    @tracer.traced("lol.workflow", run=True)
+    async def run_workflow():
+        tracer.annotate(style="kfk", match_id="NA1_1")
+        return await step1()
+
+    assert asyncio.run(run_workflow())
+
+    runs = tracer.get_recent_runs()
+    assert len(runs) == 1
+    assert runs[0]["attrs"] == {"style": "kfk", "match_id": "NA1_1"}
+    span_names = [span["name"] for span in runs[0]["spans"]]
+    assert span_names == ["riot.match_details", "workflow.step1_match_data"]
+
+    stats = tracer.get_stats()
+    assert set(stats) == {"riot.match_details", "workflow.step1_match_data", "lol.workflow"}
+    assert stats["lol.workflow"]["count"] == 1
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        export_path = os.path.join(tmp_dir, "traces.jsonl")
+        assert tracer.export_jsonl(export_path) == 1
+        with open(export_path, encoding="utf-8") as f:
+            exported = [json.loads(line) for line in f]
+        assert exported[0]["run"] == "lol.workflow"
+
+    print(f"✓ 记录了 {len(span_names)} 个span")
+
+
+def test_failed_step_is_marked():
+    """测试步骤返回False时span被标记为失败"""
+    tracer = Tracer(history_size=10)
+
+    @tracer.traced("workflow.step3_tts")
+    async def failing_step():
+        return False
+
+    @tracer.traced("lol.workflow", run=True)
+    async def run_workflow():
+        return await failing_step()
+
+    asyncio.run(run_workflow())
+    span = tracer.get_recent_runs()[0]["spans"][0]
+    assert span["error"] == "failed"
+
+
+def test_stats_for_last_runs():
+    """测试 last_n 按最近N次运行统计，而不是每个span名称的最近N个样本"""
+    tracer = Tracer(history_size=50)
+
+    @tracer.traced("lol.workflow", run=True)
+    async def run_workflow(segments):
+        # 一次运行中每个句子一个TTS span
+        for _ in range(segments):
+            with tracer.span("voicv.tts"):
+                pass
+        return True
+
+    for segments in (1, 1, 3, 2):
+        asyncio.run(run_workflow(segments))
+    # 运行之外记录的span不计入按运行的统计
+    with tracer.span("voicv.tts"):
+        pass
+
+    stats = tracer.get_stats(last_n=2)
+    assert stats["lol.workflow"]["count"] == 2
+    assert stats["voicv.tts"]["count"] == 5
+    assert tracer.get_stats()["voicv.tts"]["count"] == 8
+    print("✓ 各步骤统计覆盖同样的最近N次运行")
+
+
+if __name__ == "__main__":
+    test_percentile()
+    test_run_collects_spans_and_exports_jsonl()
+    test_failed_step_is_marked()
+    test_stats_for_last_runs()
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+测试TTS后端选择与本地后端回退
+"""
+
+import sys
+import os
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import voicv_tts
+from services.config import Config
+from services.deadline import Deadline
+from services.tts_cache import TTSCache
+
+
+class FakeLocalBackend(voicv_tts.TTSBackend):
+    """不依赖 espeak-ng 的本地后端"""
+
+    name = "local"
+
+    def __init__(self):
+        self.calls = []
+
+    def is_available(self):
+        return True
+
+    def synthesize(self, text, voice_id, deadline, temp_path, sink=None):
+        self.calls.append(text)
+        with open(temp_path, "wb") as f:
+            f.write(b"local-audio")
+        return temp_path
+
+
+def _open_breaker():
+    for _ in range(voicv_tts.tts_breaker.failure_threshold):
+        voicv_tts.tts_breaker.record_failure()
+
+
+def test_backend_selection():
+    """测试按熔断状态、截止时间和配置选择后端顺序"""
+    print("测试TTS后端选择")
+    print("=" * 50)
+
+    original_local = voicv_tts.local_backend
+    original_backend = Config.TTS_BACKEND
+    voicv_tts.local_backend = local = FakeLocalBackend()
+    try:
+        names = lambda backends: [backend.name for backend in backends]
+        assert names(voicv_tts.select_backends("文字", "voice-a")) == ["voicv", "local"]
+        assert names(voicv_tts.select_backends("文字", "voice-a", Deadline(5))) == ["local", "voicv"]
+
+        _open_breaker()
+        assert names(voicv_tts.select_backends("文字", "voice-a")) == ["local", "voicv"]
+        assert voicv_tts.get_tts_unavailable_reason() is None
+        voicv_tts.tts_breaker.record_success()
+
+        Config.TTS_BACKEND = "local"
+        assert voicv_tts.select_backends("文字", "voice-a") == [local]
+    finally:
+        voicv_tts.local_backend = original_local
+        Config.TTS_BACKEND = original_backend
+        voicv_tts.tts_breaker.record_success()
+    print("✓ 熔断中或时间不足时优先本地后端，压测模式只用本地后端")
+
+
+def test_voicv_failure_falls_back_to_local():
+    """测试VoicV失败后回退本地后端，结果按后端分别缓存"""
+    print("测试本地后端回退")
+    print("=" * 50)
+
+    original_local = voicv_tts.local_backend
+    original_cache = voicv_tts.tts_cache
+    original_request = voicv_tts._request_tts_audio
+    with tempfile.TemporaryDirectory() as cache_dir:
+        voicv_tts.local_backend = local = FakeLocalBackend()
+        voicv_tts.tts_cache = TTSCache(cache_dir=cache_dir)
+        voicv_tts._request_tts_audio = lambda *args, **kwargs: None
+        try:
+            path = voicv_tts.generate_tts_audio("VoicV挂了", voice_id="voice-a")
+            with open(path, "rb") as f:
+                assert f.read() == b"local-audio"
+            assert local.calls == ["VoicV挂了"]
+            # VoicV的缓存中没有这段文字
+            assert voicv_tts.get_cached_tts_audio("VoicV挂了", "voice-a") is None
+        finally:
+            voicv_tts.local_backend = original_local
+            voicv_tts.tts_cache = original_cache
+            voicv_tts._request_tts_audio = original_request
+            voicv_tts.tts_breaker.record_success()
+    print("✓ VoicV失败时使用本地后端生成语音")
+
+
+def test_no_fallback_after_partial_stream():
+    """测试已有数据送入播放器后VoicV失败时不再回退，避免拼接两段音频"""
+    print("测试部分流式后不回退")
+    print("=" * 50)
+
+    def partial_request(text, voice_id, deadline, temp_path, sink=None):
+        if sink:
+            sink(b"half-")
+        return None
+
+    original_local = voicv_tts.local_backend
+    original_cache = voicv_tts.tts_cache
+    original_request = voicv_tts._request_tts_audio
+    with tempfile.TemporaryDirectory() as cache_dir:
+        voicv_tts.local_backend = local = FakeLocalBackend()
+        voicv_tts.tts_cache = TTSCache(cache_dir=cache_dir)
+        voicv_tts._request_tts_audio = partial_request
+        try:
+            received = []
+            assert voicv_tts.generate_tts_audio("断流", voice_id="voice-a", sink=received.append,
+                                                segmented=False) is None
+            assert received == [b"half-"] and local.calls == []
+
+            # 没有送出任何数据时仍然回退
+            assert voicv_tts.generate_tts_audio("断流", voice_id="voice-a", segmented=False)
+            assert local.calls == ["断流"]
+        finally:
+            voicv_tts.local_backend = original_local
+            voicv_tts.tts_cache = original_cache
+            voicv_tts._request_tts_audio = original_request
+            voicv_tts.tts_breaker.record_success()
+    print("✓ 已开始播放时报告失败，未开始时回退本地后端")
+
+
+def test_local_errors_not_counted_by_breaker():
+    """测试缺少API Key、截止时间已到不计入VoicV熔断"""
+    print("测试本地原因不计入熔断")
+    print("=" * 50)
+
+    original_key = os.environ.pop("VOICV_API_KEY", None)
+    voicv_tts.tts_breaker.record_success()
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            temp_path = os.path.join(tmp, "a.mp3")
+            backend = voicv_tts.VoicVBackend()
+            for _ in range(voicv_tts.tts_breaker.failure_threshold):
+                assert backend.synthesize("文字", "voice-a", None, temp_path) is None
+
+            os.environ["VOICV_API_KEY"] = "test-key"
+            expired = Deadline(0)
+            for _ in range(voicv_tts.tts_breaker.failure_threshold):
+                assert backend.synthesize("文字", "voice-a", expired, temp_path) is None
+
+        assert voicv_tts.tts_breaker.state == "closed"
+        assert voicv_tts.tts_breaker._failures == 0
+    finally:
+        os.environ.pop("VOICV_API_KEY", None)
+        if original_key is not None:
+            os.environ["VOICV_API_KEY"] = original_key
+        voicv_tts.tts_breaker.record_success()
+    print("✓ 只有上游错误计入熔断")
+
+
+def test_local_text_passed_on_stdin():
+    """测试以 "-" 开头的文本不会被 espeak 当作选项"""
+    print("测试本地TTS参数")
+    print("=" * 50)
+
+    calls = []
+
+    def fake_run(args, **kwargs):
+        calls.append((args, kwargs.get("input")))
+        raise OSError("espeak not installed")
+
+    original_run = voicv_tts.subprocess.run
+    voicv_tts.subprocess.run = fake_run
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            backend = voicv_tts.LocalTTSBackend()
+            assert backend.synthesize("-x 输出很低", "voice-a", None, os.path.join(tmp, "a.mp3")) is None
+    finally:
+        voicv_tts.subprocess.run = original_run
+
+    args, stdin = calls[0]
+    assert "-x 输出很低" not in args and args[-1] == "--stdin"
+    assert stdin == "-x 输出很低".encode("utf-8")
+    print("✓ 文本经标准输入传给 espeak")
+
+
+if __name__ == "__main__":
+    test_backend_selection()
+    test_voicv_failure_falls_back_to_local()
+    test_no_fallback_after_partial_stream()
+    test_local_errors_not_counted_by_breaker()
+    test_local_text_passed_on_stdin()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+测试TTS音频缓存
+"""
+
+import sys
+import os
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import voicv_tts
+from services.tts_cache import TTSCache, make_tts_key
+
+
+def test_key_normalizes_text():
+    """测试缓存键忽略多余空白，区分语音和格式"""
+    print("测试缓存键")
+    print("=" * 50)
+
+    key = make_tts_key("voice-a", "你好， 世界")
+    assert make_tts_key("voice-a", "  你好，\n世界 ") == key
+    assert make_tts_key("voice-b", "你好， 世界") != key
+    assert make_tts_key("voice-a", "你好， 世界", "wav") != key
+    print("✓ 规范化文本后键相同，语音或格式不同则键不同")
+
+
+def test_byte_budget_lru_eviction():
+    """测试按字节预算淘汰最久未使用的音频，重启后恢复索引"""
+    print("测试LRU淘汰")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = TTSCache(cache_dir=cache_dir, max_bytes=25)
+        path_a = cache.put("a", b"x" * 10)
+        cache.put("b", b"y" * 10)
+        assert cache.get("a") == path_a  # a 变为最近使用
+        cache.put("c", b"z" * 10)
+
+        assert cache.get("b") is None
+        assert cache.get("a") and cache.get("c")
+        stats = cache.get_stats()
+        assert stats["entries"] == 2 and stats["bytes"] == 20
+        assert stats["hits"] == 3 and stats["misses"] == 1
+        assert not [name for name in os.listdir(cache_dir) if name.endswith(".tmp")]
+
+        reloaded = TTSCache(cache_dir=cache_dir, max_bytes=25)
+        assert reloaded.get_stats()["entries"] == 2
+    print("✓ 超出预算淘汰最久未使用的条目，临时文件不残留")
+
+
+def test_generate_reuses_cached_audio():
+    """测试相同文本第二次生成直接使用缓存，熔断中也可用"""
+    print("测试TTS复用缓存")
+    print("=" * 50)
+
+    calls = []
+
+    def fake_request(text, voice_id, deadline, temp_path, sink=None):
+        calls.append(text)
+        with open(temp_path, "wb") as f:
+            f.write(b"mp3-data")
+        return temp_path
+
+    original_cache = voicv_tts.tts_cache
+    original_request = voicv_tts._request_tts_audio
+    with tempfile.TemporaryDirectory() as cache_dir:
+        voicv_tts.tts_cache = TTSCache(cache_dir=cache_dir)
+        voicv_tts._request_tts_audio = fake_request
+        try:
+            first = voicv_tts.generate_tts_audio("这把打得不错", voice_id="voice-a")
+            for _ in range(voicv_tts.tts_breaker.failure_threshold):
+                voicv_tts.tts_breaker.record_failure()
+            second = voicv_tts.generate_tts_audio("这把打得不错 ", voice_id="voice-a")
+            copied = voicv_tts.generate_tts_audio("这把打得不错", os.path.join(cache_dir, "out", "a.mp3"), "voice-a")
+
+            assert calls == ["这把打得不错"]
+            assert first == second
+            with open(copied, "rb") as f:
+                assert f.read() == b"mp3-data"
+            assert voicv_tts.get_cached_tts_audio("这把打得不错", "voice-a") == first
+        finally:
+            voicv_tts.tts_cache = original_cache
+            voicv_tts._request_tts_audio = original_request
+            voicv_tts.tts_breaker.record_success()
+    print("✓ 只调用一次API，重播和复制输出都使用缓存")
+
+
+def test_opus_sibling_counts_toward_budget():
+    """测试转码生成的 .opus 计入字节预算，淘汰时一并扣除"""
+    print("测试Opus转码文件计入预算")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = TTSCache(cache_dir=cache_dir, max_bytes=30)
+        path_a = cache.put("a", b"x" * 10)
+        opus_a = os.path.join(cache_dir, "a.opus")
+        with open(opus_a, "wb") as f:
+            f.write(b"o" * 8)
+        assert cache.track_sibling(path_a, opus_a)
+        assert cache.get_stats()["bytes"] == 18
+        # 缓存目录之外的文件不计入
+        assert not cache.track_sibling(os.path.join(os.path.dirname(cache_dir), "a.mp3"), opus_a)
+
+        # 重启后扫描目录时同样计入
+        assert TTSCache(cache_dir=cache_dir, max_bytes=30).get_stats()["bytes"] == 18
+
+        cache.put("b", b"y" * 10)
+        cache.put("c", b"z" * 10)
+        stats = cache.get_stats()
+        assert stats["entries"] == 2 and stats["bytes"] == 20
+        assert not os.path.exists(path_a) and not os.path.exists(opus_a)
+    print("✓ .opus 计入预算，淘汰时与原始音频一起删除")
+
+
+if __name__ == "__main__":
+    test_key_normalizes_text()
+    test_byte_budget_lru_eviction()
+    test_generate_reuses_cached_audio()
+    test_opus_sibling_counts_toward_budget()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+测试分句TTS合成与MP3拼接
+"""
+
+import sys
+import os
+import tempfile
+import threading
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import voicv_tts
+from services.tts_cache import TTSCache
+from services.tts_segments import concat_mp3, mp3_frame_length, split_sentences, strip_mp3_metadata
+
+# MPEG1 Layer III, 128kbps, 44.1kHz, 无填充 -> 417 字节
+FRAME_HEADER = bytes([0xFF, 0xFB, 0x90, 0x00])
+
+
+def make_mp3(payload: bytes) -> bytes:
+    """构造带ID3标签和Info头帧的MP3"""
+    info_frame = (FRAME_HEADER + b"\0" * 32 + b"Info").ljust(417, b"\0")
+    audio_frame = (FRAME_HEADER + payload).ljust(417, b"\0")
+    id3 = b"ID3\x04\x00\x00\x00\x00\x00\x05" + b"TAGXX"
+    id3v1 = b"TAG" + b"\0" * 125
+    return id3 + info_frame + audio_frame + id3v1
+
+
+def test_split_sentences():
+    """测试按句子切分，长句按逗号切分，短句并入前一句"""
+    print("测试分句")
+    print("=" * 50)
+
+    text = "这把又输了。你在干嘛呢？好。下次加油，别再送了，真的，求你了！"
+    assert split_sentences(text) == ["这把又输了。", "你在干嘛呢？好。", "下次加油，别再送了，真的，求你了！"]
+    assert split_sentences("一二三四五，六七八九十，甲乙丙丁戊。", max_chars=6) == ["一二三四五，", "六七八九十，", "甲乙丙丁戊。"]
+    print("✓ 分句结果符合预期")
+
+
+def test_strip_metadata_keeps_audio_frames():
+    """测试去掉ID3标签和Info头帧后只剩音频帧"""
+    print("测试MP3元数据清理")
+    print("=" * 50)
+
+    assert mp3_frame_length(FRAME_HEADER) == 417
+    stripped = strip_mp3_metadata(make_mp3(b"A"))
+    assert len(stripped) == 417 and stripped.startswith(FRAME_HEADER + b"A")
+    joined = concat_mp3([make_mp3(b"A"), make_mp3(b"B")])
+    assert joined == stripped + strip_mp3_metadata(make_mp3(b"B"))
+    print("✓ 拼接结果只包含按顺序排列的音频帧")
+
+
+def test_segments_run_concurrently_in_order_with_retry():
+    """测试分句并发合成、按原顺序拼接，失败的分句单独重试"""
+    print("测试分句并发合成")
+    print("=" * 50)
+
+    active = {"now": 0, "max": 0}
+    attempts = {}
+    lock = threading.Lock()
+
+    def fake_request(text, voice_id, deadline, temp_path, sink=None):
+        with lock:
+            active["now"] += 1
+            active["max"] = max(active["max"], active["now"])
+            attempts[text] = attempts.get(text, 0) + 1
+            first_attempt = attempts[text] == 1
+        time.sleep(0.05)
+        with lock:
+            active["now"] -= 1
+        if text.startswith("第二") and first_attempt:
+            return None
+        with open(temp_path, "wb") as f:
+            f.write(make_mp3(text.encode("utf-8")))
+        return temp_path
+
+    original_cache = voicv_tts.tts_cache
+    original_request = voicv_tts._request_tts_audio
+    with tempfile.TemporaryDirectory() as cache_dir:
+        voicv_tts.tts_cache = TTSCache(cache_dir=cache_dir)
+        voicv_tts._request_tts_audio = fake_request
+        try:
+            text = "第一句话来了。第二句话来了。第三句话来了。第四句话来了。第五句话来了。"
+            received = []
+            path = voicv_tts.generate_tts_audio(text, voice_id="voice-seg", sink=received.append, segmented=True)
+
+            with open(path, "rb") as f:
+                data = f.read()
+            sentences = split_sentences(text)
+            expected = b"".join(strip_mp3_metadata(make_mp3(s.encode("utf-8"))) for s in sentences)
+            assert data == expected
+            assert b"".join(received) == expected
+            assert attempts["第二句话来了。"] == 2
+            assert sum(attempts.values()) == len(sentences) + 1
+            assert 1 < active["max"] <= voicv_tts.Config.TTS_SEGMENT_CONCURRENCY
+        finally:
+            voicv_tts.tts_cache = original_cache
+            voicv_tts._request_tts_audio = original_request
+            voicv_tts.tts_breaker.record_success()
+    print(f"✓ 最大并发 {active['max']}，失败分句单独重试，拼接顺序正确")
+
+
+if __name__ == "__main__":
+    test_split_sentences()
+    test_strip_metadata_keeps_audio_frames()
+    test_segments_run_concurrently_in_order_with_retry()
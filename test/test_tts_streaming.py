@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+测试TTS流式下载和边下载边播放管道
+"""
+
+import sys
+import os
+import time
+import asyncio
+import tempfile
+from types import SimpleNamespace
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import voicv_tts
+from services.audio_player import AudioPipe
+from services.deadline import Deadline
+from services.tts_cache import TTSCache
+
+
+class FakeResponse:
+    def __init__(self, json_data=None, chunks=None):
+        self.status_code = 200
+        self.text = ""
+        self._json = json_data
+        self._chunks = chunks or []
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self._json
+
+    def iter_content(self, chunk_size):
+        return iter(self._chunks)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeSession:
+    """记录请求的假HTTP会话，音频分三块返回"""
+
+    def __init__(self):
+        self.calls = []
+
+    def post(self, url, **kwargs):
+        self.calls.append(("post", url))
+        return FakeResponse(json_data={"data": {"audioUrl": "https://cdn/a.mp3"}})
+
+    def get(self, url, stream=False, **kwargs):
+        self.calls.append(("get", url, stream))
+        return FakeResponse(chunks=[b"ab", b"", b"cd", b"ef"])
+
+
+def test_streamed_download_feeds_sink_and_cache():
+    """测试音频按块写入缓存文件并同时送入sink，两个请求使用同一会话"""
+    print("测试TTS流式下载")
+    print("=" * 50)
+
+    session = FakeSession()
+    received = []
+    original_session = voicv_tts._session
+    original_cache = voicv_tts.tts_cache
+    original_key = os.environ.get("VOICV_API_KEY")
+    with tempfile.TemporaryDirectory() as cache_dir:
+        voicv_tts._session = session
+        voicv_tts.tts_cache = TTSCache(cache_dir=cache_dir)
+        os.environ["VOICV_API_KEY"] = "test-key"
+        try:
+            path = voicv_tts.generate_tts_audio("流式测试", voice_id="voice-a", sink=received.append)
+            with open(path, "rb") as f:
+                assert f.read() == b"abcdef"
+            assert received == [b"ab", b"cd", b"ef"]
+            assert session.calls == [("post", f"{voicv_tts.VOICV_BASE}/v1/tts"), ("get", "https://cdn/a.mp3", True)]
+
+            # 缓存命中时同样把文件内容送入sink
+            replayed = []
+            assert voicv_tts.generate_tts_audio("流式测试", voice_id="voice-a", sink=replayed.append) == path
+            assert b"".join(replayed) == b"abcdef"
+            assert len(session.calls) == 2
+        finally:
+            voicv_tts._session = original_session
+            voicv_tts.tts_cache = original_cache
+            if original_key is None:
+                os.environ.pop("VOICV_API_KEY", None)
+            else:
+                os.environ["VOICV_API_KEY"] = original_key
+    print("✓ 边下载边送出数据块，缓存命中时直接读取文件")
+
+
+def test_audio_pipe_survives_closed_reader():
+    """测试播放端关闭后写入不再阻塞或抛出异常"""
+    print("测试播放管道")
+    print("=" * 50)
+
+    pipe = AudioPipe()
+    pipe.write(b"hello")
+    pipe.close()
+    assert pipe.reader.read() == b"hello"
+
+    pipe = AudioPipe()
+    pipe.abort()
+    pipe.write(b"x" * 200000)
+    assert pipe.broken
+    print("✓ 管道数据按顺序读取，播放端关闭后写入静默失败")
+
+
+class FakeReporter:
+    def __init__(self):
+        self.updates = []
+
+    async def update(self, step, text):
+        self.updates.append((step, text))
+
+
+def test_expired_deadline_skips_streamed_playback():
+    """测试超过截止时间时跳过播放并返回失败，文字优先模式仍算交付成功"""
+    print("测试流式播放截止时间")
+    print("=" * 50)
+
+    from bots import discord_bot
+
+    calls = []
+    original_get_channel = discord_bot.bot.get_channel
+    original_generate = discord_bot.generate_tts_audio
+    discord_bot.bot.get_channel = lambda channel_id: object()
+    discord_bot.generate_tts_audio = lambda *args, **kwargs: calls.append(args)
+    try:
+        deadline = Deadline(0)
+        time.sleep(0.01)
+        workflow = SimpleNamespace(reporter=FakeReporter(), deadline=deadline, chinese_analysis="文字",
+                                   voice_id="voice-a", audio_file=None)
+        assert asyncio.run(discord_bot.stream_tts_and_play(workflow, 1)) is False
+        assert workflow.reporter.updates[-1][0] == "step4" and "跳过播放" in workflow.reporter.updates[-1][1]
+        assert calls == []
+    finally:
+        discord_bot.bot.get_channel = original_get_channel
+        discord_bot.generate_tts_audio = original_generate
+    print("✓ 过期的分析不再下载和播放，交给调用方回退")
+
+
+if __name__ == "__main__":
+    test_streamed_download_feeds_sink_and_cache()
+    test_audio_pipe_survives_closed_reader()
+    test_expired_deadline_skips_streamed_playback()
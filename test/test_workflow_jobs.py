@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+测试工作流程截止时间、取消与重复请求合并
+"""
+
+import sys
+import os
+import time
+import asyncio
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.deadline import Deadline, DeadlineExceeded, get_timeout
+from services.workflow_jobs import JobRegistry, make_job_key
+
+
+def test_deadline_caps_timeouts():
+    """测试上游超时不超过剩余时间"""
+    deadline = Deadline(5)
+    assert get_timeout(None, 10) == 10
+    assert get_timeout(deadline, 10) <= 5
+    assert get_timeout(deadline, 2) == 2
+
+    expired = Deadline(0)
+    time.sleep(0.01)
+    try:
+        get_timeout(expired, 10)
+        assert False, "应抛出 DeadlineExceeded"
+    except DeadlineExceeded:
+        pass
+    print("✓ 截止时间正确限制上游超时")
+
+
+async def _run_duplicate_requests():
+    registry = JobRegistry()
+    runs = []
+
+    async def workflow():
+        runs.append(1)
+        await asyncio.sleep(0.05)
+        return True
+
+    key = make_job_key("lol", "Faker#KR1", "kfk")
+    job1, attached1 = registry.submit(key, 1, workflow)
+    job2, attached2 = registry.submit(make_job_key("LOL", "faker#kr1", "kfk"), 2, workflow)
+    assert not attached1 and attached2
+    assert job1 is job2
+
+    # 一个请求者离开时，仍有其他请求者，任务继续
+    assert not registry.cancel_for_requester(1)
+    assert await job2.wait() is True
+    assert len(runs) == 1
+    assert registry.active_count() == 0
+
+
+def test_duplicate_requests_share_one_job():
+    """测试相同玩家+风格的请求只运行一次"""
+    asyncio.run(_run_duplicate_requests())
+    print("✓ 重复请求合并为一个任务")
+
+
+async def _run_cancellation():
+    registry = JobRegistry()
+
+    async def workflow():
+        await asyncio.sleep(10)
+        return True
+
+    old_job, _ = registry.submit(make_job_key("LOL", "A#1", "default"), 1, workflow)
+    # 同一请求者发起新请求，旧任务被取消
+    new_job, _ = registry.submit(make_job_key("LOL", "A#1", "kfk"), 1, workflow)
+    await asyncio.sleep(0)
+    assert old_job.task.cancelled()
+
+    # 请求者离开语音频道，任务被取消
+    assert registry.cancel_for_requester(1, reason="(离开语音频道)")
+    try:
+        await new_job.wait()
+        assert False, "任务应被取消"
+    except asyncio.CancelledError:
+        pass
+    assert registry.active_count() == 0
+
+
+def test_cancel_on_new_request_and_leave():
+    """测试新请求和离开语音频道会取消旧任务"""
+    asyncio.run(_run_cancellation())
+    print("✓ 取消逻辑正确")
+
+
+async def _run_monitor_job_cancel():
+    from types import SimpleNamespace
+    from services import game_monitor
+
+    registry = JobRegistry()
+    original_registry = game_monitor.job_registry
+    game_monitor.job_registry = registry
+    original_submit = registry.submit
+
+    async def workflow():
+        await asyncio.sleep(10)
+        return True
+
+    # 用不访问网络的工作流程代替自动分析
+    registry.submit = lambda key, requester_id, factory: original_submit(key, requester_id, workflow)
+    user = SimpleNamespace(id=7)
+    monitor = game_monitor.GameMonitor(user, "A#NA1", SimpleNamespace(id=1))
+    try:
+        # 请求者离开语音取消任务：监控协程正常返回，不会被误当成自身被取消
+        handler = asyncio.create_task(monitor._handle_match_end("NA1_1"))
+        await asyncio.sleep(0.01)
+        assert registry.cancel_for_requester(7, "(离开语音频道)")
+        await handler
+        assert not handler.cancelled()
+
+        # 监控任务本身被取消时仍然传播取消
+        handler = asyncio.create_task(monitor._handle_match_end("NA1_2"))
+        await asyncio.sleep(0.01)
+        handler.cancel()
+        try:
+            await handler
+            assert False, "应传播 CancelledError"
+        except asyncio.CancelledError:
+            pass
+        assert handler.cancelled()
+    finally:
+        game_monitor.job_registry = original_registry
+        for job in list(registry._jobs.values()):
+            job.task.cancel()
+
+
+def test_monitor_survives_job_cancel():
+    """测试自动分析任务被取消时监控不会退出"""
+    print("测试监控中的任务取消")
+    print("=" * 50)
+    asyncio.run(_run_monitor_job_cancel())
+    print("✓ 只有监控自身被取消时才传播取消")
+
+
+if __name__ == "__main__":
+    test_deadline_caps_timeouts()
+    test_duplicate_requests_share_one_job()
+    test_cancel_on_new_request_and_leave()
+    test_monitor_survives_job_cancel()